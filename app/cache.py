@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """ 件数の上限と有効期限を持つキャッシュ（スレッドセーフ）
+
+    件数が上限を超えた場合は、最後に使われてから最も時間が経っている値を削除する
+    登録してから有効期限（秒）が経過した値は、次に取得するときに削除する
+
+    使用例）
+        cache = LRUCache(maxsize=1000, ttl=60)
+        cache.set(1, record)
+        record = cache.get(1)
+
+    Args:
+        maxsize (int, optional):
+            Defaults to 1024.
+            保持する件数の上限
+        ttl (float, optional):
+            Defaults to None.
+            有効期限（秒）。Noneの場合は期限なし
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # キー: (値, 有効期限の時刻)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """ 値を取得する（ない場合、期限切れの場合はdefaultを返す） """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """ 値を登録する """
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """ 値を削除する """
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def clear(self):
+        """ すべての値を削除する """
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
@@ -1,22 +1,272 @@
 import pymysql.cursors
 import os
+import threading
+import time
 import unittest
+import unittest.mock
+from collections import deque
+from contextlib import contextmanager
 
 
-def get_connection():
-    """ DB接続を取得する """
+def get_database():
+    """ 接続するデータベース（スキーマ）名を取得する
+
+    環境変数 MYSQL_DATABASE（省略した場合は sandbox）のデータベースに接続する
+    環境変数 MYSQL_WORKER_ID を指定した場合は、ワーカーごとのデータベース（sandbox_w0 など）に接続する
+    （テストを複数プロセスで並列に実行する場合に、プロセスごとにデータベースを分けるため）
+    """
+    database = get_base_database()
+    worker_id = os.getenv('MYSQL_WORKER_ID')
+    if worker_id:
+        return get_worker_database(database, worker_id)
+    return database
+
+
+def get_base_database():
+    """ ワーカーごとのデータベースの元になるデータベース名を取得する（MYSQL_WORKER_IDは無視する） """
+    return os.getenv('MYSQL_DATABASE', 'sandbox')
+
+
+def get_worker_database(database, worker_id):
+    """ ワーカーごとのデータベース名を取得する（sandbox, 0 -> sandbox_w0） """
+    return '{}_w{}'.format(database, worker_id)
+
+
+def get_connection(local_infile=False, pool=None, db=None):
+    """ DB接続を取得する
+
+    Args:
+        local_infile (bool, optional):
+            Defaults to False.
+            LOAD DATA LOCAL INFILE を使えるようにするかどうか
+        pool (ConnectionPool, optional):
+            Defaults to None.
+            指定した場合、コネクションプールから接続を借りる（local_infileは無視される）
+            close()するとプールに返却される
+        db (str, optional):
+            Defaults to None.
+            接続するデータベース名。Noneの場合はget_database()のデータベースに接続する
+    """
+    if pool is not None:
+        return pool.get_connection()
+
     return pymysql.connect(
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=local_infile,
+        **get_connection_params(db=db)
+    )
+
+
+def get_connection_params(db=None):
+    """ DB接続に使う接続先、ユーザなどを取得する（pymysql以外のドライバでも同じ接続先を使うため） """
+    return dict(
         # ローカルから起動するときは 127.0.0.1 を使う
         host=os.getenv('MYSQL_HOST', '127.0.0.1'),
         user='root',
         password='root',
         port=3306,
-        db='sandbox',
+        db=db or get_database(),
         charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor
     )
 
 
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """ DB接続のコネクションプール
+
+    スレッドセーフで、同時に貸し出す接続数の上限を持つ
+    使用例）
+        pool = ConnectionPool(maxsize=5)
+        with pool.connection() as conn:
+            ...
+
+    Args:
+        maxsize (int, optional):
+            Defaults to 5.
+            作成する接続数の上限
+        idle_timeout (float, optional):
+            Defaults to 300.
+            プールに返却されてから指定した秒数が経過した接続は、次に借りるときに切断する
+        timeout (float, optional):
+            Defaults to None.
+            接続がすべて貸し出されているときに、返却を待つ秒数。
+            Noneの場合は返却されるまで待つ。待っても返却されない場合、PoolTimeoutErrorになる
+        connect_kwargs:
+            接続を作成するときにget_connection()に渡す引数
+    """
+
+    def __init__(self, maxsize=5, idle_timeout=300, timeout=None, **connect_kwargs):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        # (接続, 返却された時刻)
+        self._idle = deque()
+        # 作成済みの接続数（貸出中の接続を含む）
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def get_connection(self):
+        """ 接続を借りる
+
+        借りる前にping()で接続が生きているかを確認し、切れている場合は作り直す
+        返却するときは、戻り値の接続をclose()する
+        """
+        while True:
+            conn = self._checkout()
+            if conn is None:
+                # 上限に達していないので、新しく接続する
+                try:
+                    conn = get_connection(**self._connect_kwargs)
+                except Exception:
+                    self._discard(None)
+                    raise
+                return _PooledConnection(self, conn)
+
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                # 切れている接続は捨てて、もう一度借りる
+                self._discard(conn)
+                continue
+            return _PooledConnection(self, conn)
+
+    @contextmanager
+    def connection(self):
+        """ 接続を借りて、withブロックを抜けるときに返却する """
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        """ プールしている接続をすべて切断する（貸出中の接続は返却時に切断する） """
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _checkout(self):
+        """ プールしている接続を返す
+
+        プールが空で、接続数が上限に達していない場合はNoneを返す（呼び出し元で接続する）
+        """
+        expired = []
+        try:
+            with self._condition:
+                deadline = None if self.timeout is None else time.monotonic() + self.timeout
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Connection pool is closed")
+
+                    while self._idle:
+                        conn, released_at = self._idle.pop()
+                        if time.monotonic() - released_at > self.idle_timeout:
+                            expired.append(conn)
+                            self._size -= 1
+                            continue
+                        return conn
+
+                    if self._size < self.maxsize:
+                        self._size += 1
+                        return None
+
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeoutError(
+                            "No connection available within {} seconds".format(self.timeout))
+                    self._condition.wait(remaining)
+        finally:
+            for conn in expired:
+                _close_quietly(conn)
+
+    def _release(self, conn):
+        try:
+            # 次に借りる人に、終わっていないトランザクションを引き継がない
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        with self._condition:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._condition.notify()
+                return
+            self._size -= 1
+        _close_quietly(conn)
+
+    def _discard(self, conn):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+        if conn is not None:
+            _close_quietly(conn)
+
+
+class _PooledConnection:
+    """ プールから借りた接続
+
+    close()すると切断せずにプールに返却する。それ以外は元の接続と同じように使える
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError(0, "Connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool._release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ アプリケーション全体で共有するコネクションプールを取得する """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(maxsize=int(os.getenv('MYSQL_POOL_SIZE', '5')))
+        return _pool
+
+
 class TestGetConnection(unittest.TestCase):
     def test_get_connection(self):
         conn = get_connection()
@@ -29,6 +279,85 @@ class TestGetConnection(unittest.TestCase):
             conn.ping(reconnect=False)
 
 
+class TestGetDatabase(unittest.TestCase):
+    def test_get_database(self):
+        with unittest.mock.patch.dict(os.environ, {'MYSQL_DATABASE': 'sandbox'}):
+            os.environ.pop('MYSQL_WORKER_ID', None)
+            self.assertEqual(get_database(), 'sandbox')
+
+    def test_get_database_worker(self):
+        with unittest.mock.patch.dict(os.environ, {'MYSQL_DATABASE': 'sandbox', 'MYSQL_WORKER_ID': '1'}):
+            self.assertEqual(get_database(), 'sandbox_w1')
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(maxsize=2, timeout=0.1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_get_connection_reuse(self):
+        conn = get_connection(pool=self.pool)
+        raw_conn = conn._conn
+        conn.close()
+
+        # 返却した接続を再利用する
+        with self.pool.connection() as conn:
+            self.assertIs(conn._conn, raw_conn)
+            conn.ping(reconnect=False)
+
+    def test_get_connection_maxsize(self):
+        conn1 = self.pool.get_connection()
+        conn2 = self.pool.get_connection()
+
+        # 上限まで貸し出しているのでエラーになる
+        with self.assertRaises(PoolTimeoutError):
+            self.pool.get_connection()
+
+        # 返却すると借りられる
+        conn1.close()
+        conn3 = self.pool.get_connection()
+        conn2.close()
+        conn3.close()
+
+    def test_get_connection_idle_timeout(self):
+        pool = ConnectionPool(maxsize=1, idle_timeout=0)
+        try:
+            conn = pool.get_connection()
+            raw_conn = conn._conn
+            conn.close()
+            time.sleep(0.01)
+
+            # 一定時間使われていない接続は切断して、新しく接続する
+            with pool.connection() as conn:
+                self.assertIsNot(conn._conn, raw_conn)
+            with self.assertRaises(Exception):
+                raw_conn.ping(reconnect=False)
+        finally:
+            pool.close()
+
+    def test_get_connection_health_check(self):
+        conn = self.pool.get_connection()
+        raw_conn = conn._conn
+        conn.close()
+        # プールしている接続が切れている場合
+        raw_conn.close()
+
+        # 切れている接続は捨てて、新しく接続する
+        with self.pool.connection() as conn:
+            self.assertIsNot(conn._conn, raw_conn)
+            conn.ping(reconnect=False)
+
+    def test_close_returns_to_pool(self):
+        conn = self.pool.get_connection()
+        conn.close()
+
+        # 返却した接続は使えない
+        with self.assertRaises(pymysql.err.InterfaceError):
+            conn.cursor()
+
+
 def main():
     unittest.main()
 
@@ -1,5 +1,43 @@
 from app import database_connection
+from app import query_plan
+from app.cache import LRUCache
 from enum import Enum
+from functools import lru_cache
+from itertools import islice
+from logging import getLogger
+from pymysql.constants import SERVER_STATUS
+import os
+import random
+import threading
+import weakref
+
+logger = getLogger(__name__)
+
+# 実行するSQLをログ（DEBUG）に出力する割合（0.0〜1.0）。0の場合は出力しない
+# 毎回出力すると呼び出しごとのコストになるため、必要な場合のみ環境変数で指定する
+SQL_LOG_SAMPLE_RATE = float(os.getenv('EXAMPLE1_SQL_LOG_SAMPLE_RATE', '0'))
+
+# select_example1_by_id(), select_example1_by_ids() のキャッシュ（enable_cache()で有効にする）
+_cache = None
+# 登録、削除してまだコミット（ロールバック）していない接続と、その行のid
+# この接続から見える値は他の接続と異なる（ロールバックされるかもしれない）ため、キャッシュを使わない
+# プールから借りた接続は、返却しても同じ接続のままにするため、元の接続をキーにする（_get_connection_key()）
+_pending_writes = weakref.WeakKeyDictionary()
+_pending_writes_lock = threading.Lock()
+
+# example1の項目（登録する順）
+EXAMPLE1_COLUMNS = ('id', 'varchar_col', 'int_col', 'double_col', 'datetime_col')
+
+INSERT_EXAMPLE1_SQL = '''
+    INSERT INTO example1(
+        id,
+        varchar_col,
+        int_col,
+        double_col,
+        datetime_col
+    )
+    VALUES(%s, %s, %s, %s, %s)
+    '''
 
 
 class Sort(Enum):
@@ -12,60 +50,331 @@ class Order(Enum):
     desc = 2
 
 
+def enable_cache(maxsize=1024, ttl=60):
+    """ select_example1_by_id(), select_example1_by_ids() の結果をキャッシュする
+
+    登録、削除（insert_example1(), delete_example1_by_id() など）をすると、その行のキャッシュは削除される
+    登録、削除した接続は、コミット（ロールバック）するまでキャッシュを使わない（取得も、値を入れることもしない）
+    コミット（ロールバック）後、その接続で次に取得するときに、登録、削除した行のキャッシュをもう一度削除する
+    ただし、このモジュール以外から更新された場合は、有効期限（ttl秒）まで古い値を返す
+
+    Args:
+        maxsize (int, optional):
+            Defaults to 1024.
+            キャッシュする行数の上限
+        ttl (float, optional):
+            Defaults to 60.
+            キャッシュの有効期限（秒）
+    """
+    global _cache
+    _cache = LRUCache(maxsize=maxsize, ttl=ttl)
+    return _cache
+
+
+def disable_cache():
+    """ キャッシュを使わないようにする """
+    global _cache
+    _cache = None
+    with _pending_writes_lock:
+        _pending_writes.clear()
+
+
 def select_example1_by_id(conn, id):
+    cache = _get_cache(conn)
+    if cache is not None:
+        record = cache.get(int(id))
+        if record is not None:
+            # 呼び出し元で変更されてもキャッシュが変わらないように、コピーを返す
+            return dict(record)
+
     sql = "select * from example1 where id = %s"
     params = (id, )
     with conn.cursor() as cur:
+        query_plan.explain(conn, sql, params)
         cur.execute(sql, params)
-        return cur.fetchone()
+        record = cur.fetchone()
+
+    if cache is not None and record is not None:
+        cache.set(record['id'], dict(record))
+    return record
+
+
+def select_example1_by_ids(conn, ids, chunk_size=1000):
+    """ 複数のidの行をまとめて取得する
+
+    キャッシュにない行だけを、chunk_size件ずつ SELECT ... WHERE id IN (...) で取得する
+
+    Returns:
+        dict: idをキー、行を値とするdict（存在しないidは含まない）
+    """
+    cache = _get_cache(conn)
+    records = {}
+    missing_ids = []
+    for id in dict.fromkeys(map(int, ids)):
+        record = cache.get(id) if cache is not None else None
+        if record is not None:
+            records[id] = dict(record)
+        else:
+            missing_ids.append(id)
+
+    with conn.cursor() as cur:
+        for chunk in _chunks(missing_ids, chunk_size):
+            sql = 'select * from example1 where id in ({})'.format(', '.join(['%s'] * len(chunk)))
+            query_plan.explain(conn, sql, chunk)
+            cur.execute(sql, chunk)
+            for record in cur.fetchall():
+                records[record['id']] = record
+                if cache is not None:
+                    cache.set(record['id'], dict(record))
+    return records
 
 
 def select_example1(conn, start=None, end=None, sort=Sort.id, order=Order.asc):
-    sql = "select * from example1 where 1 = 1"
-    params = {}
-    if start:
-        sql += " and datetime_col >= %(start)s"
-        params["start"] = start
-    if end:
-        sql += " and datetime_col <= %(end)s"
-        params["end"] = end
-    sql += " order by {} {}".format(sort.name, order.name)
-    print(sql)
+    sql = _create_select_example1_sql(bool(start), bool(end), sort, order)
+    params = {"start": start, "end": end}
+    _log_sql(sql, params)
 
     with conn.cursor() as cur:
+        query_plan.explain(conn, sql, params)
         cur.execute(sql, params)
         return cur.fetchall()
 
 
+def iter_example1(conn, start=None, end=None, sort=Sort.id, order=Order.asc, page_size=1000):
+    """ select_example1() と同じ条件で、1件ずつ返すイテレータ
+
+    page_size件ずつ、前のページの最後の行の値（キーセット）より後の行を取得する
+    OFFSETを使わないため、後ろのページでも読み飛ばす行がなく、
+    全件をメモリに読み込まないため、件数に関係なくメモリ使用量は一定になる
+
+    並び順は (sort, id) になる（sort=Sort.datetime_col の場合、同じ日時の行はidの順）
+    datetime_colがNULLの行は、昇順の場合は先頭、降順の場合は最後になる（select_example1()と同じ）
+    """
+    params = {"start": start, "end": end, "page_size": page_size}
+    # 最初のページはキーセットの条件なし
+    keyset = None
+    while True:
+        sql = _create_iter_example1_sql(bool(start), bool(end), sort, order, keyset)
+        _log_sql(sql, params)
+
+        with conn.cursor() as cur:
+            query_plan.explain(conn, sql, params)
+            cur.execute(sql, params)
+            records = cur.fetchall()
+        yield from records
+        if len(records) < page_size:
+            return
+
+        last = records[-1]
+        params["last_id"] = last['id']
+        params["last_datetime"] = last['datetime_col']
+        if sort == Sort.id:
+            keyset = KEYSET_VALUE
+        else:
+            keyset = KEYSET_NULL if last['datetime_col'] is None else KEYSET_VALUE
+
+
+# iter_example1()のキーセット（前のページの最後の行）の種類
+# 値あり
+KEYSET_VALUE = 'value'
+# datetime_colがNULL
+KEYSET_NULL = 'null'
+
+
+# SQLは条件の有無と並び順の組み合わせごとに1回だけ作成する
+@lru_cache(maxsize=None)
+def _create_select_example1_sql(has_start, has_end, sort, order):
+    sql = "select * from example1 where 1 = 1"
+    sql += _create_example1_condition(has_start, has_end)
+    sql += " order by {} {}".format(sort.name, order.name)
+    return sql
+
+
+@lru_cache(maxsize=None)
+def _create_iter_example1_sql(has_start, has_end, sort, order, keyset):
+    keys = ['id'] if sort == Sort.id else ['datetime_col', 'id']
+    sql = "select * from example1 where 1 = 1"
+    sql += _create_example1_condition(has_start, has_end)
+    if keyset is not None:
+        sql += " and " + _create_example1_keyset_condition(sort, order, keyset)
+    sql += " order by {}".format(', '.join('{} {}'.format(key, order.name) for key in keys))
+    sql += " limit %(page_size)s"
+    return sql
+
+
+def _create_example1_condition(has_start, has_end):
+    sql = ""
+    if has_start:
+        sql += " and datetime_col >= %(start)s"
+    if has_end:
+        sql += " and datetime_col <= %(end)s"
+    return sql
+
+
+def _create_example1_keyset_condition(sort, order, keyset):
+    """ 並び順で前のページの最後の行（%(last_id)s, %(last_datetime)s）より後の行の条件を返す
+
+    idはNULLにならないため、NULLを考慮するのはdatetime_colだけ
+    （MySQLではNULLは最も小さい値として並ぶ）
+    """
+    operator = '>' if order == Order.asc else '<'
+    condition = "id {} %(last_id)s".format(operator)
+    if sort == Sort.id:
+        return condition
+
+    if keyset == KEYSET_NULL:
+        condition = "(datetime_col is null and {})".format(condition)
+        # 昇順の場合、NULLの後にNULL以外の行が並ぶ
+        if order == Order.asc:
+            condition = "({} or datetime_col is not null)".format(condition)
+        return condition
+
+    condition = "(datetime_col {op} %(last_datetime)s or (datetime_col = %(last_datetime)s and {id}))".format(
+        op=operator, id=condition)
+    # 降順の場合、NULL以外の行の後にNULLの行が並ぶ
+    if order == Order.desc:
+        condition = "({} or datetime_col is null)".format(condition)
+    return condition
+
+
+def _log_sql(sql, params):
+    """ 実行するSQLを、SQL_LOG_SAMPLE_RATEの割合でログに出力する（0の場合は出力しない） """
+    if SQL_LOG_SAMPLE_RATE and random.random() < SQL_LOG_SAMPLE_RATE:
+        logger.debug("%s %s", sql, params)
+
+
 def insert_example1(conn, id, varchar_col, int_col, double_col, datetime_col):
-    sql = '''
-    INSERT INTO example1(
-        id,
-        varchar_col,
-        int_col,
-        double_col,
-        datetime_col
-    )
-    VALUES(%s, %s, %s, %s, %s)
-    '''
+    try:
+        with conn.cursor() as cur:
+            return cur.execute(
+                INSERT_EXAMPLE1_SQL, (id, varchar_col, int_col, double_col, datetime_col))
+    finally:
+        _add_pending_writes(conn, id)
+
+
+def insert_example1_many(conn, rows, chunk_size=1000):
+    """ 複数行をまとめて登録する
+
+    chunk_size行ずつ、複数行のINSERT（INSERT ... VALUES (...), (...)）で登録する
+
+    Args:
+        rows: 登録する行のiterable。行は項目名をキーとするdict、または項目の順のtuple
+            （id, varchar_col, int_col, double_col, datetime_col）
+        chunk_size (int, optional):
+            Defaults to 1000.
+            1回のINSERTで登録する行数
+
+    Returns:
+        int: 登録した行数
+    """
+    rowcount = 0
     with conn.cursor() as cur:
-        return cur.execute(
-            sql, (id, varchar_col, int_col, double_col, datetime_col))
+        for chunk in _chunks(rows, chunk_size):
+            values = [_to_example1_values(row) for row in chunk]
+            try:
+                # pymysqlのexecutemany()は、INSERT ... VALUES を複数行のINSERTにまとめて実行する
+                rowcount += cur.executemany(INSERT_EXAMPLE1_SQL, values)
+            finally:
+                _add_pending_writes(conn, *[value[0] for value in values])
+    return rowcount
 
 
 def delete_example1_by_id(conn, id):
     sql = 'delete from example1 where id = %s'
+    try:
+        with conn.cursor() as cur:
+            query_plan.explain(conn, sql, (id, ))
+            return cur.execute(sql, (id, ))
+    finally:
+        _add_pending_writes(conn, id)
+
+
+def delete_example1_by_ids(conn, ids, chunk_size=1000):
+    """ 複数のidの行をまとめて削除する
+
+    chunk_size件ずつ、DELETE ... WHERE id IN (...) で削除する
+
+    Returns:
+        int: 削除した行数
+    """
+    rowcount = 0
     with conn.cursor() as cur:
-        return cur.execute(sql, (id, ))
+        for chunk in _chunks(ids, chunk_size):
+            sql = 'delete from example1 where id in ({})'.format(', '.join(['%s'] * len(chunk)))
+            try:
+                query_plan.explain(conn, sql, chunk)
+                rowcount += cur.execute(sql, chunk)
+            finally:
+                _add_pending_writes(conn, *chunk)
+    return rowcount
+
+
+def _invalidate_cache(*ids):
+    """ 登録、削除した行のキャッシュを削除する """
+    cache = _cache
+    if cache is not None:
+        cache.invalidate(*map(int, ids))
+
+
+def _add_pending_writes(conn, *ids):
+    """ 登録、削除した行のキャッシュを削除し、コミット（ロールバック）するまでその接続からキャッシュしない """
+    if _cache is None:
+        return
+    _invalidate_cache(*ids)
+    with _pending_writes_lock:
+        _pending_writes.setdefault(_get_connection_key(conn), set()).update(map(int, ids))
+
+
+def _get_cache(conn):
+    """ connで使えるキャッシュを返す（使えない場合はNone）
+
+    登録、削除した後、トランザクションが終わっていない（コミット、ロールバックしていない）接続はNoneになる
+    トランザクションが終わっている場合は、その間に他の接続がキャッシュした古い値を削除する
+    """
+    cache = _cache
+    if cache is None or not _pending_writes:
+        return cache
+
+    key = _get_connection_key(conn)
+    with _pending_writes_lock:
+        ids = _pending_writes.get(key)
+        if ids is None:
+            return cache
+        # 最後の応答（COMMIT、ROLLBACKなど）の時点で、トランザクション中かどうか
+        if getattr(key, 'server_status', SERVER_STATUS.SERVER_STATUS_IN_TRANS) & \
+                SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            return None
+        del _pending_writes[key]
+    _invalidate_cache(*ids)
+    return cache
+
+
+def _get_connection_key(conn):
+    """ _pending_writesのキーにする接続（プールから借りた接続の場合は元の接続）を返す """
+    return getattr(conn, '_conn', None) or conn
+
+
+def _to_example1_values(row):
+    """ 行（dictまたはtuple）を、登録する項目の順のtupleにする """
+    if isinstance(row, dict):
+        return tuple(row[column] for column in EXAMPLE1_COLUMNS)
+    return tuple(row)
+
+
+def _chunks(iterable, chunk_size):
+    """ iterableをchunk_size件ずつのリストにして返す """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
 
 
 def main():
-    try:
-        conn = database_connection.get_connection()
+    with database_connection.get_pool().connection() as conn:
         result = select_example1_by_id(conn, 11)
         print(result)
-    finally:
-        conn.close()
 
 
 if __name__ == '__main__':
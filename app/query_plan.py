@@ -0,0 +1,163 @@
+""" 実行するSQLの実行計画（EXPLAIN）を記録する診断用の機能
+
+有効にすると、SQLの形（テンプレート）ごとに1回だけ EXPLAIN を実行し、
+アクセス方法（type）、参照する行数（rows）、ファイルソート（Using filesort）の有無などを記録する
+テーブルを全件参照する（type = ALL）SQLがあった場合は、FullTableScanWarningを出す
+
+インデックスがないことによる性能劣化を、CIのテストで検出するために使う
+有効にするには enable() を呼ぶか、環境変数 QUERY_PLAN_DIAGNOSTICS=1 を指定する
+
+使用例）
+    recorder = query_plan.enable()
+    example1.select_example1(conn, start=datetime(2018, 1, 1))
+    for plan in recorder.full_table_scans():
+        print(plan.template, plan.rows)
+"""
+import os
+import re
+import threading
+import warnings
+from logging import getLogger
+
+import pymysql.cursors
+
+logger = getLogger(__name__)
+
+# EXPLAINを実行するSQL（INSERTは実行計画がないため対象外）
+EXPLAINABLE_SQL = re.compile(r'^\s*(select|update|delete)\b', re.IGNORECASE)
+# IN (%s, %s, ...) のプレースホルダの数が違っても、同じテンプレートとして扱う
+PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+class FullTableScanWarning(UserWarning):
+    pass
+
+
+class QueryPlan:
+    """ EXPLAINの結果（1テーブル分）
+
+    Attributes:
+        template: SQLのテンプレート
+        table: テーブル名
+        access_type: アクセス方法（const, ref, range, index, ALL など）
+        key: 使用したインデックス
+        rows: 参照すると見積もられた行数
+        filesort: ファイルソートを使うかどうか
+        temporary: 一時テーブルを使うかどうか
+        analyze: EXPLAIN ANALYZE の結果（analyze=Trueの場合のみ）
+    """
+
+    def __init__(self, template, table, access_type, key, rows, filesort, temporary, analyze=None):
+        self.template = template
+        self.table = table
+        self.access_type = access_type
+        self.key = key
+        self.rows = rows
+        self.filesort = filesort
+        self.temporary = temporary
+        self.analyze = analyze
+
+    @property
+    def full_table_scan(self):
+        return self.access_type == 'ALL'
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class QueryPlanRecorder:
+    """ SQLのテンプレートごとに実行計画を記録する
+
+    Args:
+        analyze (bool, optional):
+            Defaults to False.
+            EXPLAIN ANALYZE（MySQL 8.0.18以降）も実行するかどうか。SELECTのみ、実際にSQLが実行される
+        min_rows (int, optional):
+            Defaults to 0.
+            全件参照でも、見積もりの行数がこれより少ない場合は警告しない
+    """
+
+    def __init__(self, analyze=False, min_rows=0):
+        self.analyze = analyze
+        self.min_rows = min_rows
+        # テンプレート: QueryPlanのリスト
+        self.plans = {}
+        self._lock = threading.Lock()
+
+    def explain(self, conn, sql, params=None):
+        """ まだ記録していないテンプレートであれば、EXPLAINを実行して記録する """
+        if not EXPLAINABLE_SQL.match(sql):
+            return
+        template = PLACEHOLDER_LIST.sub('(%s, ...)', ' '.join(sql.split()))
+        with self._lock:
+            if template in self.plans:
+                return
+            # 同じテンプレートを複数のスレッドで同時にEXPLAINしないようにする
+            self.plans[template] = []
+
+        with conn.cursor(pymysql.cursors.DictCursor) as cur:
+            cur.execute("EXPLAIN " + sql, params)
+            results = cur.fetchall()
+            analyze = None
+            if self.analyze and sql.lstrip().lower().startswith('select'):
+                cur.execute("EXPLAIN ANALYZE " + sql, params)
+                analyze = '\n'.join(list(row.values())[0] for row in cur.fetchall())
+
+        plans = []
+        for result in results:
+            extra = result.get('Extra') or ''
+            plan = QueryPlan(
+                template,
+                table=result.get('table'),
+                access_type=result.get('type'),
+                key=result.get('key'),
+                rows=result.get('rows'),
+                filesort='Using filesort' in extra,
+                temporary='Using temporary' in extra,
+                analyze=analyze)
+            plans.append(plan)
+            logger.debug("QUERY PLAN: {}".format(plan.to_dict()))
+            if plan.full_table_scan and (plan.rows or 0) >= self.min_rows:
+                warnings.warn("Full table scan on `{}` (rows={}): {}".format(plan.table, plan.rows, template),
+                              FullTableScanWarning, stacklevel=3)
+        with self._lock:
+            self.plans[template] = plans
+
+    def full_table_scans(self):
+        """ 全件参照する実行計画のリストを返す """
+        return [plan for plans in list(self.plans.values()) for plan in plans if plan.full_table_scan]
+
+    def to_list(self):
+        return [plan.to_dict() for plans in list(self.plans.values()) for plan in plans]
+
+
+_recorder = None
+
+
+def enable(analyze=False, min_rows=0):
+    """ 実行計画の記録を有効にし、QueryPlanRecorderを返す """
+    global _recorder
+    _recorder = QueryPlanRecorder(analyze=analyze, min_rows=min_rows)
+    return _recorder
+
+
+def disable():
+    """ 実行計画の記録を無効にする """
+    global _recorder
+    _recorder = None
+
+
+def get_recorder():
+    """ 有効なQueryPlanRecorderを返す（無効の場合はNone） """
+    return _recorder
+
+
+def explain(conn, sql, params=None):
+    """ 有効な場合のみ、SQLの実行計画を記録する（無効の場合は何もしない） """
+    recorder = _recorder
+    if recorder is not None:
+        recorder.explain(conn, sql, params)
+
+
+if os.getenv('QUERY_PLAN_DIAGNOSTICS') == '1':
+    enable()
@@ -0,0 +1,4 @@
+docker-compose stop
+docker-compose build
+docker-compose up -d
+docker exec python sh -c "cd /csv_to_db && python -m benchmarks.bench_csv_to_db $*"
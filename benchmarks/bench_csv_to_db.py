@@ -0,0 +1,225 @@
+"""
+csv_to_db.load() のスループットを計測します.
+
+generate_csv で作成したファイルを docker-compose のMySQLに登録し、
+行数/秒、MB/秒、最大メモリ使用量（RSS）、処理ごとの時間を計測します。
+結果はJSONで保存し、基準の結果（--baseline）と比較して性能の劣化を検出します。
+
+処理ごとの時間について
+    parse:   csvファイルの読み込み（圧縮したファイルは展開を含む。csv.reader）
+    convert: DBに登録する値への変換（load()の読み込みと変換の時間から parse を除いた時間）
+    execute: SQLの実行（load()の処理結果のexecute_time）
+    commit:  コミット
+    overlap: parse のうち、SQLの実行と並行して処理できた時間（parse + execute - load()の時間）
+             圧縮したファイルは別スレッドで展開するため、展開の時間がSQLの実行と重なる
+
+使用例）
+    python -m benchmarks.bench_csv_to_db --rows 100000 --batch-size 1000 --output result.json
+    python -m benchmarks.bench_csv_to_db --rows 100000 --batch-size 1000 --compression gz
+    python -m benchmarks.bench_csv_to_db --rows 100000 --batch-size 1000 --baseline result.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from app import database_connection
+from benchmarks import generate_csv
+from helper import csv_to_db
+
+# ベンチマークで作成するテーブル
+TABLE = 'bench_csv_to_db'
+
+# 基準と比較する項目（大きいほど良い）
+COMPARED_METRICS = ('rows_per_sec', 'mb_per_sec')
+
+
+def run(filepath, rows, column_types, repeat=3, **load_options):
+    """
+    ファイルを登録して計測します.
+
+    Args:
+        filepath:
+            登録するファイルのパス
+        rows (int):
+            ファイルのデータの行数
+        column_types (list):
+            id以外の項目の型のリスト
+        repeat (int, optional):
+            Defaults to 3.
+            計測する回数。結果は中央値にする
+        load_options:
+            csv_to_db.load() に渡す引数
+
+    Returns:
+        dict: 計測結果
+    """
+    delimiter = csv_to_db._get_delimiter(filepath)
+    file_bytes = os.path.getsize(filepath)
+
+    conn = database_connection.get_connection(local_infile=load_options.get('local_infile', False))
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS {}".format(TABLE))
+            cur.execute(generate_csv.create_table_sql(TABLE, column_types))
+
+        measurements = []
+        for _ in range(repeat):
+            parse_time = _measure_parse(filepath, delimiter)
+
+            start = time.perf_counter()
+            report = csv_to_db.load(conn, **dict(load_options, **{TABLE: filepath}))
+            load_time = time.perf_counter() - start
+            table_report = report[TABLE]
+
+            start = time.perf_counter()
+            conn.commit()
+            commit_time = time.perf_counter() - start
+
+            total_time = load_time + commit_time
+            measurements.append({
+                'rows_per_sec': rows / total_time,
+                'mb_per_sec': file_bytes / 1000000 / total_time,
+                'total_sec': total_time,
+                'parse_sec': parse_time,
+                'convert_sec': max(table_report.parse_time - parse_time, 0.0),
+                'execute_sec': table_report.execute_time,
+                'truncate_sec': table_report.truncate_time,
+                'commit_sec': commit_time,
+                'overlap_sec': max(parse_time + table_report.execute_time - load_time, 0.0),
+                'statements': table_report.statement_count,
+            })
+
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS {}".format(TABLE))
+    finally:
+        conn.close()
+
+    result = {key: statistics.median(m[key] for m in measurements) for key in measurements[0]}
+    result['peak_rss_kb'] = _get_peak_rss_kb()
+    result['file_bytes'] = file_bytes
+    result['rows'] = rows
+    return result
+
+
+def compare(result, baseline, tolerance):
+    """
+    基準の結果と比較して、劣化している項目のリストを返します.
+
+    Args:
+        result (dict): 今回の計測結果
+        baseline (dict): 基準の計測結果
+        tolerance (float): 許容する劣化の割合（0.1の場合、10%までの劣化は許容する）
+
+    Returns:
+        list: (項目名, 今回の値, 基準の値) のリスト
+    """
+    regressions = []
+    for metric in COMPARED_METRICS:
+        if metric not in baseline:
+            continue
+        if result[metric] < baseline[metric] * (1 - tolerance):
+            regressions.append((metric, result[metric], baseline[metric]))
+    return regressions
+
+
+def _measure_parse(filepath, delimiter):
+    start = time.perf_counter()
+    with csv_to_db._open_csv(filepath, delimiter) as csv_reader:
+        for _ in csv_reader:
+            pass
+    return time.perf_counter() - start
+
+
+def _get_peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト単位、Linuxはキロバイト単位
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # 作成するファイル
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=8, help="id以外の項目数")
+    parser.add_argument('--types', default=','.join(generate_csv.COLUMN_TYPES),
+                        help="項目の型（カンマ区切り）。項目数分を順番に繰り返す")
+    parser.add_argument('--null-ratio', type=float, default=0.1)
+    parser.add_argument('--empty-ratio', type=float, default=0.05)
+    parser.add_argument('--quote-ratio', type=float, default=0.1)
+    parser.add_argument('--format', choices=('csv', 'tsv'), default='csv')
+    parser.add_argument('--compression', choices=('gz', 'bz2', 'xz'), help="ファイルを圧縮する形式")
+    parser.add_argument('--seed', type=int, default=0)
+    # csv_to_db.load() の引数
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--local-infile', action='store_true')
+    parser.add_argument('--commit-interval', type=int, default=0)
+    parser.add_argument('--table-jobs', type=int, default=1, help="1テーブルを並列で登録するプロセス数")
+    # 計測
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="計測結果を保存するJSONファイル")
+    parser.add_argument('--baseline', help="比較する基準の計測結果のJSONファイル")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="許容する劣化の割合（0.1の場合、10%%までの劣化は許容する）")
+    args = parser.parse_args()
+
+    column_types = generate_csv.get_column_types(args.columns, args.types.split(','))
+    params = {
+        'rows': args.rows,
+        'column_types': column_types,
+        'null_ratio': args.null_ratio,
+        'empty_ratio': args.empty_ratio,
+        'quote_ratio': args.quote_ratio,
+        'format': args.format,
+        'compression': args.compression,
+        'seed': args.seed,
+        'batch_size': args.batch_size,
+        'local_infile': args.local_infile,
+        'commit_interval': args.commit_interval,
+        'table_jobs': args.table_jobs,
+    }
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepath = os.path.join(tempdir, '{}.{}'.format(TABLE, args.format))
+        if args.compression:
+            filepath += '.' + args.compression
+        generate_csv.generate(filepath, args.rows, column_types, null_ratio=args.null_ratio,
+                              empty_ratio=args.empty_ratio, quote_ratio=args.quote_ratio, seed=args.seed)
+        result = run(filepath, args.rows, column_types, repeat=args.repeat,
+                     batch_size=args.batch_size, local_infile=args.local_infile,
+                     commit_interval=args.commit_interval, table_jobs=args.table_jobs)
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'params': params,
+        'result': result,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, mode='w', encoding='utf_8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, mode='r', encoding='utf_8') as f:
+            baseline = json.load(f)
+        if baseline['params'] != params:
+            print("WARNING: parameters differ from the baseline", file=sys.stderr)
+        regressions = compare(result, baseline['result'], args.tolerance)
+        for metric, value, baseline_value in regressions:
+            print("REGRESSION: {}: {:.2f} (baseline: {:.2f})".format(metric, value, baseline_value),
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
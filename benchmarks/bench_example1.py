@@ -0,0 +1,104 @@
+"""
+app.example1.select_example1() の1回あたりの処理時間（DBの処理時間を除く）を計測します.
+
+DBには接続せず、何もしないカーソルで呼び出すため、SQLの作成とログ出力の時間だけを計測します
+以下を比較します
+    legacy:   呼び出しごとにSQLを作成し、標準出力に出力する（以前の実装と同じ処理）
+    uncached: 呼び出しごとにSQLを作成する（ログは出力しない）
+    cached:   作成済みのSQLを使う（現在の実装）
+
+使用例）
+    python -m benchmarks.bench_example1 --number 100000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from app import example1
+
+
+class _NullCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def execute(self, sql, params=None):
+        return 0
+
+    def fetchall(self):
+        return []
+
+
+class _NullConnection:
+    def cursor(self):
+        return _NullCursor()
+
+
+def _legacy_select_example1(conn, start=None, end=None, sort=example1.Sort.id, order=example1.Order.asc):
+    sql = "select * from example1 where 1 = 1"
+    params = {}
+    if start:
+        sql += " and datetime_col >= %(start)s"
+        params["start"] = start
+    if end:
+        sql += " and datetime_col <= %(end)s"
+        params["end"] = end
+    sql += " order by {} {}".format(sort.name, order.name)
+    print(sql)
+
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def _uncached_select_example1(conn, start=None, end=None, sort=example1.Sort.id, order=example1.Order.asc):
+    sql = example1._create_select_example1_sql.__wrapped__(bool(start), bool(end), sort, order)
+    params = {"start": start, "end": end}
+
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def run(number):
+    """
+    各実装を number 回呼び出し、1回あたりの処理時間（マイクロ秒）を返します.
+
+    Returns:
+        dict: 実装名をキー、1回あたりの処理時間（マイクロ秒）を値とするdict
+    """
+    conn = _NullConnection()
+    kwargs = dict(start=datetime(2018, 1, 1), end=datetime(2018, 1, 2),
+                  sort=example1.Sort.datetime_col, order=example1.Order.desc)
+    functions = {
+        'legacy': _legacy_select_example1,
+        'uncached': _uncached_select_example1,
+        'cached': example1.select_example1,
+    }
+
+    result = {}
+    with open(os.devnull, mode='w') as devnull, redirect_stdout(devnull):
+        for name, function in functions.items():
+            elapsed = min(timeit.repeat(lambda: function(conn, **kwargs), number=number, repeat=3))
+            result[name] = elapsed / number * 1000000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=100000, help="計測で呼び出す回数")
+    args = parser.parse_args()
+
+    result = run(args.number)
+    print(json.dumps({'usec_per_call': result}, indent=2))
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
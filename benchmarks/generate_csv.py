@@ -0,0 +1,183 @@
+"""
+csv_to_db のベンチマーク用に、決まった内容のcsvファイル（tsvファイル）を作成します.
+
+同じ引数（seedを含む）であれば、毎回同じ内容のファイルになります
+拡張子に .gz, .bz2, .xz を付けると、圧縮したファイルを作成します
+
+使用例）
+    python -m benchmarks.generate_csv --rows 100000 --columns 8 path/to/bench.csv
+    python -m benchmarks.generate_csv --rows 100000 --columns 8 path/to/bench.csv.gz
+"""
+import argparse
+import bz2
+import csv
+import gzip
+import lzma
+import os
+import random
+import string
+from datetime import datetime, timedelta
+
+# 項目の型
+TYPE_INT = 'int'
+TYPE_DOUBLE = 'double'
+TYPE_VARCHAR = 'varchar'
+TYPE_DATETIME = 'datetime'
+COLUMN_TYPES = (TYPE_INT, TYPE_DOUBLE, TYPE_VARCHAR, TYPE_DATETIME)
+
+# 圧縮形式（拡張子）ごとのファイルを開く関数
+COMPRESSIONS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+# 項目の型ごとのテーブル定義
+COLUMN_DEFINITIONS = {
+    TYPE_INT: 'INT DEFAULT NULL',
+    TYPE_DOUBLE: 'DOUBLE DEFAULT NULL',
+    TYPE_VARCHAR: 'VARCHAR({}) DEFAULT NULL',
+    TYPE_DATETIME: 'DATETIME DEFAULT NULL',
+}
+
+# varcharの最大文字数
+VARCHAR_LENGTH = 32
+
+# 日時の範囲
+DATETIME_START = datetime(2000, 1, 1)
+DATETIME_SECONDS = 30 * 365 * 24 * 60 * 60
+
+
+def get_column_types(columns, types=COLUMN_TYPES):
+    '''項目数分の型を返す（typesを順番に繰り返す）'''
+    return [types[i % len(types)] for i in range(columns)]
+
+
+def get_column_names(column_types):
+    '''項目名を返す（先頭は主キーのid）'''
+    return ['id'] + ['col{}'.format(i + 1) for i in range(len(column_types))]
+
+
+def create_table_sql(table, column_types):
+    '''
+    戻り値のイメージ:
+        CREATE TABLE bench (id INT NOT NULL, col1 INT DEFAULT NULL, ..., PRIMARY KEY (id))
+    '''
+    columns = ['id INT NOT NULL']
+    for name, column_type in zip(get_column_names(column_types)[1:], column_types):
+        definition = COLUMN_DEFINITIONS[column_type].format(VARCHAR_LENGTH)
+        columns.append('{} {}'.format(name, definition))
+    columns.append('PRIMARY KEY (id)')
+    return "CREATE TABLE {} ({}) DEFAULT CHARSET=utf8mb4".format(table, ', '.join(columns))
+
+
+def generate(filepath, rows, column_types, null_ratio=0.1, empty_ratio=0.05, quote_ratio=0.1, seed=0):
+    """
+    csvファイル（tsvファイル）を作成します.
+    区切り文字は拡張子で決まります（tsvの場合はタブ、それ以外はカンマ）
+    拡張子に .gz, .bz2, .xz を付けた場合は、圧縮したファイルを作成します
+
+    Args:
+        filepath:
+            作成するファイルのパス
+        rows (int):
+            データの行数（ヘッダを除く）
+        column_types (list):
+            id以外の項目の型のリスト
+        null_ratio (float, optional):
+            Defaults to 0.1.
+            NULL（値なし）にする割合
+        empty_ratio (float, optional):
+            Defaults to 0.05.
+            varcharの項目を空文字列（「-」）にする割合
+        quote_ratio (float, optional):
+            Defaults to 0.1.
+            varcharの項目を、区切り文字や「"」を含む（引用符で囲む必要がある）値にする割合
+        seed (int, optional):
+            Defaults to 0.
+            乱数のシード
+
+    Returns:
+        int: 作成したファイルのバイト数（圧縮した場合は圧縮後のバイト数）
+    """
+    filename, compression = split_compression(filepath)
+    delimiter = '\t' if filename.lower().endswith('.tsv') else ','
+    rand = random.Random(seed)
+    generators = {
+        TYPE_INT: lambda: str(rand.randint(-2 ** 31, 2 ** 31 - 1)),
+        TYPE_DOUBLE: lambda: '{:.3f}'.format(rand.uniform(-1000000, 1000000)),
+        TYPE_VARCHAR: lambda: _random_varchar(rand, delimiter, quote_ratio),
+        TYPE_DATETIME: lambda: _random_datetime(rand),
+    }
+
+    open_file = COMPRESSIONS.get(compression, open)
+    with open_file(filepath, mode='wt', encoding='utf_8', newline='') as f:
+        writer = csv.writer(f, delimiter=delimiter, quotechar='"', lineterminator='\n')
+        writer.writerow(get_column_names(column_types))
+        for i in range(rows):
+            row = [str(i + 1)]
+            for column_type in column_types:
+                r = rand.random()
+                if r < null_ratio:
+                    row.append('')
+                elif column_type == TYPE_VARCHAR and r < null_ratio + empty_ratio:
+                    row.append('-')
+                else:
+                    row.append(generators[column_type]())
+            writer.writerow(row)
+
+    return os.path.getsize(filepath)
+
+
+def split_compression(filepath):
+    """
+    ファイルのパスを、圧縮形式の拡張子（.gz, .bz2, .xz）とそれ以外に分けます.
+
+    Returns:
+        tuple: (圧縮形式の拡張子を除いたパス, 圧縮形式の拡張子（圧縮しない場合は空文字列）)
+    """
+    root, ext = os.path.splitext(filepath)
+    if ext.lower() in COMPRESSIONS:
+        return root, ext.lower()
+    return filepath, ''
+
+
+def _random_varchar(rand, delimiter, quote_ratio):
+    length = rand.randint(1, VARCHAR_LENGTH - 2)
+    value = ''.join(rand.choice(string.ascii_letters) for _ in range(length))
+    if rand.random() < quote_ratio:
+        # 区切り文字、「"」を含む値は、csv.writerが引用符で囲む
+        position = rand.randint(0, len(value))
+        value = value[:position] + rand.choice((delimiter, '"')) + value[position:]
+    # 「-」だけの値は空文字列を表すので使わない
+    return value if value != '-' else 'x'
+
+
+def _random_datetime(rand):
+    value = DATETIME_START + timedelta(seconds=rand.randrange(DATETIME_SECONDS))
+    # 時間部分は省略可能なので、省略した値も含める
+    if rand.random() < 0.2:
+        return value.strftime('%Y-%m-%d')
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('filepath', help="作成するファイルのパス（拡張子はcsvまたはtsv。圧縮する場合は .gz, .bz2, .xz を付ける）")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=8, help="id以外の項目数")
+    parser.add_argument('--types', default=','.join(COLUMN_TYPES),
+                        help="項目の型（カンマ区切り）。項目数分を順番に繰り返す")
+    parser.add_argument('--null-ratio', type=float, default=0.1)
+    parser.add_argument('--empty-ratio', type=float, default=0.05)
+    parser.add_argument('--quote-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    column_types = get_column_types(args.columns, args.types.split(','))
+    generate(args.filepath, args.rows, column_types, null_ratio=args.null_ratio,
+             empty_ratio=args.empty_ratio, quote_ratio=args.quote_ratio, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
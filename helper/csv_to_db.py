@@ -1,25 +1,156 @@
+import bz2
 import csv
+import gzip
+import hashlib
+import io
+import lzma
+import mmap
+import multiprocessing
 import os
+import queue
 import re
 import sys
-from functools import wraps
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import partial, wraps
+from itertools import islice
 from logging import DEBUG, basicConfig, getLogger
 
+import pymysql
+from pymysql.constants import CLIENT, ER
+
 from app import database_connection
+from helper import table_schema
+from helper.load_report import LoadReport, TableReport
 
 # ログ出力設定
 formatter = "%(asctime)s [%(levelname)s] %(message)s"
 basicConfig(level=DEBUG, format=formatter)
 logger = getLogger(__name__)
 
+# max_allowed_packetのうち、SQL以外（パケットヘッダなど）に使う分として残しておくバイト数
+PACKET_MARGIN = 1024
+
+# load()のmode
+# 登録（truncate=Trueの場合は削除してから登録）
+MODE_INSERT = 'insert'
+# csvファイルとテーブルの差分だけを反映
+MODE_SYNC = 'sync'
+
+# MySQLの識別子（テーブル名など）の最大長
+MAX_IDENTIFIER_LENGTH = 64
+
+# 登録したファイルのフィンガープリントを管理するテーブル
+FINGERPRINT_TABLE = 'csv_to_db_fingerprint'
+
+# 登録するファイル名（テーブル名.csv, テーブル名.tsv。圧縮したファイルは .gz, .bz2, .xz を付ける）
+# 1テーブルを複数のファイルに分割した場合は、テーブル名.part-0001.csv のように連番を付ける
+FILENAME_PATTERN = re.compile(
+    '^(?P<table>.+?)(\\.part-(?P<part>\\d+))?\\.(?P<format>csv|tsv)(\\.(?P<compression>gz|bz2|xz))?$',
+    re.IGNORECASE)
+# 圧縮形式ごとのファイルを開く関数
+COMPRESSIONS = {
+    'gz': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open,
+}
+# 圧縮したファイルを、別スレッドで先に読み込んでおく行数（PREFETCH_ROWS行ずつ、PREFETCH_CHUNKS回分）
+PREFETCH_ROWS = 1000
+PREFETCH_CHUNKS = 4
+# validate_files()で、1回にまとめて確認する行数
+VALIDATE_BATCH_ROWS = 1000
+# ValidationErrorのメッセージに含める不正な値の数（すべての不正な値はviolationsで参照する）
+VALIDATION_MESSAGE_LIMIT = 20
+# 行の値が原因のエラーのエラーコード（失敗したINSERT文の行を半分ずつに分けて実行し直し、登録できない行を特定する）
+# pymysqlの例外クラスはエラーコードによって異なる（1292はOperationalErrorになる）ため、エラーコードで判定する
+ROW_ERRORS = frozenset((
+    ER.BAD_NULL_ERROR,                   # 1048: Column cannot be null
+    ER.DUP_ENTRY,                        # 1062: Duplicate entry
+    ER.NO_REFERENCED_ROW,                # 1216: Cannot add or update a child row
+    ER.WARN_NULL_TO_NOTNULL,             # 1263: Column set to default value; NULL supplied to NOT NULL column
+    ER.WARN_DATA_OUT_OF_RANGE,           # 1264: Out of range value
+    ER.WARN_DATA_TRUNCATED,              # 1265: Data truncated
+    ER.TRUNCATED_WRONG_VALUE,            # 1292: Incorrect datetime value など
+    ER.INVALID_CHARACTER_STRING,         # 1300: Invalid utf8 character string
+    ER.NO_DEFAULT_FOR_FIELD,             # 1364: Field doesn't have a default value
+    ER.DIVISION_BY_ZERO,                 # 1365: Division by 0
+    ER.TRUNCATED_WRONG_VALUE_FOR_FIELD,  # 1366: Incorrect integer value など
+    ER.DATA_TOO_LONG,                    # 1406: Data too long
+    ER.NO_REFERENCED_ROW_2,              # 1452: Cannot add or update a child row
+    3819,                                # Check constraint is violated（MySQL 8.0.16以降）
+))
+# table_jobs > 1 の場合に、1つのファイルを分割する範囲の最小のバイト数
+SPLIT_MIN_BYTES = 1024 * 1024
+# ファイルを分割する位置を探すときに、1回に読み込むバイト数
+SPLIT_CHUNK_BYTES = 1024 * 1024
+
 
 class SQLException(Exception):
     def __init__(self, message):
         self.message = message
 
 
-def init_db(conn, csv_dir):
+class ValidationError(SQLException):
+    """validate=Trueの場合に、登録前の確認で不正な値が見つかったことを表す例外です.
+
+    Attributes:
+        violations: 見つかったすべての不正な値（Violationのリスト）
+    """
+
+    def __init__(self, violations):
+        lines = [str(violation) for violation in violations[:VALIDATION_MESSAGE_LIMIT]]
+        if len(violations) > VALIDATION_MESSAGE_LIMIT:
+            lines.append("... and {} more".format(len(violations) - VALIDATION_MESSAGE_LIMIT))
+        super().__init__("{} invalid values found:\n{}".format(len(violations), '\n'.join(lines)))
+        self.violations = violations
+
+    def __str__(self):
+        return self.message
+
+
+class Violation:
+    """
+    ファイルの1箇所の不正な値です.
+
+    Attributes:
+        filepath: ファイルパス
+        line: 行番号（1行目はヘッダ。値に改行を含む行は、行の始まりの行番号）
+        table: テーブル名
+        column: 項目名（行全体の問題の場合はNone）
+        message: 内容
+    """
+
+    def __init__(self, filepath, line, table, column, message):
+        self.filepath = filepath
+        self.line = line
+        self.table = table
+        self.column = column
+        self.message = message
+
+    def __str__(self):
+        return "{}:{}: `{}`: {}".format(self.filepath, self.line, self.table, self.message)
+
+
+def init_db(conn, csv_dir, batch_size: int=1, local_infile: bool=False,
+            jobs: int=1, connection_factory=None, commit_interval: int=0,
+            skip_unchanged: bool=False, mode: str=MODE_INSERT, table_jobs: int=1,
+            validate: bool=False, reject_file: str=None, foreign_key_order: bool=False):
+    targets = _find_targets(csv_dir)
+    return load(conn, batch_size=batch_size, local_infile=local_infile,
+                jobs=jobs, connection_factory=connection_factory, commit_interval=commit_interval,
+                skip_unchanged=skip_unchanged, mode=mode, table_jobs=table_jobs,
+                validate=validate, reject_file=reject_file, foreign_key_order=foreign_key_order, **targets)
+
+
+def _find_targets(csv_dir):
+    '''ディレクトリ内の登録するファイルを探して、テーブル名をキー、ファイルパスを値とするdictを返す
+
+    分割したファイル（テーブル名.part-0001.csv など）は、連番の順のファイルパスのリストを値にする
+    '''
     targets = {}
+    parts = {}
 
     items = os.listdir(csv_dir)
     for item in items:
@@ -27,20 +158,30 @@ def init_db(conn, csv_dir):
         if not os.path.isfile(filepath):
             continue
 
-        extention = os.path.splitext(item)[1]
-        if not re.match('\\.(csv|tsv)', extention, re.IGNORECASE):
+        match = FILENAME_PATTERN.match(item)
+        if not match:
             continue
 
-        table = os.path.splitext(item)[0]
-        targets[table] = filepath
+        table = match.group('table')
+        if match.group('part'):
+            parts.setdefault(table, []).append((int(match.group('part')), filepath))
+        else:
+            targets[table] = filepath
 
-    load(conn, **targets)
+    for table, numbered_filepaths in parts.items():
+        if table in targets:
+            raise ValueError("Both a file and its parts exist: {}".format(targets[table]))
+        targets[table] = [filepath for _, filepath in sorted(numbered_filepaths)]
+    return targets
 
 
-def setup_load(truncate: bool=True, **targets):
+def setup_load(truncate: bool=True, batch_size: int=1, local_infile: bool=False,
+               jobs: int=1, skip_unchanged: bool=False, pool=None, **targets):
     """load()を実行するデコレータです.
     ※load()とは違いコミットします
 
+    poolを指定した場合、接続はコネクションプールから借ります（テストごとに接続しません）
+
     使用時の注意事項
         テストメソッドのトランザクションとデコレータのトランザクションが異なるため、
         デコレータ実行時にテストメソッドのトランザクションが開始されていると、
@@ -49,15 +190,19 @@ def setup_load(truncate: bool=True, **targets):
 
         metadata lockの最も簡単な回避策は、
         setUp()でcommit()またはrollback()を行うことです。
+        テストごとにデータを元に戻すだけであれば、SavepointFixtureを使うと発生しません。
     """
     def _setup_load(func):
         # 関数名がデコレータで上書きされてしまうのを防ぐ
         @wraps(func)
         def wrapper(*args, **kwargs):
             try:
-                conn = database_connection.get_connection()
+                conn = database_connection.get_connection(local_infile=local_infile, pool=pool)
                 conn.begin()
-                load(conn, truncate=truncate, **targets)
+                load(conn, truncate=truncate, batch_size=batch_size,
+                     local_infile=local_infile, jobs=jobs, skip_unchanged=skip_unchanged,
+                     connection_factory=pool.get_connection if pool else None,
+                     **targets)
                 conn.commit()
             except Exception as e:
                 conn.rollback()
@@ -69,10 +214,136 @@ def setup_load(truncate: bool=True, **targets):
     return _setup_load
 
 
-def load(conn, truncate: bool=True, **targets):
+class ColumnBatch:
+    """複数行の値を、項目ごとのリストとして保持します（_read_batches()が返すバッチです）
+
+    値の変換とINSERT文のエスケープは、項目ごとにまとめて行います
+
+    Attributes:
+        columns: 項目ごとの値のリストのリスト（ヘッダの項目の順）
+        size: 行数
+        source: 変換前の行（csvファイルの値）のリスト
+        indexes: 各行の、読み込んだ行の中での位置（Noneの場合は読み込んだ順のまま）
+        invalid: 変換できなかったため除いた行。(読み込んだ行の中での位置, 変換前の行, エラーメッセージ) のリスト
+    """
+
+    def __init__(self, columns, size, source=None, indexes=None, invalid=None):
+        self.columns = columns
+        self.size = size
+        self.source = source
+        self.indexes = indexes
+        self.invalid = invalid or []
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def read_count(self):
+        """読み込んだ行数（変換できなかった行を含む）"""
+        return self.size + len(self.invalid)
+
+    def index(self, i):
+        """i行目の、読み込んだ行の中での位置を返します"""
+        return i if self.indexes is None else self.indexes[i]
+
+    def rows(self):
+        """行ごとの値のタプルを返します（1行ずつ登録する場合に使います）"""
+        return zip(*self.columns)
+
+
+class SavepointFixture:
+    """データを1回だけ登録し、テストごとにSAVEPOINTまでロールバックして元に戻すフィクスチャです.
+
+    setup()でデータを登録してコミットした後、トランザクションを開始してSAVEPOINTを設定します
+    テストではこのフィクスチャのconnを使い、テストごとにreset()を呼ぶと、
+    テストで行った変更だけがロールバックされます（TRUNCATEと登録をやり直しません）
+
+    setup_load()とは違い、同じ接続でロールバックするため、metadata lockも発生しません
+
+    使用時の注意事項
+        テストでコミットした場合や、DDL（TRUNCATEなど）を実行した場合はSAVEPOINTがなくなります
+        その場合、reset()はデータの登録からやり直します
+
+    使用例）
+        @classmethod
+        def setUpClass(cls):
+            cls.conn = database_connection.get_connection()
+            cls.fixture = csv_to_db.SavepointFixture(cls.conn, example1='path/to/example1.csv')
+            cls.fixture.setup()
+
+        @classmethod
+        def tearDownClass(cls):
+            cls.fixture.teardown()
+            cls.conn.close()
+
+        def tearDown(self):
+            self.fixture.reset()
+    """
+
+    def __init__(self, conn, savepoint: str='csv_to_db_fixture', **load_options):
+        """
+        Args:
+            conn: 接続
+            savepoint (str, optional):
+                Defaults to 'csv_to_db_fixture'.
+                SAVEPOINTの名前
+            load_options:
+                load()に渡す引数（テーブル名とファイルのパスを含む）
+        """
+        self.conn = conn
+        self.savepoint = savepoint
+        self.load_options = load_options
+
+    def setup(self):
+        """データを登録してコミットし、SAVEPOINTを設定します"""
+        try:
+            load(self.conn, **self.load_options)
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            raise e
+        self.conn.begin()
+        with self.conn.cursor() as cur:
+            cur.execute("SAVEPOINT {}".format(self.savepoint))
+
+    def reset(self):
+        """SAVEPOINTまでロールバックして、setup()の直後の状態に戻します"""
+        try:
+            with self.conn.cursor() as cur:
+                # ロールバックした後もSAVEPOINTは残るので、次のテストでもそのまま使える
+                cur.execute("ROLLBACK TO SAVEPOINT {}".format(self.savepoint))
+        except pymysql.err.MySQLError as e:
+            if e.args[0] != ER.SP_DOES_NOT_EXIST:
+                raise e
+            # テストでコミットされた場合は、登録からやり直す
+            logger.warning("SAVEPOINT {} does not exist. Load data again.".format(self.savepoint))
+            self.conn.rollback()
+            self.setup()
+
+    def teardown(self):
+        """トランザクションを終了します（setup()以降の変更はロールバックします）"""
+        self.conn.rollback()
+
+    def __enter__(self):
+        self.setup()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.teardown()
+
+
+def load(conn, truncate: bool=True, batch_size: int=1, local_infile: bool=False,
+         jobs: int=1, connection_factory=None, commit_interval: int=0,
+         skip_unchanged: bool=False, mode: str=MODE_INSERT, sync_chunk_size: int=1000,
+         table_jobs: int=1, validate: bool=False, reject_file: str=None, foreign_key_order: bool=False,
+         **targets):
     """
     指定されたcsvファイル（tsvファイル）の内容をテーブルに登録します.
-    ※コミットはしません
+    処理結果（件数、処理時間など）をLoadReportで返します
+    ※コミットはしません（jobs > 1 またはcommit_intervalを指定した場合を除く）
+
+    ファイルは先頭から順に読み込みながら登録するため、
+    ファイルの大きさに関係なくメモリ使用量は一定です
 
     csvファイル（tsvファイル）について
         文字コードはUTF-8で作成してください
@@ -95,6 +366,42 @@ def load(conn, truncate: bool=True, **targets):
 
     外部キー制約について
         一時的に無効にし、最後に有効にしています
+        そのため、テーブルの登録順は関係ありません
+        foreign_key_order=Trueの場合は、外部キー制約を有効にしたまま、参照されるテーブルから順に登録します
+        （下記「外部キーの順での登録について」を参照）
+
+    外部キーの順での登録について（foreign_key_order=True）
+        INFORMATION_SCHEMA.KEY_COLUMN_USAGE から登録するテーブル間の外部キーを取得し、
+        参照されるテーブルが先になるように、テーブルを段階（互いに参照しないテーブルの組）に分けて順に登録します
+        同じ段階のテーブルは、jobs > 1 の場合に並列で登録します
+        外部キー制約を有効にしたまま登録するため、参照先のない行は登録時にエラーになります
+        （reject_fileを指定した場合は、登録できない行として出力します）
+        ※jobs > 1 または table_jobs > 1 の場合は、次の段階の接続から参照できるように段階ごとにコミットします
+          そのため、失敗した場合もそれまでの段階で登録したデータは残ります
+        ※TRUNCATEは外部キー制約を確認しないため、登録しないテーブルから参照されている行も削除されます
+        ※外部キーが循環している場合はValueErrorになります。自分自身を参照する外部キーは順序に影響しません
+          （ファイル内で参照される行を先に書いてください）
+        mode='sync'では使えません
+
+    並列での登録について（jobs > 1）
+        テーブルごとに別々の接続で並列に登録します（connも接続の1つとして使います）
+        すべてのテーブルの登録が成功した場合、すべての接続をコミットします
+        1つでも失敗した場合、すべての接続をロールバックします
+        ※そのため、jobs > 1 の場合はコミットします
+        ※TRUNCATEはロールバックできないため、失敗した場合、削除したデータは戻りません
+
+    登録できない行について（batch_size > 1）
+        複数行のINSERT文が値のエラー（型、一意制約、外部キー制約など）で失敗した場合は、
+        行を半分ずつに分けて実行し直し、登録できない行だけを特定します（それ以外の行は登録されます）
+        そのため、バッチを大きくしても、1行ずつ登録し直さずに登録できない行の行番号がわかります
+
+    1テーブルの並列での登録について（table_jobs > 1）
+        分割したファイル（テーブル名.part-0001.csv など。それぞれにヘッダが必要）はファイルごとに、
+        1つの大きなファイルは行の区切りでバイト範囲に分割して、プロセスプールで並列に登録します
+        プロセスごとに database_connection.get_connection() で接続し、登録が終わるとコミットします
+        ※そのため、失敗した場合も他のプロセスで登録したデータは残ります
+        圧縮したファイルは途中から読み込めないため、分割せずにファイルごとに登録します
+        local_infileが有効な場合は、LOAD DATA LOCAL INFILE で順に登録します（table_jobsは無視されます）
 
     Args:
         conn:
@@ -102,45 +409,1330 @@ def load(conn, truncate: bool=True, **targets):
         truncate (bool, optional):
             Defaults to True.
             登録前に削除を行うかどうか。Trueの場合、削除を行う。
+        batch_size (int, optional):
+            Defaults to 1.
+            1回のINSERTでまとめて登録する行数。
+            2以上の場合、複数行のINSERT（INSERT ... VALUES (...), (...)）で登録する。
+            1文の長さはサーバのmax_allowed_packetを超えないように分割される。
+        local_infile (bool, optional):
+            Defaults to False.
+            LOAD DATA LOCAL INFILE でファイルをそのままサーバに渡して登録するかどうか。
+            接続（get_connection(local_infile=True)）とサーバ（local_infile=ON）の両方で
+            有効になっていない場合は、Trueでも通常の登録処理で登録する。
+            値が不正な場合など、LOAD DATAで警告が発生した場合はエラーにする。
+        jobs (int, optional):
+            Defaults to 1.
+            並列で登録するテーブル数（使用する接続数）。
+        connection_factory (callable, optional):
+            Defaults to None.
+            jobs > 1 の場合に、追加の接続を作成する関数。
+            Noneの場合、database_connection.get_connection() を使う。
+            コネクションプールから借りる場合は pool.get_connection を指定する。
+        commit_interval (int, optional):
+            Defaults to 0.
+            指定した行数を登録するごとにコミットする。0の場合、途中でコミットしない。
+            大きなファイルを登録するときに、1トランザクションが大きくなりすぎないようにする。
+            途中でコミットするため、失敗した場合もそれまでに登録したデータは残る。
+            jobs > 1 の場合も各接続で途中でコミットするため、全テーブルをまとめてロールバックできなくなる。
+            LOAD DATA LOCAL INFILE で登録する場合は無視される。
+        skip_unchanged (bool, optional):
+            Defaults to False.
+            前回の登録時からファイル、テーブル定義、テーブルのデータがすべて変わっていない場合、
+            そのテーブルの削除と登録を行わない。truncate=Falseの場合は無視される。
+            登録したファイルのフィンガープリントは csv_to_db_fingerprint テーブルで管理する。
+            （テーブルがない場合は最初の保存時に作成するため、そのときだけ暗黙的にコミットされる）
+            テーブルのデータ（CHECKSUM TABLE）は、ファイルのフィンガープリントが一致した場合だけ比較する。
+        mode (str, optional):
+            Defaults to 'insert'.
+            'insert': csvファイルの内容を登録する（truncate=Trueの場合は削除してから登録する）
+            'sync': csvファイルとテーブルを主キーで比較し、差分だけを登録、更新、削除する。
+                    truncateは無視される。TRUNCATEしないため、ロールバックすると元に戻る。
+                    テーブルには主キーが必要で、csvファイルには主キーの項目が必要。
+                    比較しない項目（csvファイルにない項目）は更新しない。
+        sync_chunk_size (int, optional):
+            Defaults to 1000.
+            mode='sync'の場合に、チェックサムを比較する範囲の行数。
+        table_jobs (int, optional):
+            Defaults to 1.
+            1テーブルを並列で登録するプロセス数。
+            1の場合、分割したファイルも1つの接続で順に登録する。
+        validate (bool, optional):
+            Defaults to False.
+            登録（TRUNCATEを含む）の前に、すべてのファイルの値をテーブル定義と照合する。
+            不正な値が1つでもあれば、何も更新せずにValidationErrorにする（ファイルと行番号を含む）。
+            確認する内容はvalidate_files()と同じ。
+        reject_file (str, optional):
+            Defaults to None.
+            Noneの場合、登録できない行があればSQLExceptionにする（ファイルと行番号を含む）。
+            指定した場合、登録できない行はこのファイルに出力して、残りの行の登録を続ける。
+            出力するファイルは登録するファイルと同じ形式（ヘッダ、区切り文字）なので、修正してそのまま登録できる。
+            行番号と理由は「reject_file.log」に出力する。登録できない行がなくても、ファイルは作成する。
+            「{table}」はテーブル名に置き換える（複数テーブルを登録する場合は必須）。
+            local_infileは無視され、mode='sync'では使えない。
+        foreign_key_order (bool, optional):
+            Defaults to False.
+            外部キー制約を有効にしたまま、外部キーの順に段階に分けて登録する。
         targets:
             テーブル名をキーワードとしてファイルパスを指定してください。複数指定可能
+            分割したファイルは、ファイルパスのリストで指定してください（mode='sync'では使えません）
             例）
             load(conn, USER='path/to/USER.csv', COMPANY='path/to/COMPANY.csv')
+            load(conn, USER=['path/to/USER.part-0001.csv', 'path/to/USER.part-0002.csv'])
+
+    Returns:
+        LoadReport: 処理結果（テーブルごとの件数、処理時間など）
     """
-    try:
-        _set_foreign_key_checks_disabled(conn)
+    tables = sorted(targets.keys())
+    # 登録を始める前に、すべてのファイルを確認する
+    delimiters = {table: _get_delimiter(targets[table]) for table in tables}
 
-        tables = sorted(targets.keys())
+    if mode not in (MODE_INSERT, MODE_SYNC):
+        raise ValueError("Unsupported mode: {}".format(mode))
+    if mode == MODE_SYNC:
         for table in tables:
-            filepath = targets[table]
-            if not os.path.isfile(filepath):
-                raise FileNotFoundError(filepath)
-
-            extention = os.path.splitext(filepath)[1]
-            if re.match('\\.csv', extention, re.IGNORECASE):
-                delimiter = ','
-            elif re.match('\\.tsv', extention, re.IGNORECASE):
-                delimiter = '\t'
-            else:
-                raise ValueError("Unsupported extension: {}".format(filepath))
+            if len(_as_list(targets[table])) > 1:
+                raise ValueError("Sharded files can not be synced: {}".format(table))
+        if reject_file:
+            raise ValueError("reject_file can not be used with mode='sync'")
+        if foreign_key_order:
+            raise ValueError("foreign_key_order can not be used with mode='sync'")
+    if reject_file and len(tables) > 1 and '{table}' not in reject_file:
+        raise ValueError("reject_file must contain {{table}} to load multiple tables: {}".format(reject_file))
 
-            _load(conn, truncate=truncate, table=table, filepath=filepath, delimiter=delimiter)
+    options = dict(truncate=truncate, batch_size=batch_size, local_infile=local_infile,
+                   commit_interval=commit_interval, skip_unchanged=skip_unchanged,
+                   mode=mode, sync_chunk_size=sync_chunk_size, table_jobs=table_jobs,
+                   reject_file=reject_file, foreign_key_checks=foreign_key_order)
+
+    report = LoadReport()
+    start = time.perf_counter()
+
+    if validate:
+        violations = validate_files(conn, **targets)
+        if violations:
+            raise ValidationError(violations)
+
+    # 外部キーの順に登録する場合は、参照されるテーブルから段階ごとに登録する
+    if foreign_key_order:
+        waves = _create_waves(tables, _get_foreign_keys(conn))
+        logger.info("LOAD ORDER: {}".format(' -> '.join(', '.join(wave) for wave in waves)))
+    else:
+        waves = [tables]
+
+    if jobs > 1 and len(tables) > 1:
+        if connection_factory is None:
+            connection_factory = partial(database_connection.get_connection, local_infile=local_infile)
+        table_reports = _load_parallel(conn, waves, targets, delimiters, jobs, connection_factory, **options)
+        for table in tables:
+            report.add(table_reports[table])
+        return _finish_report(report, start)
+
+    try:
+        options['local_infile'] = _prepare_connection(conn, local_infile, foreign_key_order)
+
+        table_reports = {}
+        for wave in waves:
+            for table in wave:
+                table_reports[table] = _load_table(conn, table=table, filepath=targets[table],
+                                                   delimiter=delimiters[table], **options)
+            # 別のプロセスで登録する次の段階から、参照するデータが見えるようにする
+            if foreign_key_order and table_jobs > 1:
+                conn.commit()
 
     finally:
         _set_foreign_key_checks_enabled(conn)
 
+    for table in tables:
+        report.add(table_reports[table])
+    return _finish_report(report, start)
+
+
+def _get_foreign_keys(conn):
+    '''接続しているデータベースの外部キーを取得する
+
+    テーブル名をキー、参照するテーブル名のsetを値とするdictを返す
+    '''
+    sql = (
+        "SELECT DISTINCT TABLE_NAME AS table_name, REFERENCED_TABLE_NAME AS referenced_table_name "
+        "FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_SCHEMA = DATABASE() "
+        "AND REFERENCED_TABLE_NAME IS NOT NULL")
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        results = cur.fetchall()
+
+    foreign_keys = {}
+    for result in results:
+        # DictCursor以外のカーソルでも動くようにする
+        if isinstance(result, dict):
+            table, referenced_table = result['table_name'], result['referenced_table_name']
+        else:
+            table, referenced_table = result
+        foreign_keys.setdefault(table, set()).add(referenced_table)
+    return foreign_keys
+
+
+def _create_waves(tables, foreign_keys):
+    '''外部キーの参照先が先になるように、テーブルを段階ごとのリストに分ける
+
+    各段階は、それより前の段階のテーブルだけを参照するテーブルのリスト（テーブル名の順）になる
+    登録しないテーブルへの参照と、自分自身への参照は無視する
+    外部キーが循環している場合はValueErrorにする
+    '''
+    remaining = {table: set(foreign_keys.get(table, ())).intersection(tables) - {table} for table in tables}
+    waves = []
+    while remaining:
+        wave = sorted(table for table, referenced in remaining.items() if not referenced)
+        if not wave:
+            raise ValueError("Foreign keys have a cycle: {}".format(', '.join(sorted(remaining))))
+        waves.append(wave)
+        for table in wave:
+            del remaining[table]
+        for referenced in remaining.values():
+            referenced.difference_update(wave)
+    return waves
+
+
+def validate_files(conn, **targets):
+    """
+    ファイルの内容をテーブル定義と照合し、不正な値をすべて返します（DBは更新しません）.
+
+    以下を確認します
+        ヘッダの項目がテーブルにあること
+        行ごとの項目数がヘッダと同じであること
+        値が項目の型に変換できること（整数型の範囲、日時の形式、文字列型の最大文字数など）
+        NOT NULLの項目がNULL（値なし）でないこと（AUTO_INCREMENTの項目を除く）
+
+    テーブル定義はtable_schemaでキャッシュしたものを使います
+    ファイルは先頭から順に読み込むため、ファイルの大きさに関係なくメモリ使用量は一定です
+
+    Args:
+        conn:
+            DBコネクション（テーブル定義の取得にだけ使います）
+        targets:
+            load()と同じ
+
+    Returns:
+        list: Violationのリスト（テーブル名、ファイル、行番号の順）。不正な値がない場合は空のリスト
+    """
+    violations = []
+    for table in sorted(targets.keys()):
+        delimiter = _get_delimiter(targets[table])
+        columns = table_schema.get_columns(conn, table)
+        for filepath in _as_list(targets[table]):
+            if not columns:
+                violations.append(Violation(filepath, None, table, None, "Table doesn't exist"))
+                continue
+            logger.info("VALIDATE DATA: {}".format(filepath))
+            violations.extend(_validate_file(table, filepath, delimiter, columns))
+    return violations
+
+
+def _validate_file(table, filepath, delimiter, columns):
+    '''ファイルの内容をテーブル定義（項目名をキー、Columnを値とするdict）と照合する'''
+    violations = []
+    with _open_csv(filepath, delimiter) as csv_reader:
+        header = next(csv_reader, None)
+        if header is None:
+            return violations
+
+        for name in header:
+            if name not in columns:
+                violations.append(Violation(filepath, 1, table, name, "Unknown column '{}'".format(name)))
+        # 項目ごとに (Column, 項目ごとの変換関数, 値ごとの変換関数)。テーブルにない項目はNone
+        checks = [
+            (columns[name], table_schema.create_column_converter(columns[name]),
+             table_schema.create_converter(columns[name])) if name in columns else None
+            for name in header]
+
+        rows = []
+        lines = []
+        # csv.readerのline_numは読み込んだ行数なので、次の行の始まりは line_num + 1 になる
+        line = csv_reader.line_num + 1
+        for row in csv_reader:
+            rows.append(row)
+            lines.append(line)
+            line = csv_reader.line_num + 1
+            if len(rows) >= VALIDATE_BATCH_ROWS:
+                violations.extend(_validate_rows(table, filepath, checks, rows, lines))
+                rows = []
+                lines = []
+        if rows:
+            violations.extend(_validate_rows(table, filepath, checks, rows, lines))
+    return violations
 
-def _load(conn, truncate, table, filepath, delimiter=','):
-    if truncate:
-        _truncate(conn, table)
 
-    with open(filepath, mode='r', encoding='utf_8') as f:
+def _validate_rows(table, filepath, checks, rows, lines):
+    '''複数行の値を項目ごとにまとめて確認し、不正な値をViolationのリスト（行番号の順）で返す
+
+    不正な値がない項目は、項目ごとの変換（create_column_converter()）だけで確認する
+    不正な値がある項目だけ、1つずつ確認して行番号を特定する
+    '''
+    violations = []
+
+    width = len(checks)
+    if set(map(len, rows)) != {width}:
+        valid_rows = []
+        valid_lines = []
+        for row, line in zip(rows, lines):
+            if len(row) == width:
+                valid_rows.append(row)
+                valid_lines.append(line)
+            else:
+                violations.append(Violation(filepath, line, table, None,
+                                            "Column count doesn't match value count: expected {}, got {}".format(
+                                                width, len(row))))
+        rows, lines = valid_rows, valid_lines
+        if not rows:
+            return violations
+
+    for check, values in zip(checks, zip(*rows)):
+        if check is None:
+            continue
+        column, convert_column, convert = check
+
+        try:
+            convert_column(values)
+        except ValueError:
+            for value, line in zip(values, lines):
+                try:
+                    convert(value)
+                except ValueError as e:
+                    violations.append(Violation(filepath, line, table, column.name, str(e)))
+
+        if not column.nullable and not column.auto_increment and '' in values:
+            for value, line in zip(values, lines):
+                if value == '':
+                    violations.append(Violation(filepath, line, table, column.name,
+                                                "Column '{}' cannot be null".format(column.name)))
+
+    violations.sort(key=lambda violation: violation.line)
+    return violations
+
+
+def _finish_report(report, start):
+    report.elapsed_time = time.perf_counter() - start
+    report.finished_at = time.time()
+    logger.info("LOAD FINISHED: {} tables, {} rows, {:.3f} sec".format(
+        len(report.tables), report.rows_inserted, report.elapsed_time))
+    return report
+
+
+def _load_parallel(conn, waves, targets, delimiters, jobs, connection_factory, **options):
+    '''複数の接続を使って、テーブルごとに並列で登録する
+
+    waves（テーブル名のリストのリスト）の段階ごとに順に登録する（接続は段階をまたいで使い回す）
+    すべてのテーブルの登録が成功した場合のみ、すべての接続をコミットする
+    1つでも失敗した場合は、すべての接続をロールバックする
+    （段階が複数ある場合は、次の段階から参照するデータが見えるように、段階ごとにコミットする）
+    テーブル名をキー、TableReportを値とするdictを返す
+    '''
+    connections = [conn]
+    try:
+        for _ in range(min(jobs, max(len(wave) for wave in waves)) - 1):
+            connections.append(connection_factory())
+
+        # 各ワーカーは空いている接続を1つ取り出して使い、終わったら戻す
+        # 接続ごとにLOAD DATA LOCAL INFILEが使えるかどうかが異なるため、登録オプションも接続ごとに持つ
+        idle_connections = queue.Queue()
+        for connection in connections:
+            local_infile = _prepare_connection(connection, options['local_infile'], options['foreign_key_checks'])
+            idle_connections.put((connection, dict(options, local_infile=local_infile)))
+
+        def worker(table):
+            connection, connection_options = idle_connections.get()
+            try:
+                return _load_table(connection, table=table, filepath=targets[table],
+                                   delimiter=delimiters[table], **connection_options)
+            finally:
+                idle_connections.put((connection, connection_options))
+
+        table_reports = {}
+        with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+            for wave in waves:
+                # 大きいファイルから登録すると、全体の処理時間が最も大きいファイルの処理時間に近くなる
+                tables = sorted(wave, key=lambda table: _get_size(targets[table]), reverse=True)
+                futures = [executor.submit(worker, table) for table in tables]
+                done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+                # 1つでも失敗した場合は、まだ始まっていないテーブルの登録はしない
+                for future in not_done:
+                    future.cancel()
+                for future in futures:
+                    if future.done() and not future.cancelled():
+                        future.result()
+
+                for connection in connections:
+                    connection.commit()
+                table_reports.update((table, future.result()) for table, future in zip(tables, futures))
+
+        return table_reports
+
+    except Exception as e:
+        for connection in connections:
+            connection.rollback()
+        raise e
+
+    finally:
+        for connection in connections:
+            _set_foreign_key_checks_enabled(connection)
+        for connection in connections[1:]:
+            connection.close()
+
+
+def _prepare_connection(conn, local_infile, foreign_key_checks=False):
+    '''登録に使う接続の設定を行う
+
+    外部キー制約を無効にし（foreign_key_checks=Trueの場合は有効のまま）、LOAD DATA LOCAL INFILE が使えるかどうかを返す
+    '''
+    if not foreign_key_checks:
+        _set_foreign_key_checks_disabled(conn)
+
+    if local_infile and not _is_local_infile_enabled(conn):
+        logger.warning("LOAD DATA LOCAL INFILE is disabled. Use INSERT instead.")
+        return False
+    return local_infile
+
+
+def _get_delimiter(filepath):
+    '''ファイルの拡張子から区切り文字を返す（分割したファイルのリストの場合は、すべて同じ形式にする）'''
+    if isinstance(filepath, (list, tuple)):
+        delimiters = {_get_delimiter(path) for path in filepath}
+        if len(delimiters) != 1:
+            raise ValueError("Sharded files must have the same format: {}".format(filepath))
+        return delimiters.pop()
+
+    if not os.path.isfile(filepath):
+        raise FileNotFoundError(filepath)
+
+    match = FILENAME_PATTERN.match(os.path.basename(filepath))
+    if not match:
+        raise ValueError("Unsupported extension: {}".format(filepath))
+    return ',' if match.group('format').lower() == 'csv' else '\t'
+
+
+def _as_list(filepath):
+    '''ファイルパス（分割したファイルの場合はリスト）をリストにする'''
+    return list(filepath) if isinstance(filepath, (list, tuple)) else [filepath]
+
+
+def _get_size(filepath):
+    '''ファイルの大きさ（分割したファイルの場合は合計）を返す'''
+    return sum(os.path.getsize(path) for path in _as_list(filepath))
+
+
+def _get_compression(filepath):
+    '''ファイルの拡張子から圧縮形式（gz, bz2, xz）を返す（圧縮していない場合はNone）'''
+    match = FILENAME_PATTERN.match(os.path.basename(filepath))
+    compression = match.group('compression') if match else None
+    return compression.lower() if compression else None
+
+
+def _open_text(filepath):
+    '''ファイルをテキストとして開く
+
+    圧縮したファイルは、一時ファイルを作らずに読み込みながら展開する
+    '''
+    compression = _get_compression(filepath)
+    if compression:
+        return COMPRESSIONS[compression](filepath, mode='rt', encoding='utf_8')
+    return open(filepath, mode='r', encoding='utf_8')
+
+
+@contextmanager
+def _open_csv(filepath, delimiter, prefetch=False):
+    '''ファイルを開いて、行を返すcsv.readerを返す
+
+    prefetch=Trueの場合、圧縮したファイルは別スレッドで展開と読み込みを行い、
+    登録（SQLの実行）と並行して次の行を準備しておく
+    '''
+    with _open_text(filepath) as f:
         csv_reader = csv.reader(f, delimiter=delimiter, quotechar='"')
-        header = next(csv_reader)
+        if not (prefetch and _get_compression(filepath)):
+            yield csv_reader
+            return
+
+        rows = _prefetch(csv_reader)
+        try:
+            yield rows
+        finally:
+            # ファイルを閉じる前に、読み込みのスレッドを終了させる
+            rows.close()
+
+
+def _prefetch(iterable, chunk_size=PREFETCH_ROWS, maxsize=PREFETCH_CHUNKS):
+    '''iterableの要素を、別スレッドでchunk_size件ずつ先に読み込んで返す
+
+    先に読み込むのはmaxsize回分までなので、メモリ使用量は一定になる
+    読み込みで発生した例外は、呼び出し元のスレッドで発生させる
+    '''
+    chunks = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        # 呼び出し元が途中で終了した場合は、空くのを待たずに終了する
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            iterator = iter(iterable)
+            while True:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                if not put((chunk, None)):
+                    return
+            put((None, None))
+        except Exception as e:
+            put((None, e))
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk, error = chunks.get()
+            if error is not None:
+                raise error
+            if chunk is None:
+                return
+            yield from chunk
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _load_table(conn, table, filepath, delimiter, truncate, batch_size, local_infile,
+                commit_interval, skip_unchanged, mode, sync_chunk_size, table_jobs, reject_file,
+                foreign_key_checks=False):
+    report = TableReport(table)
+    filepaths = _as_list(filepath)
+    # 登録できない行（Violation, 変換前の行）。Noneの場合は登録できない行があればエラーにする
+    rejects = [] if reject_file else None
+
+    # 前回の登録内容から変わっていない場合は登録しない（追加で登録する場合は対象外）
+    skip_unchanged = skip_unchanged and (truncate or mode == MODE_SYNC)
+    if skip_unchanged:
+        fingerprint = _create_fingerprint(conn, table, filepath)
+        if _is_unchanged(conn, table, fingerprint):
+            logger.info("SKIP LOAD DATA (unchanged): {}".format(table))
+            report.skipped = True
+            return report
+
+    # LOAD DATA LOCAL INFILEはファイルをそのまま送るため、圧縮したファイルはINSERT文で登録する
+    if local_infile and any(_get_compression(path) for path in filepaths):
+        logger.info("LOAD DATA LOCAL INFILE does not support compressed files. Use INSERT instead: {}".format(
+            table))
+        local_infile = False
+    # LOAD DATA LOCAL INFILEは行ごとのエラーがわからないため、INSERT文で登録する
+    if local_infile and reject_file:
+        logger.info("LOAD DATA LOCAL INFILE does not support reject_file. Use INSERT instead: {}".format(table))
+        local_infile = False
+
+    if mode == MODE_SYNC:
+        _sync(conn, table=table, filepath=filepaths[0], delimiter=delimiter, batch_size=batch_size,
+              local_infile=local_infile, chunk_size=sync_chunk_size, report=report)
+    elif local_infile:
+        # 分割したファイルは順に登録する（削除するのは最初のファイルの前だけ）
+        for i, path in enumerate(filepaths):
+            _load_data_local_infile(conn, truncate=truncate and i == 0, table=table, filepath=path,
+                                    delimiter=delimiter, report=report, foreign_key_checks=foreign_key_checks)
+    elif table_jobs > 1:
+        _load_split(conn, truncate=truncate, table=table, filepaths=filepaths, delimiter=delimiter,
+                    batch_size=batch_size, commit_interval=commit_interval, table_jobs=table_jobs,
+                    report=report, rejects=rejects, foreign_key_checks=foreign_key_checks)
+    else:
+        for i, path in enumerate(filepaths):
+            _load(conn, truncate=truncate and i == 0, table=table, filepath=path,
+                  delimiter=delimiter, batch_size=batch_size, commit_interval=commit_interval,
+                  report=report, rejects=rejects, foreign_key_checks=foreign_key_checks)
+
+    if reject_file:
+        _write_rejects(reject_file.format(table=table), table, filepaths[0], delimiter, rejects)
+
+    if skip_unchanged:
+        _save_fingerprint(conn, table, fingerprint)
+    return report
+
+
+def _load(conn, truncate, table, filepath, delimiter=',', batch_size=1, commit_interval=0,
+          report=None, schema_table=None, rejects=None, foreign_key_checks=False):
+    '''csvファイルの内容をINSERT文で登録する
 
+    値はテーブル定義（schema_tableを指定した場合はそのテーブルの定義）の型に変換してから登録するため、
+    不正な値はDBに送る前にSQLExceptionになる
+    rejectsにリストを指定した場合は、登録できない行をrejectsに加えて続ける（_insert_rows()を参照）
+    '''
+    if report is None:
+        report = TableReport(table)
+
+    if truncate:
+        start = time.perf_counter()
+        _truncate(conn, table, foreign_key_checks)
+        report.truncate_time += time.perf_counter() - start
+
+    with _open_csv(filepath, delimiter, prefetch=True) as csv_reader:
+        start = time.perf_counter()
+        header = next(csv_reader)
         logger.info("LOAD DATA: {}".format(table))
-        for row in csv_reader:
-            _insert(conn, table, header, row)
+        _insert_rows(conn, table, header, csv_reader, filepath, delimiter, batch_size=batch_size,
+                     commit_interval=commit_interval, report=report, schema_table=schema_table, start=start,
+                     rejects=rejects)
+        report.bytes_parsed += os.path.getsize(filepath)
+    return report
+
+
+def _insert_rows(conn, table, header, csv_reader, filepath, delimiter, batch_size, commit_interval, report,
+                 schema_table=None, start=None, byte_range=None, rejects=None):
+    '''csv.readerの行（ヘッダを除く）をINSERT文で登録する
+
+    処理時間のうち、SQLの実行以外の時間（startから）を読み込みと変換の時間とする
+    登録できない行（変換できない値、値のエラーで失敗したINSERT文から特定した行）がある場合は、
+    ファイルと行番号を含むSQLExceptionにする
+    rejectsにリストを指定した場合は、登録できない行を (Violation, 変換前の行) としてrejectsに加えて続ける
+    csv_readerがファイルの一部を読み込む場合は、byte_rangeに（開始位置, 終了位置）を指定する（行番号に使う）
+    '''
+    if start is None:
+        start = time.perf_counter()
+    sql = _create_insert_sql(table, header)
+    converters = _create_converters(conn, schema_table or table, header)
+    # 変換できない行は除いて、ColumnBatch.invalidに入れる
+    convert = partial(_convert_rows, table=table, converters=converters, reject=True)
+
+    # 1回に登録するデータの大きさがmax_allowed_packetを超えないようにする
+    max_stmt_length = _get_max_stmt_length(conn) if batch_size > 1 else None
+
+    # 登録できない行 (読み込んだ行の位置, 変換前の行, エラーメッセージ)
+    invalid_rows = []
+    offset = 0
+    uncommitted_rows = 0
+    execute_time = 0.0
+    for rows in _read_batches(csv_reader, batch_size, max_stmt_length, convert):
+        invalid = [(offset + index, row, message) for index, row, message in rows.invalid]
+        if invalid and rejects is None:
+            # 変換できない値がある場合は、登録せずにエラーにする
+            _raise_invalid_rows(table, filepath, delimiter, byte_range, invalid)
+
+        execute_start = time.perf_counter()
+        failures = []
+        rowcount, statement_count = _insert_many(conn, table, sql, rows, max_stmt_length, failures=failures,
+                                                 stop_on_failure=rejects is None)
+        invalid += [(offset + rows.index(i), rows.source[i], message) for i, message in failures]
+        if invalid and rejects is None:
+            _raise_invalid_rows(table, filepath, delimiter, byte_range, invalid)
+
+        # 1トランザクションが大きくなりすぎないように、途中でコミットする
+        uncommitted_rows += len(rows)
+        if commit_interval and uncommitted_rows >= commit_interval:
+            conn.commit()
+            uncommitted_rows = 0
+        execute_time += time.perf_counter() - execute_start
+
+        invalid_rows += invalid
+        offset += rows.read_count
+        report.rows_read += rows.read_count
+        report.rows_inserted += rowcount
+        report.rows_rejected += len(invalid)
+        report.statement_count += statement_count
+
+    if invalid_rows:
+        rejects.extend(_create_violations(table, filepath, delimiter, byte_range, invalid_rows))
+
+    report.execute_time += execute_time
+    report.parse_time += time.perf_counter() - start - execute_time
+
+
+def _create_violations(table, filepath, delimiter, byte_range, invalid):
+    '''登録できない行 (読み込んだ行の位置, 変換前の行, エラーメッセージ) に行番号を付けて、
+    (Violation, 変換前の行) のリストにする
+    '''
+    lines = _find_lines(filepath, delimiter, [index for index, _, _ in invalid], byte_range)
+    return [(Violation(filepath, lines.get(index), table, None, message), row) for index, row, message in invalid]
+
+
+def _raise_invalid_rows(table, filepath, delimiter, byte_range, invalid):
+    violations = _create_violations(table, filepath, delimiter, byte_range, invalid)
+    message = '\n'.join("Incorrect value in `{table}` ({filepath}:{line}): {msg}".format(
+        table=table, filepath=violation.filepath, line=violation.line, msg=violation.message)
+        for violation, _ in violations)
+    raise SQLException(message)
+
+
+def _find_lines(filepath, delimiter, indexes, byte_range=None):
+    '''読み込んだ行の位置（ヘッダを除いて0から）を、ファイルの行番号に変換する
+
+    登録できない行がある場合にだけ使うため、ファイル（byte_rangeの場合は範囲）を先頭から読み直す
+    行の位置をキー、行番号を値とするdictを返す
+    '''
+    targets = set(indexes)
+    if byte_range is None:
+        with _open_csv(filepath, delimiter) as csv_reader:
+            next(csv_reader, None)
+            return _find_reader_lines(csv_reader, targets, 0)
+
+    start, end = byte_range
+    with open(filepath, mode='rb') as f:
+        # 範囲の先頭までの改行を数える
+        first_line = 1
+        remaining = start
+        while remaining > 0:
+            chunk = f.read(min(SPLIT_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            first_line += chunk.count(b'\n')
+            remaining -= len(chunk)
+        csv_reader = csv.reader(_read_lines(f, start, end), delimiter=delimiter, quotechar='"')
+        return _find_reader_lines(csv_reader, targets, first_line - 1)
+
+
+def _find_reader_lines(csv_reader, targets, base_line):
+    lines = {}
+    # csv.readerのline_numは読み込んだ行数なので、次の行の始まりは line_num + 1 になる
+    line = csv_reader.line_num + 1
+    for index, _ in enumerate(csv_reader):
+        if index in targets:
+            lines[index] = base_line + line
+            if len(lines) == len(targets):
+                break
+        line = csv_reader.line_num + 1
+    return lines
+
+
+def _write_rejects(reject_file, table, filepath, delimiter, rejects):
+    '''登録できない行をreject_fileに、行番号と理由をreject_file.logに出力する
+
+    reject_fileは登録するファイル（filepath）と同じヘッダ、区切り文字で出力する
+    '''
+    with _open_csv(filepath, delimiter) as csv_reader:
+        header = next(csv_reader)
+
+    with open(reject_file, mode='w', encoding='utf_8', newline='') as f:
+        writer = csv.writer(f, delimiter=delimiter, quotechar='"', lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(row for _, row in rejects)
+    with open(reject_file + '.log', mode='w', encoding='utf_8') as f:
+        for violation, _ in rejects:
+            f.write(str(violation) + '\n')
+
+    if rejects:
+        logger.warning("REJECTED: {} rows in `{}`: {}".format(len(rejects), table, reject_file))
+
+
+def _load_split(conn, truncate, table, filepaths, delimiter, batch_size, commit_interval, table_jobs, report,
+                rejects=None, foreign_key_checks=False):
+    '''1つのテーブルを、複数のプロセスで並列に登録する
+
+    分割したファイルはファイルごと、1つの大きなファイルはバイト範囲ごとに、
+    プロセスごとの接続で登録してコミットする
+    '''
+    parts = _create_parts(filepaths, delimiter, table_jobs)
+    if len(parts) <= 1:
+        # 分割するほど大きくないファイルは、そのまま登録する
+        _load(conn, truncate=truncate, table=table, filepath=filepaths[0], delimiter=delimiter,
+              batch_size=batch_size, commit_interval=commit_interval, report=report, rejects=rejects,
+              foreign_key_checks=foreign_key_checks)
+        return report
+
+    if truncate:
+        start = time.perf_counter()
+        _truncate(conn, table, foreign_key_checks)
+        report.truncate_time += time.perf_counter() - start
+
+    # 各プロセスは、この接続と同じデータベースに接続する
+    db = _select_value(conn, "SELECT DATABASE()")
+    logger.info("LOAD DATA: {} ({} parts)".format(table, len(parts)))
+    # jobs > 1 の場合はスレッドから呼ばれるため、forkではなくspawnでプロセスを作成する
+    # （スレッドがある状態でforkすると、他のスレッドが持っていたロックなどがそのままコピーされる）
+    with ProcessPoolExecutor(max_workers=min(table_jobs, len(parts)),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [
+            executor.submit(_load_part, db, table, filepath, delimiter, header, start, end,
+                            batch_size, commit_interval, rejects is not None, foreign_key_checks)
+            for filepath, header, start, end in parts]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        # 1つでも失敗した場合は、まだ始まっていない範囲の登録はしない
+        for future in not_done:
+            future.cancel()
+        for future in futures:
+            if future.done() and not future.cancelled():
+                part_report, part_rejects = future.result()
+                report.merge(part_report)
+                if part_rejects:
+                    rejects.extend(part_rejects)
+    return report
+
+
+def _create_parts(filepaths, delimiter, table_jobs):
+    '''並列で登録する単位（ファイルパス, ヘッダ, 開始位置, 終了位置）のリストを作成する
+
+    分割したファイルと圧縮したファイルは、ファイル全体を1つの単位にする（ヘッダはNone）
+    '''
+    if len(filepaths) > 1 or _get_compression(filepaths[0]):
+        return [(filepath, None, 0, None) for filepath in filepaths]
+
+    header, ranges = _split_file(filepaths[0], delimiter, table_jobs)
+    return [(filepaths[0], header, start, end) for start, end in ranges]
+
+
+def _split_file(filepath, delimiter, count, min_bytes=None):
+    '''ファイルのデータ部分（ヘッダを除く）を、行の区切りでcount個以下のバイト範囲に分割する
+
+    ヘッダと、バイト範囲（開始位置, 終了位置）のリストを返す
+    1つの範囲はmin_bytes（省略した場合はSPLIT_MIN_BYTES）以上にする
+    '''
+    if min_bytes is None:
+        min_bytes = SPLIT_MIN_BYTES
+
+    with open(filepath, mode='rb') as f:
+        header_bytes = f.readline()
+        # ヘッダの項目名に改行が含まれる場合は、引用符が閉じるまで読み込む
+        while header_bytes.count(b'"') % 2:
+            line = f.readline()
+            if not line:
+                break
+            header_bytes += line
+        header = next(csv.reader(io.StringIO(header_bytes.decode('utf_8')), delimiter=delimiter, quotechar='"'))
+
+        data_start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        count = max(1, min(count, (size - data_start) // max(min_bytes, 1)))
+        targets = [data_start + (size - data_start) * i // count for i in range(1, count)]
+        boundaries = _find_record_boundaries(f, data_start, targets, delimiter)
+
+    starts = [data_start] + boundaries
+    ends = boundaries + [size]
+    return header, [(start, end) for start, end in zip(starts, ends) if start < end]
+
+
+def _find_record_boundaries(f, start, targets, delimiter=','):
+    '''targetsの各位置以降で最初の、行の区切りの位置（改行の直後）のリストを返す
+
+    引用符で囲んだ値は改行を含むことがあるため、csv.readerと同じように引用符の状態を追って、
+    引用符の外の改行だけを行の区切りとする
+        値の先頭（行の先頭、区切り文字の直後）の引用符だけが、引用符で囲んだ値の始まりになる
+        （「5" pipe」のように値の途中にある引用符は、そのままの文字として扱う）
+        引用符で囲んだ値の中の引用符は "" と書き、それ以外の引用符で値が終わる
+    引用符と改行の位置だけを調べるため、ファイル全体を1文字ずつ読む必要はない
+    UTF-8では、マルチバイト文字のバイトが引用符や改行、区切り文字と同じ値になることはない
+    引用符が閉じないまま終わる場合は、それ以降の位置では分割しない
+    '''
+    size = os.fstat(f.fileno()).st_size
+    if size <= start or not targets:
+        return []
+
+    field_starts = (b'\n', delimiter.encode('utf_8'))
+    boundaries = []
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        # positionより前はすべて引用符の外
+        position = start
+        for target in sorted(targets):
+            if boundaries and target < boundaries[-1]:
+                # 同じ区切りになる位置は1つにまとめる
+                continue
+            while True:
+                newline = m.find(b'\n', max(position, target))
+                if newline < 0:
+                    return boundaries
+                quote = m.find(b'"', position, newline)
+                if quote < 0:
+                    break
+                if quote > start and m[quote - 1:quote] not in field_starts:
+                    # 値の途中の引用符
+                    position = quote + 1
+                    continue
+                # 引用符で囲んだ値の終わりまで進める
+                position = _find_closing_quote(m, quote + 1)
+                if position < 0:
+                    return boundaries
+            position = newline + 1
+            boundaries.append(position)
+    return boundaries
+
+
+def _find_closing_quote(m, position):
+    '''引用符で囲んだ値の中のpositionから、値を閉じる引用符の直後の位置を返す（閉じない場合は-1）'''
+    while True:
+        quote = m.find(b'"', position)
+        if quote < 0:
+            return -1
+        if m[quote + 1:quote + 2] != b'"':
+            return quote + 1
+        # "" は値の中の引用符
+        position = quote + 2
+
+
+def _read_lines(f, start, end):
+    '''ファイルのバイト範囲を、1行ずつ文字列にして返す'''
+    f.seek(start)
+    position = start
+    while position < end:
+        line = f.readline()
+        if not line:
+            return
+        position += len(line)
+        yield line.decode('utf_8')
+
+
+def _load_part(db, table, filepath, delimiter, header, start, end, batch_size, commit_interval, reject=False,
+               foreign_key_checks=False):
+    '''並列で登録する単位の1つを登録する（プロセスプールのプロセスで実行する）
+
+    プロセスごとに接続し、登録が終わったらコミットする
+    headerがNoneの場合は、ファイル全体（1行目がヘッダ）を登録する
+    (TableReport, 登録できない行のリスト（rejectがFalseの場合はNone）) を返す
+    '''
+    conn = database_connection.get_connection(db=db)
+    try:
+        if not foreign_key_checks:
+            _set_foreign_key_checks_disabled(conn)
+        report = TableReport(table)
+        rejects = [] if reject else None
+        if header is None:
+            _load(conn, truncate=False, table=table, filepath=filepath, delimiter=delimiter,
+                  batch_size=batch_size, commit_interval=commit_interval, report=report, rejects=rejects)
+        else:
+            with open(filepath, mode='rb') as f:
+                parse_start = time.perf_counter()
+                csv_reader = csv.reader(_read_lines(f, start, end), delimiter=delimiter, quotechar='"')
+                _insert_rows(conn, table, header, csv_reader, filepath, delimiter, batch_size=batch_size,
+                             commit_interval=commit_interval, report=report, start=parse_start,
+                             byte_range=(start, end), rejects=rejects)
+            report.bytes_parsed += end - start
+        conn.commit()
+        return report, rejects
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
+
+
+def _sync(conn, table, filepath, delimiter, batch_size, local_infile, chunk_size, report):
+    '''csvファイルとテーブルの差分だけを登録、更新、削除する
+
+    csvファイルの内容を一時テーブルに登録し、主キーの範囲ごとにテーブルとチェックサムを比較する
+    チェックサムが異なる範囲だけ、サーバ内で差分を反映するため、
+    変わっていない範囲のデータはサーバの外に出ず、更新もされない
+    TRUNCATEしないため、ロールバックすると元に戻る
+    '''
+    with _open_csv(filepath, delimiter) as csv_reader:
+        header = next(csv_reader)
+
+    primary_keys = _get_primary_keys(conn, table)
+    if not primary_keys:
+        raise ValueError("Table without primary key can not be synced: {}".format(table))
+    if not set(primary_keys) <= set(header):
+        raise ValueError("Primary key columns are required to sync: {}".format(filepath))
+
+    temporary_table = _create_sync_table_name(table)
+    with conn.cursor() as cur:
+        cur.execute("DROP TEMPORARY TABLE IF EXISTS {}".format(temporary_table))
+        cur.execute("CREATE TEMPORARY TABLE {} LIKE {}".format(temporary_table, table))
+    try:
+        # 一時テーブルへの登録は、ファイルの読み込みとして扱う
+        temporary_report = TableReport(temporary_table)
+        if local_infile:
+            _load_data_local_infile(conn, truncate=False, table=temporary_table,
+                                    filepath=filepath, delimiter=delimiter, report=temporary_report)
+        else:
+            _load(conn, truncate=False, table=temporary_table, filepath=filepath,
+                  delimiter=delimiter, batch_size=batch_size, report=temporary_report,
+                  schema_table=table)
+        report.rows_read = temporary_report.rows_read
+        report.bytes_parsed = temporary_report.bytes_parsed
+        report.parse_time = temporary_report.parse_time + temporary_report.execute_time
+
+        logger.info("SYNC DATA: {}".format(table))
+        start = time.perf_counter()
+        counts = {'deleted': 0, 'updated': 0, 'inserted': 0}
+        for lower, upper in _get_key_ranges(conn, temporary_table, primary_keys, chunk_size):
+            checksum_sql = _create_checksum_sql(header, primary_keys, lower, upper)
+            params = (lower or ()) + (upper or ())
+            target = _select_row(conn, checksum_sql.format(table=table), params)
+            source = _select_row(conn, checksum_sql.format(table=temporary_table), params)
+            if target == source:
+                continue
+
+            for key, sql in _create_sync_sqls(table, temporary_table, header, primary_keys,
+                                              lower, upper):
+                report.statement_count += 1
+                with conn.cursor() as cur:
+                    try:
+                        counts[key] += cur.execute(sql, params)
+                    except Exception as e:
+                        # pymysql.err.ProgrammingErrorには args[0]: エラーコード, args[1]: メッセージ が入っている
+                        message = "Incorrect value in `{table}`: {msg}".format(table=table, msg=e.args[1])
+                        raise SQLException(message) from e
+        logger.info("SYNC DATA: {table} (deleted={deleted}, updated={updated}, inserted={inserted})".format(
+            table=table, **counts))
+        report.execute_time = time.perf_counter() - start
+        report.rows_deleted = counts['deleted']
+        report.rows_updated = counts['updated']
+        report.rows_inserted = counts['inserted']
+
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("DROP TEMPORARY TABLE IF EXISTS {}".format(temporary_table))
+
+
+def _create_sync_table_name(table):
+    '''差分の反映に使う一時テーブルの名前を返す
+
+    テーブル名が長い場合は、MySQLの識別子の最大長（64文字）を超えないように、末尾をハッシュ値にする
+    '''
+    name = 'csv_to_db_sync_{}'.format(table)
+    if len(name) <= MAX_IDENTIFIER_LENGTH:
+        return name
+    digest = hashlib.md5(table.encode('utf_8')).hexdigest()[:16]
+    return '{}_{}'.format(name[:MAX_IDENTIFIER_LENGTH - len(digest) - 1], digest)
+
+
+def _get_primary_keys(conn, table):
+    sql = (
+        "SELECT COLUMN_NAME AS column_name FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY' "
+        "ORDER BY ORDINAL_POSITION")
+    with conn.cursor() as cur:
+        cur.execute(sql, (table, ))
+        results = cur.fetchall()
+    return [result['column_name'] if isinstance(result, dict) else result[0] for result in results]
+
+
+def _get_key_ranges(conn, table, primary_keys, chunk_size):
+    '''主キーの範囲を、chunk_size行ずつに分けて返す
+
+    戻り値は (下限, 上限) のタプル。下限は含み、上限は含まない。
+    最初の範囲の下限と最後の範囲の上限はNone（制限なし）
+    '''
+    keys = ', '.join(primary_keys)
+    placeholders = ', '.join(['%s'] * len(primary_keys))
+    sql = "SELECT {keys} FROM {table} {where} ORDER BY {keys} LIMIT 1 OFFSET %s"
+
+    lower = None
+    while True:
+        if lower is None:
+            where, params = '', (chunk_size, )
+        else:
+            where, params = "WHERE ({}) > ({})".format(keys, placeholders), lower + (chunk_size - 1, )
+        upper = _select_row(conn, sql.format(keys=keys, table=table, where=where), params)
+        yield lower, upper
+        if upper is None:
+            return
+        lower = upper
+
+
+def _select_row(conn, sql, params=None):
+    '''1行のSELECTの結果をタプルで返す'''
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        result = cur.fetchone()
+    if result is None:
+        return None
+    # DictCursor以外のカーソルでも動くようにする
+    return tuple(result.values()) if isinstance(result, dict) else tuple(result)
+
+
+def _create_key_range_condition(alias, primary_keys, lower, upper):
+    keys = ', '.join('{}.{}'.format(alias, key) for key in primary_keys)
+    placeholders = ', '.join(['%s'] * len(primary_keys))
+    conditions = ['1 = 1']
+    if lower is not None:
+        conditions.append("({}) >= ({})".format(keys, placeholders))
+    if upper is not None:
+        conditions.append("({}) < ({})".format(keys, placeholders))
+    return ' AND '.join(conditions)
+
+
+def _create_checksum_sql(columns, primary_keys, lower, upper):
+    '''
+    戻り値のイメージ:
+        SELECT COUNT(*), BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT_WS('#',
+            t.id, t.name, COALESCE(LENGTH(t.id), -1), COALESCE(LENGTH(t.name), -1)
+        )), 16), 16, 10) AS UNSIGNED))
+        FROM {table} AS t WHERE 1 = 1 AND (t.id) >= (%s) AND (t.id) < (%s)
+
+    値の長さも含めることで、NULLと区切り文字を含む値を区別する
+    '''
+    values = ['t.{}'.format(column) for column in columns] + \
+        ['COALESCE(LENGTH(t.{}), -1)'.format(column) for column in columns]
+    sql = (
+        "SELECT COUNT(*) AS row_count, "
+        "BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT_WS('#', {values})), 16), 16, 10) AS UNSIGNED)) AS checksum "
+        "FROM {{table}} AS t WHERE {condition}")
+    return sql.format(
+        values=', '.join(values),
+        condition=_create_key_range_condition('t', primary_keys, lower, upper))
+
+
+def _create_sync_sqls(table, source_table, columns, primary_keys, lower, upper):
+    '''範囲内の差分を反映するDELETE、UPDATE、INSERTを返す
+
+    戻り値は (件数のキー, SQL) のリスト
+    パラメータは、どのSQLも範囲の下限、上限の順
+
+    値の比較は、チェックサム（MD5）と同じようにバイト列で行う
+    照合順序（utf8_general_ciなど）で比較すると、大文字小文字や末尾の空白だけの変更が反映されず、
+    その範囲のチェックサムが毎回異なることになるため
+    主キーは、インデックスを使えるように照合順序でも比較する
+    '''
+    join = ' AND '.join('t.{key} = s.{key} AND BINARY t.{key} = BINARY s.{key}'.format(key=key)
+                        for key in primary_keys)
+    first_key = primary_keys[0]
+    sqls = []
+
+    sqls.append(('deleted', (
+        "DELETE t FROM {table} AS t LEFT JOIN {source} AS s ON {join} "
+        "WHERE s.{key} IS NULL AND {condition}").format(
+            table=table, source=source_table, join=join, key=first_key,
+            condition=_create_key_range_condition('t', primary_keys, lower, upper))))
+
+    value_columns = [column for column in columns if column not in primary_keys]
+    if value_columns:
+        sqls.append(('updated', (
+            "UPDATE {table} AS t JOIN {source} AS s ON {join} SET {assignments} "
+            "WHERE {condition} AND NOT ({unchanged})").format(
+                table=table, source=source_table, join=join,
+                assignments=', '.join('t.{col} = s.{col}'.format(col=col) for col in value_columns),
+                condition=_create_key_range_condition('t', primary_keys, lower, upper),
+                unchanged=' AND '.join('BINARY t.{col} <=> BINARY s.{col}'.format(col=col)
+                                       for col in value_columns))))
+
+    sqls.append(('inserted', (
+        "INSERT INTO {table} ({columns}) SELECT {values} FROM {source} AS s "
+        "LEFT JOIN {table} AS t ON {join} WHERE t.{key} IS NULL AND {condition}").format(
+            table=table, source=source_table, join=join, key=first_key,
+            columns=', '.join(columns),
+            values=', '.join('s.{}'.format(column) for column in columns),
+            condition=_create_key_range_condition('s', primary_keys, lower, upper))))
+
+    return sqls
+
+
+def _read_batches(csv_reader, batch_size, max_bytes=None, convert=None):
+    '''csvファイルの行を、DBに登録する値に変換してbatch_size行ずつ返す
+
+    max_bytesを指定した場合、行数がbatch_sizeに達していなくても、
+    データの大きさ（概算）がmax_bytesに達した時点で返す
+    ファイル全体を読み込まないので、ファイルの大きさに関係なくメモリ使用量は一定になる
+    convertには、行のリストをColumnBatchに変換する関数を指定する（省略した場合は_convert_value()で変換する）
+    '''
+    if convert is None:
+        convert = _convert_rows
+    if not max_bytes:
+        while True:
+            rows = list(islice(csv_reader, batch_size))
+            if not rows:
+                return
+            yield convert(rows)
+
+    rows = []
+    size = 0
+    for row in csv_reader:
+        rows.append(row)
+        # 値ごとに引用符と区切り文字、行ごとに括弧と区切り文字の分を加える
+        size += sum(map(len, row)) + 3 * len(row) + 3
+        if len(rows) >= batch_size or size >= max_bytes:
+            yield convert(rows)
+            rows = []
+            size = 0
+    if rows:
+        yield convert(rows)
+
+
+def _create_converters(conn, table, header):
+    '''csvファイルの項目ごとに、テーブル定義の型に合わせた値の変換関数を作成する
+
+    テーブル定義はtable_schemaでキャッシュするため、INFORMATION_SCHEMAはテーブルごとに1回だけ参照する
+    テーブル定義にない項目は_convert_value()で変換する（登録時にDBのエラーになる）
+    変換関数は、1項目分の値のリストをまとめて変換する
+    '''
+    columns = table_schema.get_columns(conn, table)
+    return [table_schema.create_column_converter(columns.get(name)) for name in header]
+
+
+def _convert_rows(rows, table=None, converters=None, reject=False):
+    '''行のリストを、DBに登録する値に変換してColumnBatchにする
+
+    行ごとではなく項目ごとにまとめて変換するため、項目の型の判定は項目ごとに1回だけになる
+    変換した値は項目ごとのリストのまま保持し、行ごとのリストは作らない
+    変換できない値がある場合はSQLExceptionにする
+    rejectがTrueの場合は、変換できない行を除いてColumnBatch.invalidに入れる
+    '''
+    if converters is None:
+        converters = [table_schema.convert_values] * len(rows[0])
+
+    width = len(converters)
+    try:
+        if set(map(len, rows)) != {width}:
+            raise ValueError("Column count doesn't match value count")
+        columns = [converter(values) for converter, values in zip(converters, zip(*rows))]
+    except ValueError as e:
+        if not reject:
+            raise SQLException("Incorrect value in `{table}`: {msg}".format(table=table, msg=e)) from e
+        # 変換できない行を特定するため、1行ずつ変換し直す
+        return _convert_rows_each(rows, converters)
+    return ColumnBatch(columns, len(rows), source=rows)
+
+
+def _convert_rows_each(rows, converters):
+    '''行のリストを1行ずつ変換し、変換できない行を除いたColumnBatchにする'''
+    converted = []
+    indexes = []
+    invalid = []
+    for index, row in enumerate(rows):
+        try:
+            if len(row) != len(converters):
+                raise ValueError("Column count doesn't match value count")
+            converted.append([converter([value])[0] for converter, value in zip(converters, row)])
+            indexes.append(index)
+        except ValueError as e:
+            invalid.append((index, row, str(e)))
+    columns = [list(values) for values in zip(*converted)] or [[] for _ in converters]
+    return ColumnBatch(columns, len(converted), source=[rows[index] for index in indexes],
+                       indexes=indexes, invalid=invalid)
+
+
+def _load_data_local_infile(conn, truncate, table, filepath, delimiter=',', report=None, foreign_key_checks=False):
+    if report is None:
+        report = TableReport(table)
+
+    if truncate:
+        start = time.perf_counter()
+        _truncate(conn, table, foreign_key_checks)
+        report.truncate_time += time.perf_counter() - start
+
+    # 項目名はヘッダ行から取得する
+    with _open_csv(filepath, delimiter) as csv_reader:
+        header = next(csv_reader)
+
+    sql = _create_load_data_sql(table, header)
+
+    logger.info("LOAD DATA LOCAL INFILE: {}".format(table))
+    with conn.cursor() as cur:
+        start = time.perf_counter()
+        try:
+            rowcount = cur.execute(sql, (filepath, delimiter))
+        except Exception as e:
+            # pymysql.err.ProgrammingErrorには args[0]: エラーコード, args[1]: メッセージ が入っている
+            message = "Incorrect value in `{table}`: {msg}".format(table=table, msg=e.args[1])
+            raise SQLException(message) from e
+
+        # LOCALの場合、不正な値はエラーにならず警告になるため、警告があればエラーにする
+        cur.execute("SHOW WARNINGS")
+        for warning in cur.fetchall():
+            level, message = (warning['Level'], warning['Message']) \
+                if isinstance(warning, dict) else (warning[0], warning[2])
+            if level != 'Note':
+                message = "Incorrect value in `{table}`: {msg}".format(table=table, msg=message)
+                raise SQLException(message)
+        report.execute_time += time.perf_counter() - start
+
+    # ファイルの読み込みもサーバで行うため、読み込んだ行数は登録した行数と同じになる
+    report.rows_read += rowcount
+    report.rows_inserted += rowcount
+    report.statement_count += 1
+    report.bytes_parsed += os.path.getsize(filepath)
+    return report
+
+
+def _is_local_infile_enabled(conn):
+    '''LOAD DATA LOCAL INFILE が使えるかどうか
+
+    接続とサーバの両方で有効になっている必要がある
+    '''
+    if not conn.client_flag & CLIENT.LOCAL_FILES:
+        return False
+
+    sql = "SELECT @@local_infile AS local_infile"
+    return bool(int(_select_value(conn, sql)))
+
+
+def _create_fingerprint_table(conn):
+    '''登録したファイルのフィンガープリントを管理するテーブルを作成する
+
+    ※DDLのため、暗黙的にコミットされる（テーブルがない場合だけ実行する）
+    '''
+    sql = (
+        "CREATE TABLE IF NOT EXISTS {} ("
+        "table_name VARCHAR(64) NOT NULL, "
+        "fingerprint CHAR(64) NOT NULL, "
+        "checksum BIGINT UNSIGNED DEFAULT NULL, "
+        "PRIMARY KEY (table_name)"
+        ") DEFAULT CHARSET=utf8mb4").format(FINGERPRINT_TABLE)
+    with conn.cursor() as cur:
+        cur.execute(sql)
+
+
+def _create_fingerprint(conn, table, filepath):
+    '''テーブル名、テーブル定義、ファイルの内容からフィンガープリントを作成する'''
+    with conn.cursor() as cur:
+        cur.execute("SHOW CREATE TABLE {}".format(table))
+        result = cur.fetchone()
+    ddl = result['Create Table'] if isinstance(result, dict) else result[1]
+    # AUTO_INCREMENTの値は登録するたびに変わるので除く
+    ddl = re.sub(' AUTO_INCREMENT=\\d+', '', ddl)
+
+    fingerprint = hashlib.sha256()
+    fingerprint.update(table.encode('utf_8') + b'\0')
+    fingerprint.update(ddl.encode('utf_8') + b'\0')
+    # 分割したファイルは、すべてのファイルの内容を順に加える
+    for path in _as_list(filepath):
+        with open(path, mode='rb') as f:
+            for chunk in iter(partial(f.read, 1024 * 1024), b''):
+                fingerprint.update(chunk)
+    return fingerprint.hexdigest()
+
+
+def _is_unchanged(conn, table, fingerprint):
+    '''前回登録したときから、ファイルとテーブルのデータが変わっていないかどうか
+
+    ファイルはフィンガープリント、テーブルのデータはCHECKSUM TABLEの値で比較する
+    CHECKSUM TABLEはテーブル全体を読むため、フィンガープリントが一致した場合だけ実行する
+    '''
+    sql = "SELECT fingerprint, checksum FROM {} WHERE table_name = %s".format(FINGERPRINT_TABLE)
+    with conn.cursor() as cur:
+        try:
+            cur.execute(sql, (table, ))
+        except pymysql.err.ProgrammingError as e:
+            # まだ一度も保存していない（管理するテーブルがない）
+            if e.args[0] == ER.NO_SUCH_TABLE:
+                return False
+            raise e
+        result = cur.fetchone()
+    if result is None:
+        return False
+
+    saved_fingerprint, saved_checksum = (result['fingerprint'], result['checksum']) \
+        if isinstance(result, dict) else result
+    if saved_fingerprint != fingerprint:
+        return False
+    return saved_checksum == _checksum_table(conn, table)
+
+
+def _save_fingerprint(conn, table, fingerprint):
+    sql = "REPLACE INTO {} (table_name, fingerprint, checksum) VALUES (%s, %s, %s)".format(
+        FINGERPRINT_TABLE)
+    params = (table, fingerprint, _checksum_table(conn, table))
+    with conn.cursor() as cur:
+        try:
+            cur.execute(sql, params)
+        except pymysql.err.ProgrammingError as e:
+            if e.args[0] != ER.NO_SUCH_TABLE:
+                raise e
+            # 管理するテーブルは最初の保存時にだけ作成する
+            _create_fingerprint_table(conn)
+            cur.execute(sql, params)
+
+
+def _checksum_table(conn, table):
+    with conn.cursor() as cur:
+        cur.execute("CHECKSUM TABLE {}".format(table))
+        result = cur.fetchone()
+    return result['Checksum'] if isinstance(result, dict) else result[1]
 
 
 def _set_foreign_key_checks_disabled(conn):
@@ -155,27 +1747,153 @@ def _set_foreign_key_checks_enabled(conn):
         cur.execute(sql)
 
 
-def _truncate(conn, table):
+def _truncate(conn, table, foreign_key_checks=False):
+    '''テーブルを空にする
+
+    外部キー制約が有効な場合（foreign_key_checks=True）、参照されているテーブルはTRUNCATEできないため、
+    TRUNCATEの間だけ無効にする
+    '''
     sql = "TRUNCATE TABLE {}".format(table)
     with conn.cursor() as cur:
         try:
-            cur.execute(sql)
+            if not foreign_key_checks:
+                cur.execute(sql)
+            else:
+                _set_foreign_key_checks_disabled(conn)
+                try:
+                    cur.execute(sql)
+                finally:
+                    _set_foreign_key_checks_enabled(conn)
         except Exception as e:
             # pymysql.err.ProgrammingErrorには args[0]: エラーコード, args[1]: メッセージ が入っている
             message = "{msg}".format(msg=e.args[1])
             raise SQLException(message) from e
 
 
-def _insert(conn, table, columns, values):
-    # TODO: csvファイル内では同じものなので、作成するのは1回だけにしたい
-    sql = _create_insert_sql(table, columns)
+def _get_max_stmt_length(conn):
+    '''1文のINSERTの最大長（バイト数）を返す
+
+    サーバのmax_allowed_packetから、パケットヘッダなどの分を差し引いた値
+    '''
+    sql = "SELECT @@max_allowed_packet AS max_allowed_packet"
+    return int(_select_value(conn, sql)) - PACKET_MARGIN
+
+
+def _select_value(conn, sql, params=None):
+    '''1行1列のSELECTの結果を返す'''
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        result = cur.fetchone()
+    if result is None:
+        return None
+    # DictCursor以外のカーソルでも動くようにする
+    return list(result.values())[0] if isinstance(result, dict) else result[0]
+
+
+def _insert_many(conn, table, sql, rows, max_stmt_length, failures=None, stop_on_failure=False):
+    '''複数行をまとめて登録する
+
+    1文の長さがmax_stmt_lengthを超えない範囲で、複数行のINSERTにまとめて実行する
+    （pymysqlのexecutemany()と同じ方法で、実行したSQLの数を数えられるようにしたもの）
+    max_stmt_lengthがNoneの場合は、1行ずつ実行する
+    登録した行数と実行したSQLの数を返す
+
+    failuresにリストを指定した場合、値のエラー（ROW_ERRORS）で失敗した文は行を半分ずつに分けて実行し直し、
+    登録できない行を (rowsの中での位置, エラーメッセージ) としてfailuresに加える
+    （失敗した文だけがロールバックされるため、それ以外の行は登録される）
+    stop_on_failureがTrueの場合は、登録できない行が見つかった文で終了する
+    '''
+    rowcount = 0
+    statement_count = 0
     with conn.cursor() as cur:
         try:
-            cur.execute(sql, [_convert_value(value) for value in values])
+            for statement, start, end in _create_insert_statements(cur, sql, rows, max_stmt_length):
+                statement_count += 1
+                try:
+                    rowcount += cur.execute(statement)
+                except pymysql.err.MySQLError as e:
+                    if failures is None or not _is_row_error(e):
+                        raise e
+                    count, statements = _bisect_insert(cur, sql, rows, start, end, e, failures)
+                    rowcount += count
+                    statement_count += statements
+                    if stop_on_failure:
+                        break
         except Exception as e:
             # pymysql.err.ProgrammingErrorには args[0]: エラーコード, args[1]: メッセージ が入っている
             message = "Incorrect value in `{table}`: {msg}".format(table=table, msg=e.args[1])
             raise SQLException(message) from e
+    return rowcount, statement_count
+
+
+def _is_row_error(e):
+    '''行の値が原因のエラー（ROW_ERRORS）かどうか'''
+    return bool(e.args) and e.args[0] in ROW_ERRORS
+
+
+def _bisect_insert(cur, sql, rows, start, end, error, failures):
+    '''失敗したINSERT文の行（rowsのstartからendまで）を半分ずつに分けて実行し直す
+
+    1行だけで失敗した行を、登録できない行としてfailuresに加える
+    失敗する行がk行の場合、実行し直すSQLの数はおよそ 2k * log2(行数) になる
+    登録した行数と実行したSQLの数を返す
+    '''
+    if end - start == 1:
+        failures.append((start, error.args[1]))
+        return 0, 0
+
+    rowcount = 0
+    statement_count = 0
+    middle = (start + end) // 2
+    for lower, upper in ((start, middle), (middle, end)):
+        statement_count += 1
+        try:
+            rowcount += cur.execute(_create_insert_statement(cur, sql, rows, lower, upper))
+        except pymysql.err.MySQLError as e:
+            if not _is_row_error(e):
+                raise e
+            count, statements = _bisect_insert(cur, sql, rows, lower, upper, e, failures)
+            rowcount += count
+            statement_count += statements
+    return rowcount, statement_count
+
+
+def _create_insert_statements(cur, sql, rows, max_stmt_length):
+    '''複数行のINSERT文（値を埋め込んだバイト列）を、1文の長さがmax_stmt_lengthを超えないように作成する
+
+    rowsはColumnBatch。値のエスケープは項目ごとにまとめて接続のescape()で行う
+    （mogrify()と同じ結果になる。pymysql以外（aiomysqlなど）の接続でも使える）
+    max_stmt_lengthがNoneの場合は、1行ずつINSERT文にする
+    (INSERT文, 最初の行の位置, 最後の行の位置 + 1) を返す
+    '''
+    prefix, separator, _ = sql.rpartition(' VALUES ')
+    prefix = (prefix + separator).encode('utf_8')
+    encoding = cur.connection.encoding
+    escape = cur.connection.escape
+    columns = [list(map(escape, column)) for column in rows.columns]
+    statement = bytearray(prefix)
+    start = 0
+    for i, values in enumerate(zip(*columns)):
+        value = ('(' + ', '.join(values) + ')').encode(encoding)
+        if len(statement) > len(prefix):
+            if max_stmt_length is None or len(statement) + len(value) + 1 > max_stmt_length:
+                yield statement, start, i
+                statement = bytearray(prefix)
+                start = i
+            else:
+                statement += b','
+        statement += value
+    if len(statement) > len(prefix):
+        yield statement, start, len(rows)
+
+
+def _create_insert_statement(cur, sql, rows, start, end):
+    '''rowsのstartからendまでの行を、1つのINSERT文にする'''
+    prefix, separator, _ = sql.rpartition(' VALUES ')
+    encoding = cur.connection.encoding
+    escape = cur.connection.escape
+    values = ','.join('(' + ', '.join(map(escape, row)) + ')' for row in islice(rows.rows(), start, end))
+    return (prefix + separator).encode('utf_8') + values.encode(encoding)
 
 
 def _create_insert_sql(table, columns):
@@ -192,6 +1910,44 @@ def _create_insert_sql(table, columns):
     return sql
 
 
+def _create_load_data_sql(table, columns):
+    '''
+    戻り値のイメージ:
+        LOAD DATA LOCAL INFILE %s
+        INTO TABLE example
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY %s OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        (@v0, @v1)
+        SET id = IF(LENGTH(@v0) = 0, NULL, IF(@v0 = _binary'-', '', @v0)),
+            name = IF(LENGTH(@v1) = 0, NULL, IF(@v1 = _binary'-', '', @v1))
+
+    値の変換は_convert_value()と同じ
+    '''
+
+    variables = ['@v{}'.format(i) for i in range(len(columns))]
+    assignments = [
+        "{column} = IF(LENGTH({var}) = 0, NULL, IF({var} = _binary'-', '', {var}))".format(
+            column=column, var=var)
+        for column, var in zip(columns, variables)]
+
+    sql = (
+        "LOAD DATA LOCAL INFILE %s "
+        "INTO TABLE {table} "
+        "CHARACTER SET utf8mb4 "
+        "FIELDS TERMINATED BY %s OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+        "LINES TERMINATED BY '\\n' "
+        "IGNORE 1 LINES "
+        "({variables}) "
+        "SET {assignments}")
+    sql = sql.format(
+        table=table,
+        variables=', '.join(variables),
+        assignments=', '.join(assignments))
+    return sql
+
+
 def _convert_value(value):
     '''DBに登録する値に変換する
 
@@ -199,12 +1955,7 @@ def _convert_value(value):
     '-': '',
     上記以外: そのまま
     '''
-
-    if value == '':
-        return None
-    if value == '-':
-        return ''
-    return value
+    return table_schema.convert_value(value)
 
 
 def main():
@@ -0,0 +1,273 @@
+"""
+csv_to_db.load() / init_db() のasyncio版です.
+
+asyncioのMySQLドライバ（aiomysql）で登録するため、イベントループを止めずに登録できます
+ファイルの読み込み（パース）と値の変換はスレッド（イベントループのデフォルトのexecutor）で行い、
+INSERT文の応答を待っている間に次のバッチを準備するので、パースとSQLの実行が重なります
+複数のテーブルは、1つのイベントループで並行して登録します（同時に登録するテーブル数はjobsまで）
+
+aiomysqlが必要です（pip install aiomysql）
+
+使用例）
+    conn = await csv_to_db_async.get_connection()
+    try:
+        await csv_to_db_async.load_async(conn, batch_size=1000, example1='path/to/example1.csv')
+        await conn.commit()
+    finally:
+        conn.close()
+"""
+import asyncio
+import os
+import time
+from functools import partial
+from logging import getLogger
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+from app import database_connection
+from helper import csv_to_db, table_schema
+from helper.csv_to_db import SQLException
+from helper.load_report import LoadReport, TableReport
+
+logger = getLogger(__name__)
+
+# パースした行を、SQLの実行と並行して先に準備しておくバッチの数
+PREFETCH_BATCHES = 2
+
+
+async def get_connection(db=None):
+    """ aiomysqlのDB接続を取得する（接続先はdatabase_connection.get_connection()と同じ） """
+    if aiomysql is None:
+        raise ImportError("aiomysql is required to use csv_to_db_async")
+    return await aiomysql.connect(cursorclass=aiomysql.DictCursor,
+                                  **database_connection.get_connection_params(db=db))
+
+
+async def init_db_async(conn, csv_dir, batch_size: int=1, jobs: int=1, connection_factory=None,
+                        commit_interval: int=0):
+    """init_db() のasyncio版です. 引数はload_async()と同じです"""
+    targets = csv_to_db._find_targets(csv_dir)
+    return await load_async(conn, batch_size=batch_size, jobs=jobs, connection_factory=connection_factory,
+                            commit_interval=commit_interval, **targets)
+
+
+async def load_async(conn, truncate: bool=True, batch_size: int=1, jobs: int=1, connection_factory=None,
+                     commit_interval: int=0, **targets):
+    """
+    load() のasyncio版です.
+    ファイルの形式、特殊な値、外部キー制約、並列での登録（jobs > 1）の扱いはload()と同じです
+    ※コミットはしません（jobs > 1 またはcommit_intervalを指定した場合を除く）
+
+    local_infile, skip_unchanged, mode='sync', table_jobs, reject_file, foreign_key_order には対応していません
+    （分割したファイルのリストを指定した場合は、1つの接続で順に登録します）
+
+    Args:
+        conn:
+            aiomysqlのDBコネクション
+        truncate (bool, optional):
+            Defaults to True.
+            登録前に削除を行うかどうか。Trueの場合、削除を行う。
+        batch_size (int, optional):
+            Defaults to 1.
+            1回のINSERTでまとめて登録する行数。
+        jobs (int, optional):
+            Defaults to 1.
+            並行して登録するテーブル数（使用する接続数）。
+        connection_factory (coroutine function, optional):
+            Defaults to None.
+            jobs > 1 の場合に、追加の接続を作成するコルーチン関数。
+            Noneの場合、get_connection() を使う。
+        commit_interval (int, optional):
+            Defaults to 0.
+            指定した行数を登録するごとにコミットする。0の場合、途中でコミットしない。
+        targets:
+            テーブル名をキーワードとしてファイルパスを指定してください。複数指定可能
+
+    Returns:
+        LoadReport: 処理結果（テーブルごとの件数、処理時間など）
+    """
+    tables = sorted(targets.keys())
+    # 登録を始める前に、すべてのファイルを確認する
+    delimiters = {table: csv_to_db._get_delimiter(targets[table]) for table in tables}
+    options = dict(truncate=truncate, batch_size=batch_size, commit_interval=commit_interval)
+
+    report = LoadReport()
+    start = time.perf_counter()
+
+    connections = [conn]
+    try:
+        for _ in range(min(jobs, len(tables)) - 1):
+            connections.append(await (connection_factory or get_connection)())
+
+        # 各タスクは空いている接続を1つ取り出して使い、終わったら戻す（同時に登録するのは接続数まで）
+        idle_connections = asyncio.Queue()
+        for connection in connections:
+            await _execute(connection, "SET foreign_key_checks = 0")
+            idle_connections.put_nowait(connection)
+
+        async def worker(table):
+            connection = await idle_connections.get()
+            try:
+                return await _load(connection, table=table, filepath=targets[table],
+                                   delimiter=delimiters[table], **options)
+            finally:
+                idle_connections.put_nowait(connection)
+
+        # 大きいファイルから登録すると、全体の処理時間が最も大きいファイルの処理時間に近くなる
+        ordered_tables = sorted(tables, key=lambda table: csv_to_db._get_size(targets[table]), reverse=True)
+        tasks = [asyncio.ensure_future(worker(table)) for table in ordered_tables]
+        try:
+            table_reports = dict(zip(ordered_tables, await asyncio.gather(*tasks)))
+        except Exception as e:
+            # 1つでも失敗した場合は、他のテーブルの登録を中止する
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise e
+
+        if len(connections) > 1:
+            for connection in connections:
+                await connection.commit()
+
+    except Exception as e:
+        if len(connections) > 1:
+            for connection in connections:
+                await connection.rollback()
+        raise e
+
+    finally:
+        for connection in connections:
+            await _execute(connection, "SET foreign_key_checks = 1")
+        for connection in connections[1:]:
+            connection.close()
+
+    for table in tables:
+        report.add(table_reports[table])
+    return csv_to_db._finish_report(report, start)
+
+
+async def _load(conn, table, filepath, delimiter, truncate, batch_size, commit_interval):
+    report = TableReport(table)
+
+    if truncate:
+        start = time.perf_counter()
+        try:
+            await _execute(conn, "TRUNCATE TABLE {}".format(table))
+        except Exception as e:
+            raise SQLException("{msg}".format(msg=e.args[1])) from e
+        report.truncate_time += time.perf_counter() - start
+
+    # 1回に登録するデータの大きさがmax_allowed_packetを超えないようにする
+    max_stmt_length = None
+    if batch_size > 1:
+        max_allowed_packet = await _select_value(conn, "SELECT @@max_allowed_packet")
+        max_stmt_length = int(max_allowed_packet) - csv_to_db.PACKET_MARGIN
+    columns = await table_schema.get_columns_async(conn, table)
+
+    # 分割したファイルは順に登録する
+    uncommitted_rows = 0
+    for path in csv_to_db._as_list(filepath):
+        with csv_to_db._open_csv(path, delimiter) as csv_reader:
+            header = next(csv_reader)
+            sql = csv_to_db._create_insert_sql(table, header)
+            converters = [table_schema.create_column_converter(columns.get(name)) for name in header]
+            convert = partial(csv_to_db._convert_rows, table=table, converters=converters)
+
+            logger.info("LOAD DATA: {}".format(table))
+            batches = asyncio.Queue(maxsize=PREFETCH_BATCHES)
+            producer = asyncio.ensure_future(
+                _read_batches(csv_reader, batch_size, max_stmt_length, convert, batches, report))
+            try:
+                while True:
+                    rows = await batches.get()
+                    if rows is None:
+                        break
+                    if isinstance(rows, Exception):
+                        raise rows
+
+                    start = time.perf_counter()
+                    rowcount, statement_count = await _insert(conn, table, sql, rows, max_stmt_length)
+
+                    # 1トランザクションが大きくなりすぎないように、途中でコミットする
+                    uncommitted_rows += len(rows)
+                    if commit_interval and uncommitted_rows >= commit_interval:
+                        await conn.commit()
+                        uncommitted_rows = 0
+                    report.execute_time += time.perf_counter() - start
+
+                    report.rows_read += len(rows)
+                    report.rows_inserted += rowcount
+                    report.statement_count += statement_count
+            finally:
+                # ファイルを閉じる前に、読み込みを終了させる
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+
+        report.bytes_parsed += os.path.getsize(path)
+    return report
+
+
+async def _read_batches(csv_reader, batch_size, max_bytes, convert, batches, report):
+    '''ファイルを読み込んで、DBに登録する値に変換した行をbatchesに入れる
+
+    パースと変換はexecutorのスレッドで実行するため、イベントループを止めずにINSERT文の実行と重なる
+    最後にNone（失敗した場合は例外）を入れる
+    '''
+    loop = asyncio.get_running_loop()
+    try:
+        rows_iterator = csv_to_db._read_batches(csv_reader, batch_size, max_bytes, convert)
+        while True:
+            start = time.perf_counter()
+            future = loop.run_in_executor(None, next, rows_iterator, None)
+            try:
+                rows = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # ファイルを閉じる前に、スレッドでの読み込みを終わらせる
+                await asyncio.wait([future])
+                raise
+            report.parse_time += time.perf_counter() - start
+            await batches.put(rows)
+            if rows is None:
+                return
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await batches.put(e)
+
+
+async def _insert(conn, table, sql, rows, max_stmt_length):
+    '''行を登録し、登録した行数と実行したSQLの数を返す'''
+    rowcount = 0
+    statement_count = 0
+    async with conn.cursor() as cur:
+        try:
+            if max_stmt_length is None:
+                for row in rows.rows():
+                    rowcount += await cur.execute(sql, row)
+                    statement_count += 1
+            else:
+                for statement, _, _ in csv_to_db._create_insert_statements(cur, sql, rows, max_stmt_length):
+                    rowcount += await cur.execute(statement)
+                    statement_count += 1
+        except Exception as e:
+            # pymysql.err.ProgrammingErrorには args[0]: エラーコード, args[1]: メッセージ が入っている
+            message = "Incorrect value in `{table}`: {msg}".format(table=table, msg=e.args[1])
+            raise SQLException(message) from e
+    return rowcount, statement_count
+
+
+async def _execute(conn, sql):
+    async with conn.cursor() as cur:
+        return await cur.execute(sql)
+
+
+async def _select_value(conn, sql):
+    '''1行1列のSELECTの結果を返す'''
+    async with conn.cursor() as cur:
+        await cur.execute(sql)
+        result = await cur.fetchone()
+    # DictCursor以外のカーソルでも動くようにする
+    return list(result.values())[0] if isinstance(result, dict) else result[0]
@@ -0,0 +1,223 @@
+"""
+テーブルの内容を、csv_to_db.load() で登録できる形式のcsvファイル（tsvファイル）に出力します.
+
+NULLは値なし、空文字列は「-」で出力します
+値が「-」の文字列は、登録すると空文字列になってしまうため出力できません（出力を始める前にエラーにします）
+日時はyyyy-MM-dd hh:mm:ss形式で出力します
+拡張子に .gz, .bz2, .xz を付けた場合は、圧縮して出力します
+
+結果はサーバ側カーソル（SSCursor）で1行ずつ受け取りながら出力するため、
+テーブルの大きさに関係なくメモリ使用量は一定です
+
+使用例）
+    python -m helper.db_to_csv path/to/output_dir example1 example2 --jobs 2
+"""
+import argparse
+import csv
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
+from logging import getLogger
+
+import pymysql.cursors
+
+from app import database_connection
+from helper import csv_to_db, table_schema
+
+logger = getLogger(__name__)
+
+# 値が「-」かどうかを確認する型（文字列の型）
+TEXT_TYPES = ('char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext', 'enum', 'set')
+
+
+def dump_dir(conn, output_dir, tables, format: str='csv', jobs: int=1, connection_factory=None):
+    """
+    テーブルを「テーブル名.csv」（format='tsv'の場合は「テーブル名.tsv」）としてディレクトリに出力します.
+    出力したディレクトリは、そのまま csv_to_db.init_db() で登録できます
+
+    Args:
+        output_dir: 出力するディレクトリ（ない場合は作成します）
+        tables (list): 出力するテーブル名のリスト
+        format (str, optional):
+            Defaults to 'csv'.
+            ファイルの形式（csv, tsv）。圧縮する場合は csv.gz のように指定します
+        jobs, connection_factory: dump() と同じ
+
+    Returns:
+        dict: テーブル名をキー、出力した行数を値とするdict
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    targets = {table: os.path.join(output_dir, '{}.{}'.format(table, format)) for table in tables}
+    return dump(conn, jobs=jobs, connection_factory=connection_factory, **targets)
+
+
+def dump(conn, jobs: int=1, connection_factory=None, **targets):
+    """
+    テーブルの内容をcsvファイル（tsvファイル）に出力します.
+    区切り文字と圧縮形式は、csv_to_db.load() と同じようにファイルの拡張子で決まります
+
+    並列での出力について（jobs > 1）
+        テーブルごとに別々の接続で並列に出力します（connも接続の1つとして使います）
+        接続ごとにトランザクションが異なるため、テーブル間の整合性は保証されません
+
+    Args:
+        conn:
+            DBコネクション
+        jobs (int, optional):
+            Defaults to 1.
+            並列で出力するテーブル数（使用する接続数）。
+        connection_factory (callable, optional):
+            Defaults to None.
+            jobs > 1 の場合に、追加の接続を作成する関数。
+            Noneの場合、database_connection.get_connection() を使う。
+        targets:
+            テーブル名をキーワードとして出力するファイルパスを指定してください。複数指定可能
+            例）
+            dump(conn, USER='path/to/USER.csv', COMPANY='path/to/COMPANY.tsv.gz')
+
+    Returns:
+        dict: テーブル名をキー、出力した行数を値とするdict
+    """
+    tables = sorted(targets.keys())
+    # 出力を始める前に、すべてのファイルの拡張子と、出力できない値がないことを確認する
+    delimiters = {table: _get_delimiter(targets[table]) for table in tables}
+    for table in tables:
+        _check_values(conn, table)
+
+    if jobs <= 1 or len(tables) <= 1:
+        return {table: _dump(conn, table, targets[table], delimiters[table]) for table in tables}
+
+    connection_factory = connection_factory or database_connection.get_connection
+    connections = [conn]
+    try:
+        for _ in range(min(jobs, len(tables)) - 1):
+            connections.append(connection_factory())
+
+        # 各ワーカーは空いている接続を1つ取り出して使い、終わったら戻す
+        idle_connections = queue.Queue()
+        for connection in connections:
+            idle_connections.put(connection)
+
+        def worker(table):
+            connection = idle_connections.get()
+            try:
+                return _dump(connection, table, targets[table], delimiters[table])
+            finally:
+                idle_connections.put(connection)
+
+        with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+            futures = {table: executor.submit(worker, table) for table in tables}
+            return {table: future.result() for table, future in futures.items()}
+    finally:
+        for connection in connections[1:]:
+            connection.close()
+
+
+def _get_delimiter(filepath):
+    '''ファイルの拡張子から区切り文字を返す（ファイルがなくてもよい）'''
+    match = csv_to_db.FILENAME_PATTERN.match(os.path.basename(filepath))
+    if not match:
+        raise ValueError("Unsupported extension: {}".format(filepath))
+    return ',' if match.group('format').lower() == 'csv' else '\t'
+
+
+def _check_values(conn, table):
+    '''出力できない値（「-」の文字列）がある場合はValueErrorにする
+
+    「-」は空文字列として登録されるため、出力すると元のデータに戻せなくなる
+    ファイルに書き始めてから失敗すると途中までのファイルが残るため、出力する前に確認する
+    '''
+    columns = [column.name for column in table_schema.get_columns(conn, table).values()
+               if column.data_type in TEXT_TYPES]
+    if not columns:
+        return
+    sql = "SELECT 1 FROM {} WHERE {} LIMIT 1".format(
+        table, ' OR '.join("{} = BINARY '-'".format(column) for column in columns))
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        if cur.fetchone():
+            raise ValueError("Value '-' can not be dumped: {}".format(table))
+
+
+def _dump(conn, table, filepath, delimiter):
+    # 主キーの順に出力すると、同じデータであれば毎回同じファイルになる
+    primary_keys = csv_to_db._get_primary_keys(conn, table)
+    sql = "SELECT * FROM {}".format(table)
+    if primary_keys:
+        sql += " ORDER BY {}".format(', '.join(primary_keys))
+
+    logger.info("DUMP DATA: {}".format(table))
+    rowcount = 0
+    # DictCursorは結果をすべてメモリに読み込むため、サーバ側カーソルで1行ずつ受け取る
+    with conn.cursor(pymysql.cursors.SSCursor) as cur:
+        cur.execute(sql)
+        header = [column[0] for column in cur.description]
+        with _open_text(filepath) as f:
+            writer = csv.writer(f, delimiter=delimiter, quotechar='"', lineterminator='\n')
+            writer.writerow(header)
+            format_row = partial(map, partial(_format_value, table=table))
+            for row in cur:
+                writer.writerow(format_row(row))
+                rowcount += 1
+    return rowcount
+
+
+def _open_text(filepath):
+    '''ファイルを書き込み用にテキストとして開く（拡張子に合わせて圧縮する）'''
+    compression = csv_to_db._get_compression(filepath)
+    if compression:
+        return csv_to_db.COMPRESSIONS[compression](filepath, mode='wt', encoding='utf_8', newline='')
+    return open(filepath, mode='w', encoding='utf_8', newline='')
+
+
+def _format_value(value, table=None):
+    '''csvファイルに出力する値に変換する（csv_to_db._convert_value() の逆）
+
+    None: '',
+    '': '-',
+    日時: yyyy-MM-dd hh:mm:ss（マイクロ秒がある場合は yyyy-MM-dd hh:mm:ss.ffffff）
+    上記以外: 文字列
+    '''
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        if value == '':
+            return '-'
+        if value == '-':
+            # 「-」は空文字列として登録されるため、そのまま出力すると値が変わってしまう
+            raise ValueError("Value '-' can not be dumped: {}".format(table))
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, timedelta):
+        # TIME型（hh:mm:ss）
+        seconds = int(value.total_seconds())
+        sign = '-' if seconds < 0 else ''
+        hours, remainder = divmod(abs(seconds), 3600)
+        return '{}{:02d}:{:02d}:{:02d}'.format(sign, hours, remainder // 60, remainder % 60)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf_8')
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output_dir', help="出力するディレクトリ")
+    parser.add_argument('tables', nargs='+', help="出力するテーブル名")
+    parser.add_argument('--format', default='csv', help="ファイルの形式（csv, tsv, csv.gz など）")
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+
+    conn = database_connection.get_connection()
+    try:
+        counts = dump_dir(conn, args.output_dir, args.tables, format=args.format, jobs=args.jobs)
+    finally:
+        conn.close()
+    for table, count in counts.items():
+        print("{}: {} rows".format(table, count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+csv_to_db.load() の処理結果（件数、処理時間など）を保持します.
+
+Prometheus（OpenMetrics）のテキスト形式で出力できます
+例）node_exporterのtextfile collectorで読み込むファイルに出力する
+    report = csv_to_db.load(conn, example1='path/to/example1.csv')
+    load_report.write_textfile(report, '/var/lib/node_exporter/csv_to_db.prom')
+"""
+import os
+
+
+class TableReport:
+    """
+    1テーブル分の処理結果です.
+
+    Attributes:
+        table: テーブル名
+        rows_read: ファイルから読み込んだ行数（ヘッダを除く）
+        rows_inserted: 登録した行数
+        rows_updated: 更新した行数（mode='sync'の場合のみ）
+        rows_deleted: 削除した行数（mode='sync'の場合のみ）
+        rows_rejected: 登録できずにreject_fileに出力した行数（reject_fileを指定した場合のみ）
+        bytes_parsed: 読み込んだファイルのバイト数
+        truncate_time: TRUNCATEにかかった秒数
+        parse_time: ファイルの読み込みと値の変換にかかった秒数
+        execute_time: 登録（SQLの実行）にかかった秒数
+        statement_count: 実行した登録のSQLの数
+        skipped: 変更がないため登録しなかったかどうか（skip_unchanged=Trueの場合）
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.rows_read = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_deleted = 0
+        self.rows_rejected = 0
+        self.bytes_parsed = 0
+        self.truncate_time = 0.0
+        self.parse_time = 0.0
+        self.execute_time = 0.0
+        self.statement_count = 0
+        self.skipped = False
+
+    def merge(self, other):
+        """同じテーブルを分けて登録した結果（other）の件数と処理時間を加える"""
+        for name in ('rows_read', 'rows_inserted', 'rows_updated', 'rows_deleted', 'rows_rejected',
+                     'bytes_parsed', 'truncate_time', 'parse_time', 'execute_time', 'statement_count'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class LoadReport:
+    """
+    load()全体の処理結果です.
+
+    Attributes:
+        tables: テーブル名をキー、TableReportを値とするdict
+        elapsed_time: load()全体にかかった秒数
+        finished_at: load()が終了した時刻（UNIX時間）
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.elapsed_time = 0.0
+        self.finished_at = None
+
+    def add(self, table_report):
+        self.tables[table_report.table] = table_report
+
+    def __getitem__(self, table):
+        return self.tables[table]
+
+    def __iter__(self):
+        return iter(self.tables.values())
+
+    @property
+    def rows_read(self):
+        return sum(table_report.rows_read for table_report in self)
+
+    @property
+    def rows_inserted(self):
+        return sum(table_report.rows_inserted for table_report in self)
+
+    def to_dict(self):
+        return {
+            'elapsed_time': self.elapsed_time,
+            'finished_at': self.finished_at,
+            'tables': {table: table_report.to_dict() for table, table_report in self.tables.items()},
+        }
+
+
+# テーブルごとに出力する項目
+# (メトリクス名, TableReportの属性名, 説明)
+TABLE_METRICS = (
+    ('rows_read', 'rows_read', "Rows read from the file."),
+    ('rows_inserted', 'rows_inserted', "Rows inserted into the table."),
+    ('rows_updated', 'rows_updated', "Rows updated in the table (sync mode)."),
+    ('rows_deleted', 'rows_deleted', "Rows deleted from the table (sync mode)."),
+    ('rows_rejected', 'rows_rejected', "Rows rejected and written to the reject file."),
+    ('bytes_parsed', 'bytes_parsed', "Bytes of the file parsed."),
+    ('truncate_seconds', 'truncate_time', "Time spent truncating the table."),
+    ('parse_seconds', 'parse_time', "Time spent parsing and converting the file."),
+    ('execute_seconds', 'execute_time', "Time spent executing insert statements."),
+    ('statements', 'statement_count', "Insert statements executed."),
+    ('skipped', 'skipped', "1 if the table was skipped because nothing changed."),
+)
+
+
+def to_openmetrics(report, prefix='csv_to_db'):
+    """
+    処理結果をPrometheus（OpenMetrics）のテキスト形式で返します.
+
+    Args:
+        report (LoadReport): 処理結果
+        prefix (str, optional): Defaults to 'csv_to_db'. メトリクス名の接頭辞
+
+    Returns:
+        str: テキスト形式の処理結果
+    """
+    lines = []
+    for name, attribute, description in TABLE_METRICS:
+        metric = '{}_{}'.format(prefix, name)
+        lines.append('# HELP {} {}'.format(metric, description))
+        lines.append('# TYPE {} gauge'.format(metric))
+        for table_report in report:
+            lines.append('{}{{table="{}"}} {}'.format(
+                metric, _escape_label_value(table_report.table),
+                _format_value(getattr(table_report, attribute))))
+
+    metric = '{}_load_seconds'.format(prefix)
+    lines.append('# HELP {} Time spent in the whole load.'.format(metric))
+    lines.append('# TYPE {} gauge'.format(metric))
+    lines.append('{} {}'.format(metric, _format_value(report.elapsed_time)))
+
+    if report.finished_at is not None:
+        metric = '{}_last_load_timestamp_seconds'.format(prefix)
+        lines.append('# HELP {} Time the last load finished.'.format(metric))
+        lines.append('# TYPE {} gauge'.format(metric))
+        lines.append('{} {}'.format(metric, _format_value(report.finished_at)))
+
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(report, filepath, prefix='csv_to_db'):
+    """
+    処理結果をPrometheus（OpenMetrics）のテキスト形式でファイルに出力します.
+
+    読み込み中のファイルが途中までしか書かれていない状態にならないように、
+    一時ファイルに書いてから置き換えます
+    """
+    temporary_filepath = '{}.{}.tmp'.format(filepath, os.getpid())
+    with open(temporary_filepath, mode='w', encoding='utf_8') as f:
+        f.write(to_openmetrics(report, prefix=prefix))
+    os.replace(temporary_filepath, filepath)
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
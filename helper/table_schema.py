@@ -0,0 +1,394 @@
+"""
+テーブル定義（INFORMATION_SCHEMA.COLUMNS）を取得し、項目ごとに値の変換関数を作成します.
+
+csvファイルの値（文字列）を、登録前に項目の型の値に変換します
+変換できない値はValueErrorになるため、DBに登録する前に不正な値を検出できます
+"""
+import math
+import re
+import threading
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# 整数型の範囲 (符号あり, 符号なし)
+INTEGER_RANGES = {
+    'tinyint': ((-2 ** 7, 2 ** 7 - 1), (0, 2 ** 8 - 1)),
+    'smallint': ((-2 ** 15, 2 ** 15 - 1), (0, 2 ** 16 - 1)),
+    'mediumint': ((-2 ** 23, 2 ** 23 - 1), (0, 2 ** 24 - 1)),
+    'int': ((-2 ** 31, 2 ** 31 - 1), (0, 2 ** 32 - 1)),
+    'integer': ((-2 ** 31, 2 ** 31 - 1), (0, 2 ** 32 - 1)),
+    'bigint': ((-2 ** 63, 2 ** 63 - 1), (0, 2 ** 64 - 1)),
+}
+DECIMAL_TYPES = ('decimal', 'numeric')
+FLOAT_TYPES = ('float', 'double', 'real')
+DATETIME_TYPES = ('datetime', 'timestamp')
+STRING_TYPES = ('char', 'varchar')
+
+# 日時の形式（yyyy-MM-dd hh:mm:ss。時間部分は省略可能）
+DATETIME_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2}(\.\d{1,6})?)?$')
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+# 数値の形式（int(), float(), Decimal() は「1_000」、前後の空白、全角数字も変換できるため、先に形式を確認する）
+# fullmatch()で確認する。COLUMNは項目の値を「,」でつないだ文字列の形式（空の値はNULL）
+# COLUMNは_fullmatch_column()で確認する
+INTEGER_PATTERN = re.compile(r'[+-]?[0-9]+')
+NUMBER_PATTERN = re.compile(r'[+-]?([0-9]+(\.[0-9]*)?|\.[0-9]+)([eE][+-]?[0-9]+)?')
+INTEGER_COLUMN_PATTERN = re.compile(r'({0})?(,({0})?)*'.format(INTEGER_PATTERN.pattern))
+NUMBER_COLUMN_PATTERN = re.compile(r'({0})?(,({0})?)*'.format(NUMBER_PATTERN.pattern))
+
+
+class Column:
+    """
+    テーブルの項目の定義です.
+
+    Attributes:
+        name: 項目名
+        data_type: 型（int, varchar, datetime など）
+        nullable: NULLを登録できるかどうか
+        max_length: 最大文字数（char, varcharの場合）
+        precision: 精度（数値型の場合）
+        scale: 小数点以下の桁数（数値型の場合）
+        unsigned: 符号なしかどうか
+        auto_increment: AUTO_INCREMENTかどうか
+    """
+
+    def __init__(self, name, data_type, nullable=True, max_length=None, precision=None, scale=None,
+                 unsigned=False, auto_increment=False):
+        self.name = name
+        self.data_type = data_type
+        self.nullable = nullable
+        self.max_length = max_length
+        self.precision = precision
+        self.scale = scale
+        self.unsigned = unsigned
+        self.auto_increment = auto_increment
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# テーブルの項目の定義を取得するSQL
+COLUMNS_SQL = (
+    "SELECT COLUMN_NAME AS column_name, DATA_TYPE AS data_type, IS_NULLABLE AS is_nullable, "
+    "CHARACTER_MAXIMUM_LENGTH AS max_length, NUMERIC_PRECISION AS numeric_precision, "
+    "NUMERIC_SCALE AS numeric_scale, COLUMN_TYPE AS column_type, EXTRA AS extra "
+    "FROM INFORMATION_SCHEMA.COLUMNS "
+    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+    "ORDER BY ORDINAL_POSITION")
+
+
+def get_columns(conn, table):
+    """
+    テーブルの項目の定義を取得します.
+    取得した定義はキャッシュし、同じデータベースの同じテーブルは2回目以降DBから取得しません
+
+    Returns:
+        dict: 項目名をキー、Columnを値とするdict（項目の順）。テーブルがない場合は空のdict
+    """
+    key = _get_cache_key(conn, table)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    with conn.cursor() as cur:
+        cur.execute(COLUMNS_SQL, (table, ))
+        results = cur.fetchall()
+
+    return _set_cache(key, _create_columns(results))
+
+
+async def get_columns_async(conn, table):
+    """get_columns() のasyncio版です（aiomysqlの接続を使います）"""
+    key = _get_cache_key(conn, table)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    async with conn.cursor() as cur:
+        await cur.execute(COLUMNS_SQL, (table, ))
+        results = await cur.fetchall()
+
+    return _set_cache(key, _create_columns(results))
+
+
+def _get_cache_key(conn, table):
+    database = conn.db.decode('utf_8') if isinstance(conn.db, bytes) else conn.db
+    return (conn.host, conn.port, database, table)
+
+
+def _set_cache(key, columns):
+    with _cache_lock:
+        _cache[key] = columns
+    return columns
+
+
+def _create_columns(results):
+    keys = ('column_name', 'data_type', 'is_nullable', 'max_length', 'numeric_precision',
+            'numeric_scale', 'column_type', 'extra')
+    columns = {}
+    for result in results:
+        # DictCursor以外のカーソルでも動くようにする
+        values = [result[key] for key in keys] if isinstance(result, dict) else list(result)
+        name, data_type, is_nullable, max_length, precision, scale, column_type, extra = values
+        columns[name] = Column(
+            name,
+            data_type.lower(),
+            nullable=(is_nullable == 'YES'),
+            max_length=max_length,
+            precision=precision,
+            scale=scale,
+            unsigned=('unsigned' in column_type.lower()),
+            auto_increment=('auto_increment' in extra.lower()))
+    return columns
+
+
+def clear_cache():
+    """キャッシュしているテーブル定義を削除します（テーブル定義を変更した場合に使います）"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def create_converter(column):
+    """
+    csvファイルの値（文字列）をDBに登録する値に変換する関数を作成します.
+
+    空文字列はNone（NULL）、「-」は空文字列に変換します
+    それ以外の値は項目の型の値に変換し、変換できない場合や範囲外の場合はValueErrorにします
+    columnがNoneの場合（テーブル定義がわからない場合）は、文字列のまま返します
+    """
+    if column is None:
+        return convert_value
+
+    data_type = column.data_type
+    if data_type in INTEGER_RANGES:
+        return _create_integer_converter(column)
+    if data_type in DECIMAL_TYPES:
+        return _create_decimal_converter(column)
+    if data_type in FLOAT_TYPES:
+        return _create_float_converter(column)
+    if data_type in DATETIME_TYPES:
+        return _create_datetime_converter(column)
+    if data_type == 'date':
+        return _create_date_converter(column)
+    if data_type in STRING_TYPES and column.max_length is not None:
+        return _create_string_converter(column)
+    return convert_value
+
+
+def create_column_converter(column):
+    """
+    項目の値のリスト（csvファイルの複数行の1項目分）をまとめて変換する関数を作成します.
+
+    変換結果はcreate_converter()で1つずつ変換した場合と同じです
+    整数型、浮動小数点型、文字列型は、値の変換と範囲の確認を項目ごとにまとめて行います
+    （確認で不正な値が見つかった場合は1つずつ変換し直すため、ValueErrorの内容も同じになります）
+    """
+    convert = create_converter(column)
+    if convert is convert_value:
+        return convert_values
+
+    data_type = column.data_type
+    if data_type in INTEGER_RANGES:
+        return _create_integer_column_converter(column, convert)
+    if data_type in FLOAT_TYPES:
+        return _create_float_column_converter(column, convert)
+    if data_type in STRING_TYPES:
+        return _create_string_column_converter(column, convert)
+
+    def convert_column(values):
+        return list(map(convert, values))
+
+    return convert_column
+
+
+def convert_values(values):
+    '''値のリストを、convert_value()と同じようにまとめて変換する'''
+    return [None if value == '' else '' if value == '-' else value for value in values]
+
+
+def convert_value(value):
+    '''DBに登録する値に変換する
+
+    '': None,
+    '-': '',
+    上記以外: そのまま
+    '''
+
+    if value == '':
+        return None
+    if value == '-':
+        return ''
+    return value
+
+
+def _incorrect_value(type_name, value, column):
+    # 「-」は空文字列として登録しようとした値
+    value = '' if value == '-' else value
+    return ValueError("Incorrect {} value: '{}' for column '{}'".format(type_name, value, column.name))
+
+
+def _out_of_range(value, column):
+    return ValueError("Out of range value: '{}' for column '{}'".format(value, column.name))
+
+
+def _create_integer_converter(column):
+    low, high = INTEGER_RANGES[column.data_type][1 if column.unsigned else 0]
+
+    def convert(value):
+        if value == '':
+            return None
+        if INTEGER_PATTERN.fullmatch(value):
+            result = int(value)
+        elif NUMBER_PATTERN.fullmatch(value):
+            # 「1.5」や「1e3」などは、MySQLと同じように四捨五入して整数にする
+            try:
+                result = int(Decimal(value).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+            except (InvalidOperation, ValueError):
+                raise _incorrect_value('integer', value, column) from None
+        else:
+            raise _incorrect_value('integer', value, column)
+        if not low <= result <= high:
+            raise _out_of_range(value, column)
+        return result
+
+    return convert
+
+
+def _create_decimal_converter(column):
+    # 整数部の最大桁数
+    max_digits = None if column.precision is None else column.precision - (column.scale or 0)
+
+    def convert(value):
+        if value == '':
+            return None
+        if not NUMBER_PATTERN.fullmatch(value):
+            raise _incorrect_value('decimal', value, column)
+        result = Decimal(value)
+        if max_digits is not None and abs(result) >= 10 ** max_digits:
+            raise _out_of_range(value, column)
+        return result
+
+    return convert
+
+
+def _create_float_converter(column):
+    # double(M,D) のように桁数が指定されている場合のみ、範囲を確認する
+    limit = None
+    if column.precision is not None and column.scale is not None:
+        limit = 10 ** (column.precision - column.scale)
+
+    def convert(value):
+        if value == '':
+            return None
+        # nan, infは登録できない
+        if not NUMBER_PATTERN.fullmatch(value):
+            raise _incorrect_value('double', value, column)
+        result = float(value)
+        # 1e999 など、doubleの範囲を超える値
+        if result in (float('inf'), float('-inf')):
+            raise _incorrect_value('double', value, column)
+        if limit is not None and abs(result) >= limit:
+            raise _out_of_range(value, column)
+        return result
+
+    return convert
+
+
+def _create_integer_column_converter(column, convert):
+    low, high = INTEGER_RANGES[column.data_type][1 if column.unsigned else 0]
+
+    def convert_column(values):
+        # 「1.5」など、整数の形式ではない値がある場合は1つずつ変換する
+        if not _fullmatch_column(INTEGER_COLUMN_PATTERN, values):
+            return list(map(convert, values))
+        result = [None if value == '' else int(value) for value in values]
+        numbers = [value for value in result if value is not None]
+        if numbers and (min(numbers) < low or max(numbers) > high):
+            return list(map(convert, values))
+        return result
+
+    return convert_column
+
+
+def _create_float_column_converter(column, convert):
+    limit = None
+    if column.precision is not None and column.scale is not None:
+        limit = 10 ** (column.precision - column.scale)
+
+    def convert_column(values):
+        if not _fullmatch_column(NUMBER_COLUMN_PATTERN, values):
+            return list(map(convert, values))
+        result = [None if value == '' else float(value) for value in values]
+        numbers = [value for value in result if value is not None]
+        # 合計がnan, infにならなければ、すべての値が有限（大きい値で合計があふれた場合は1つずつ確認する）
+        if not math.isfinite(sum(numbers)) or (limit is not None and numbers and max(map(abs, numbers)) >= limit):
+            return list(map(convert, values))
+        return result
+
+    return convert_column
+
+
+def _fullmatch_column(pattern, values):
+    '''項目の値がすべてpattern（COLUMNのパターン）の形式かどうかを、「,」でつないで1回で確認する'''
+    joined = ','.join(values)
+    # 「,」を含む値（「1,2」など）があると、別の値に分かれて一致してしまう
+    return joined.count(',') == len(values) - 1 and pattern.fullmatch(joined) is not None
+
+
+def _create_string_column_converter(column, convert):
+    max_length = column.max_length
+
+    def convert_column(values):
+        if max(map(len, values)) > max_length:
+            return list(map(convert, values))
+        return convert_values(values)
+
+    return convert_column
+
+
+def _create_datetime_converter(column):
+    def convert(value):
+        if value == '':
+            return None
+        if not DATETIME_PATTERN.match(value):
+            raise _incorrect_value('datetime', value, column)
+        try:
+            if len(value) == 10:
+                return datetime.strptime(value, '%Y-%m-%d')
+            if len(value) == 19:
+                return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+            return datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f')
+        except ValueError:
+            # 2018-02-30 など、存在しない日時
+            raise _incorrect_value('datetime', value, column) from None
+
+    return convert
+
+
+def _create_date_converter(column):
+    def convert(value):
+        if value == '':
+            return None
+        if not DATE_PATTERN.match(value):
+            raise _incorrect_value('date', value, column)
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise _incorrect_value('date', value, column) from None
+
+    return convert
+
+
+def _create_string_converter(column):
+    max_length = column.max_length
+
+    def convert(value):
+        if value == '':
+            return None
+        if value == '-':
+            return ''
+        if len(value) > max_length:
+            raise ValueError("Data too long for column '{}': '{}'".format(column.name, value))
+        return value
+
+    return convert
@@ -1,6 +1,13 @@
 from app import database_connection
 from helper import csv_to_db
+from helper.table_schema import Column
 from datetime import datetime
+import csv
+import os
+import pymysql
+import tempfile
+from parameterized import parameterized, param
+from unittest import mock
 import unittest
 
 
@@ -72,6 +79,15 @@ TEST_DATA_EXAMPLE1_TSV[1] = {
     'double_col': -123.456,
     'datetime_col': datetime(2018, 8, 3, 0, 0, 0),
 }
+# example1のテストで取り込む圧縮したファイル（内容はTEST_FILE_EXAMPLE1, TEST_FILE_EXAMPLE1_TSVと同じ）
+TEST_FILE_EXAMPLE1_GZ = "tests/data/csv_to_db/example1_test_load_csv.csv.gz"
+TEST_FILE_EXAMPLE1_BZ2 = "tests/data/csv_to_db/example1_test_load_csv.csv.bz2"
+TEST_FILE_EXAMPLE1_TSV_XZ = "tests/data/csv_to_db/example1_test_load.tsv.xz"
+# example1のテストで取り込む分割したcsvファイル（内容はTEST_FILE_EXAMPLE1と同じ）
+TEST_FILES_EXAMPLE1_SHARD = [
+    "tests/data/csv_to_db/example1_test_load_shard.part-0001.csv",
+    "tests/data/csv_to_db/example1_test_load_shard.part-0002.csv",
+]
 
 # example2のテストで取り込むcsvファイル
 TEST_FILE_EXAMPLE2 = "tests/data/csv_to_db/example2_test_load_csv.csv"
@@ -87,6 +103,9 @@ TEST_DATA_EXAMPLE2 = [
     },
 ]
 
+# setup_load()で使うコネクションプール
+POOL = database_connection.ConnectionPool(maxsize=2)
+
 
 class Test_csv_to_db(unittest.TestCase):
     '''
@@ -100,6 +119,7 @@ class Test_csv_to_db(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         cls.conn.close()
+        POOL.close()
 
     def setUp(self):
         # データ初期化: example1
@@ -134,6 +154,26 @@ class Test_csv_to_db(unittest.TestCase):
             with self.subTest(i=i):
                 self.assertDictEqual(records[i], expected_row)
 
+    # 処理結果の確認
+    def test_load_success_report(self):
+        report = csv_to_db.load(
+            self.conn,
+            batch_size=3,
+            example1=TEST_FILE_EXAMPLE1,
+            example2=TEST_FILE_EXAMPLE2)
+        self.conn.commit()
+
+        # テーブルごとの件数
+        self.assertEqual(report['example1'].rows_read, len(TEST_DATA_EXAMPLE1))
+        self.assertEqual(report['example1'].rows_inserted, len(TEST_DATA_EXAMPLE1))
+        self.assertEqual(report['example2'].rows_read, len(TEST_DATA_EXAMPLE2))
+        self.assertEqual(report['example2'].rows_inserted, len(TEST_DATA_EXAMPLE2))
+        # 3行ずつ登録するので、4行のファイルは2回に分かれる
+        self.assertEqual(report['example1'].statement_count, 2)
+        self.assertEqual(report['example1'].bytes_parsed, os.path.getsize(TEST_FILE_EXAMPLE1))
+        # 全体の件数
+        self.assertEqual(report.rows_inserted, len(TEST_DATA_EXAMPLE1) + len(TEST_DATA_EXAMPLE2))
+
     # 複数テーブルのデータの初期化
     def test_load_success_multi(self):
         expected_example1 = TEST_DATA_EXAMPLE1
@@ -292,6 +332,399 @@ class Test_csv_to_db(unittest.TestCase):
         # 件数の確認
         self.assertEqual(len(records), len(expected))
 
+    # 複数行ずつまとめて登録する場合
+    def test_load_success_batch(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        # csvファイル内容で初期化（3行ずつ登録するので、4行のファイルは2回に分かれる）
+        csv_to_db.load(
+            self.conn,
+            batch_size=3,
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 複数行ずつまとめて登録する場合で、csvファイルのデータとテーブル定義が一致しない場合
+    def test_load_error_type_batch(self):
+        # 例外の確認
+        with self.assertRaises(csv_to_db.SQLException):
+            try:
+                self.conn.begin()
+                csv_to_db.load(
+                    self.conn,
+                    batch_size=100,
+                    # int型の項目に文字列を指定
+                    example1='tests/data/csv_to_db/example1_test_load_csv_error.csv')
+            except Exception as e:
+                self.conn.rollback()
+                raise e
+
+    # 型に合わない値は、DBに登録する前にエラーになる
+    def test_load_error_type_converter(self):
+        with mock.patch.object(csv_to_db, '_insert_many', wraps=csv_to_db._insert_many) as insert_many:
+            # 例外の確認
+            with self.assertRaisesRegex(csv_to_db.SQLException, "'int_col'"):
+                try:
+                    self.conn.begin()
+                    csv_to_db.load(
+                        self.conn,
+                        batch_size=100,
+                        # int型の項目に文字列を指定
+                        example1='tests/data/csv_to_db/example1_test_load_csv_error.csv')
+                except Exception as e:
+                    self.conn.rollback()
+                    raise e
+        # INSERT文は実行されていないことを確認
+        insert_many.assert_not_called()
+
+    # 指定した行数ごとにコミットする場合
+    @parameterized.expand([
+        param(batch_size=1),
+        param(batch_size=2),
+    ])
+    def test_load_success_commit_interval(self, batch_size):
+        expected = TEST_DATA_EXAMPLE1
+
+        # 2行ごとにコミットする（4行のファイルなので、最後の行までコミットされる）
+        csv_to_db.load(
+            self.conn,
+            batch_size=batch_size,
+            commit_interval=2,
+            example1=TEST_FILE_EXAMPLE1)
+
+        # コミットしていないが、別の接続からも登録後の状態が見えることを確認
+        conn = database_connection.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT * FROM example1 ORDER BY id")
+                records = cur.fetchall()
+        finally:
+            conn.close()
+        self.conn.commit()
+
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 前回の登録時から変わっていない場合は、削除と登録を行わない
+    def test_load_success_skip_unchanged(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        # フィンガープリントを管理するテーブルは、最初の保存時に作成する
+        with self.conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS {}".format(csv_to_db.FINGERPRINT_TABLE))
+        csv_to_db.load(
+            self.conn,
+            skip_unchanged=True,
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+
+        # 同じファイルをもう一度登録する
+        with mock.patch.object(csv_to_db, '_load', wraps=csv_to_db._load) as load_mock:
+            csv_to_db.load(
+                self.conn,
+                skip_unchanged=True,
+                example1=TEST_FILE_EXAMPLE1)
+            self.conn.commit()
+        # 登録していないことを確認
+        load_mock.assert_not_called()
+
+        # csvファイルをロードした後の状態のままであることを確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # ファイルが変わっている場合は、テーブルのチェックサムを比較せずに登録する
+    def test_load_success_skip_unchanged_file_modified(self):
+        csv_to_db.load(
+            self.conn,
+            skip_unchanged=True,
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+
+        with mock.patch.object(csv_to_db, '_checksum_table', wraps=csv_to_db._checksum_table) as checksum_mock:
+            csv_to_db.load(
+                self.conn,
+                skip_unchanged=True,
+                example1=TEST_FILE_EXAMPLE1_TSV)
+            self.conn.commit()
+        # 登録後に保存するときだけ、チェックサムを計算する
+        checksum_mock.assert_called_once()
+
+    # 前回の登録時からテーブルのデータが変わっている場合は、削除と登録を行う
+    def test_load_success_skip_unchanged_modified(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        csv_to_db.load(
+            self.conn,
+            skip_unchanged=True,
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+
+        # テーブルのデータを変更する
+        with self.conn.cursor() as cur:
+            cur.execute("UPDATE example1 SET varchar_col = 'xxx' WHERE id = 11")
+        self.conn.commit()
+
+        # 同じファイルをもう一度登録する
+        with mock.patch.object(csv_to_db, '_load', wraps=csv_to_db._load) as load_mock:
+            csv_to_db.load(
+                self.conn,
+                skip_unchanged=True,
+                example1=TEST_FILE_EXAMPLE1)
+            self.conn.commit()
+        # 登録していることを確認
+        load_mock.assert_called_once()
+
+        # csvファイルの内容に戻っていることを確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # csvファイルとテーブルの差分だけを反映する場合
+    @parameterized.expand([
+        param(sync_chunk_size=1000),
+        # チェックサムを比較する範囲を小さくして、範囲ごとに反映する
+        param(sync_chunk_size=1),
+    ])
+    def test_load_success_sync(self, sync_chunk_size):
+        expected = TEST_DATA_EXAMPLE1
+
+        # 一部のデータは登録済みで、一部のデータは値が異なる状態にする
+        with self.conn.cursor() as cur:
+            cur.execute(INSERT_SQL_EXAMPLE1, TEST_DATA_EXAMPLE1[0])
+            cur.execute(INSERT_SQL_EXAMPLE1, dict(TEST_DATA_EXAMPLE1[1], varchar_col='xxx'))
+        self.conn.commit()
+
+        # csvファイルとの差分を反映（id: 1, 2は削除、12は更新、13, 14は登録）
+        csv_to_db.load(
+            self.conn,
+            mode='sync',
+            sync_chunk_size=sync_chunk_size,
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 大文字小文字、末尾の空白だけの変更も反映する（照合順序ではなくバイト列で比較する）
+    def test_load_success_sync_case(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        with self.conn.cursor() as cur:
+            cur.execute(TRUNCATE_SQL_EXAMPLE1)
+            for data in TEST_DATA_EXAMPLE1:
+                cur.execute(INSERT_SQL_EXAMPLE1, data)
+            cur.execute("UPDATE example1 SET varchar_col = 'IHI' WHERE id = 11")
+            cur.execute("UPDATE example1 SET varchar_col = 'う,ふ ' WHERE id = 12")
+        self.conn.commit()
+
+        report = csv_to_db.load(
+            self.conn,
+            mode='sync',
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+        self.assertEqual(report['example1'].rows_updated, 2)
+
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+        # 反映した後は差分がない
+        report = csv_to_db.load(
+            self.conn,
+            mode='sync',
+            example1=TEST_FILE_EXAMPLE1)
+        self.assertEqual(report['example1'].statement_count, 0)
+
+    # 差分だけを反映する場合はTRUNCATEしないので、ロールバックすると元に戻る
+    def test_load_sync_rollback(self):
+        expected = INITIAL_DATA_EXAMPLE1
+
+        self.conn.begin()
+        csv_to_db.load(
+            self.conn,
+            mode='sync',
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.rollback()
+
+        # 元に戻っていることを確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # LOAD DATA LOCAL INFILE で登録する場合
+    @parameterized.expand([
+        param(filepath=TEST_FILE_EXAMPLE1, expected=TEST_DATA_EXAMPLE1),
+        param(filepath=TEST_FILE_EXAMPLE1_TSV, expected=TEST_DATA_EXAMPLE1_TSV),
+    ])
+    def test_load_success_local_infile(self, filepath, expected):
+        conn = database_connection.get_connection(local_infile=True)
+        try:
+            # csvファイル内容で初期化
+            csv_to_db.load(
+                conn,
+                local_infile=True,
+                example1=filepath)
+            conn.commit()
+        finally:
+            conn.close()
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # LOAD DATA LOCAL INFILE で、csvファイルのデータとテーブル定義が一致しない場合
+    def test_load_error_type_local_infile(self):
+        conn = database_connection.get_connection(local_infile=True)
+        try:
+            # 例外の確認
+            with self.assertRaises(csv_to_db.SQLException):
+                try:
+                    conn.begin()
+                    csv_to_db.load(
+                        conn,
+                        local_infile=True,
+                        # int型の項目に文字列を指定
+                        example1='tests/data/csv_to_db/example1_test_load_csv_error.csv')
+                except Exception as e:
+                    conn.rollback()
+                    raise e
+        finally:
+            conn.close()
+
+    # 接続でLOAD DATA LOCAL INFILEが無効な場合は、通常の登録処理で登録する
+    def test_load_success_local_infile_fallback(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        # self.connはlocal_infile=Falseで接続している
+        csv_to_db.load(
+            self.conn,
+            local_infile=True,
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 複数テーブルを並列で登録する場合
+    def test_load_success_parallel(self):
+        expected_example1 = TEST_DATA_EXAMPLE1
+        expected_example2 = TEST_DATA_EXAMPLE2
+
+        # csvファイル内容で初期化（並列の場合はコミットされる）
+        csv_to_db.load(
+            self.conn,
+            jobs=2,
+            example1=TEST_FILE_EXAMPLE1,
+            example2=TEST_FILE_EXAMPLE2)
+
+        # 別の接続からも登録後の状態が見えることを確認
+        conn = database_connection.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT * FROM example1 ORDER BY id")
+                records_example1 = cur.fetchall()
+                cur.execute("SELECT * FROM example2 ORDER BY id")
+                records_example2 = cur.fetchall()
+        finally:
+            conn.close()
+
+        # 件数の確認
+        self.assertEqual(len(records_example1), len(expected_example1))
+        self.assertEqual(len(records_example2), len(expected_example2))
+        # データの確認
+        for i, expected_row in enumerate(expected_example1):
+            with self.subTest(i=i):
+                self.assertDictEqual(records_example1[i], expected_row)
+        for i, expected_row in enumerate(expected_example2):
+            with self.subTest(i=i):
+                self.assertDictEqual(records_example2[i], expected_row)
+
+    # 複数テーブルを並列で登録する場合で、1テーブルの登録に失敗した場合
+    def test_load_error_parallel(self):
+        # 例外の確認
+        with self.assertRaises(csv_to_db.SQLException):
+            csv_to_db.load(
+                self.conn,
+                jobs=2,
+                # int型の項目に文字列を指定
+                example1='tests/data/csv_to_db/example1_test_load_csv_error.csv',
+                example2=TEST_FILE_EXAMPLE2)
+
+        # 成功したテーブルもロールバックされていることを確認（TRUNCATEは戻らないので0件になる）
+        sql = "SELECT * FROM example2 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), 0)
+
     # tsvファイル（タブ区切り）で初期化
     def test_load_success_tsv(self):
         expected = TEST_DATA_EXAMPLE1_TSV
@@ -314,6 +747,259 @@ class Test_csv_to_db(unittest.TestCase):
             with self.subTest(i=i):
                 self.assertDictEqual(records[i], expected_row)
 
+    # 圧縮したファイルで初期化
+    @parameterized.expand([
+        param(filepath=TEST_FILE_EXAMPLE1_GZ, expected=TEST_DATA_EXAMPLE1, batch_size=1),
+        param(filepath=TEST_FILE_EXAMPLE1_BZ2, expected=TEST_DATA_EXAMPLE1, batch_size=100),
+        param(filepath=TEST_FILE_EXAMPLE1_TSV_XZ, expected=TEST_DATA_EXAMPLE1_TSV, batch_size=100),
+    ])
+    def test_load_success_compressed(self, filepath, expected, batch_size):
+        # 圧縮したファイル内容で初期化
+        csv_to_db.load(
+            self.conn,
+            batch_size=batch_size,
+            example1=filepath)
+        self.conn.commit()
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 登録前の確認で不正な値が見つかった場合は、何も更新しない
+    def test_load_error_validate(self):
+        # TRUNCATEもされないので、初期データのまま
+        expected = INITIAL_DATA_EXAMPLE1
+
+        # 例外の確認（ファイルと行番号を含む）
+        with self.assertRaisesRegex(csv_to_db.ValidationError, "example1_test_load_csv_error.csv:2: .*'int_col'") as cm:
+            csv_to_db.load(
+                self.conn,
+                validate=True,
+                # int型の項目に文字列を指定
+                example1='tests/data/csv_to_db/example1_test_load_csv_error.csv',
+                example2=TEST_FILE_EXAMPLE2)
+        self.assertEqual(len(cm.exception.violations), 1)
+
+        # 変わっていないことを確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+
+    # 分割したファイルで初期化
+    @parameterized.expand([
+        param(table_jobs=1),
+        param(table_jobs=2),
+    ])
+    def test_load_success_shard(self, table_jobs):
+        expected = TEST_DATA_EXAMPLE1
+
+        # 分割したファイル内容で初期化（並列の場合はプロセスごとにコミットされる）
+        report = csv_to_db.load(
+            self.conn,
+            batch_size=100,
+            table_jobs=table_jobs,
+            example1=TEST_FILES_EXAMPLE1_SHARD)
+        self.conn.commit()
+
+        # 処理結果はすべてのファイルの合計になる
+        self.assertEqual(report['example1'].rows_inserted, len(expected))
+        self.assertEqual(report['example1'].statement_count, 2)
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 1つのファイルをバイト範囲に分割して、並列で初期化
+    @mock.patch.object(csv_to_db, 'SPLIT_MIN_BYTES', 1)
+    def test_load_success_split(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        report = csv_to_db.load(
+            self.conn,
+            table_jobs=3,
+            example1=TEST_FILE_EXAMPLE1)
+        self.conn.commit()
+
+        # 範囲ごとに登録した結果の合計が、ファイル全体と同じになる
+        self.assertEqual(report['example1'].rows_read, len(expected))
+        self.assertEqual(report['example1'].rows_inserted, len(expected))
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 複数行のINSERT文が失敗した場合は、登録できない行の行番号を含むエラーになる
+    def test_load_error_duplicate_batch(self):
+        # 例外の確認（5行目のidが3行目と重複している）
+        with self.assertRaisesRegex(csv_to_db.SQLException,
+                                    "example1_test_load_csv_duplicate.csv:5\\): .*Duplicate entry"):
+            try:
+                self.conn.begin()
+                csv_to_db.load(
+                    self.conn,
+                    batch_size=100,
+                    example1='tests/data/csv_to_db/example1_test_load_csv_duplicate.csv')
+            except Exception as e:
+                self.conn.rollback()
+                raise e
+
+    # reject_fileを指定した場合は、登録できない行を出力して残りの行を登録する
+    @parameterized.expand([
+        # 重複した行（INSERT文を分けて実行し直して特定する）
+        param(filepath='tests/data/csv_to_db/example1_test_load_csv_duplicate.csv', line=5,
+              rejected='12,dup,1,1,\n', batch_size=100),
+        param(filepath='tests/data/csv_to_db/example1_test_load_csv_duplicate.csv', line=5,
+              rejected='12,dup,1,1,\n', batch_size=1),
+        # 型に合わない値（DBに送る前に特定する）
+        param(filepath='tests/data/csv_to_db/example1_test_load_csv_error.csv', line=2,
+              rejected='11,ihi,ufu,654.321,2018-08-02 11:22:33\n', batch_size=100),
+    ])
+    def test_load_success_reject_file(self, filepath, line, rejected, batch_size):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            reject_file = os.path.join(temp_dir, '{table}.rejected.csv')
+            report = csv_to_db.load(
+                self.conn,
+                batch_size=batch_size,
+                reject_file=reject_file,
+                example1=filepath)
+            self.conn.commit()
+
+            # 登録できない行以外は登録される
+            self.assertEqual(report['example1'].rows_inserted, 4 if line == 5 else 3)
+            self.assertEqual(report['example1'].rows_rejected, 1)
+
+            # 登録できない行は、ヘッダを付けて元のファイルと同じ形式で出力する
+            rejected_file = os.path.join(temp_dir, 'example1.rejected.csv')
+            with open(rejected_file, encoding='utf_8') as f:
+                self.assertEqual(f.read(), 'id,varchar_col,int_col,double_col,datetime_col\n' + rejected)
+            # 行番号と理由はログに出力する
+            with open(rejected_file + '.log', encoding='utf_8') as f:
+                self.assertRegex(f.read(), '^{}:{}: `example1`: .+\n$'.format(filepath, line))
+
+    # 1つのファイルをバイト範囲に分割して登録する場合も、ファイル全体での行番号になる
+    @mock.patch.object(csv_to_db, 'SPLIT_MIN_BYTES', 1)
+    def test_load_success_reject_file_split(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            reject_file = os.path.join(temp_dir, 'rejected.csv')
+            report = csv_to_db.load(
+                self.conn,
+                batch_size=100,
+                table_jobs=3,
+                reject_file=reject_file,
+                example1='tests/data/csv_to_db/example1_test_load_csv_error.csv')
+            self.conn.commit()
+
+            self.assertEqual(report['example1'].rows_rejected, 1)
+            with open(reject_file + '.log', encoding='utf_8') as f:
+                self.assertRegex(f.read(), 'example1_test_load_csv_error.csv:2: ')
+
+    def create_foreign_key_tables(self, temp_dir, child_rows):
+        '''外部キーで参照するテーブル（fk_parent）と参照するテーブル（fk_child）、登録するcsvファイルを作成する'''
+        with self.conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS fk_child")
+            cur.execute("DROP TABLE IF EXISTS fk_parent")
+            cur.execute("CREATE TABLE fk_parent (id INT PRIMARY KEY, name VARCHAR(20))")
+            cur.execute(
+                "CREATE TABLE fk_child (id INT PRIMARY KEY, parent_id INT NOT NULL, "
+                "FOREIGN KEY (parent_id) REFERENCES fk_parent (id))")
+        self.addCleanup(self.drop_foreign_key_tables)
+
+        targets = {}
+        for table, content in [('fk_parent', 'id,name\n1,aha\n2,ihi\n'),
+                               ('fk_child', 'id,parent_id\n' + ''.join(child_rows))]:
+            targets[table] = os.path.join(temp_dir, table + '.csv')
+            with open(targets[table], mode='w', encoding='utf_8') as f:
+                f.write(content)
+        return targets
+
+    def drop_foreign_key_tables(self):
+        self.conn.rollback()
+        with self.conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS fk_child")
+            cur.execute("DROP TABLE IF EXISTS fk_parent")
+
+    # 外部キーの順に、外部キー制約を有効にしたまま登録する場合
+    @parameterized.expand([
+        param(jobs=1),
+        param(jobs=2),
+    ])
+    def test_load_success_foreign_key_order(self, jobs):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            targets = self.create_foreign_key_tables(temp_dir, ['10,2\n', '11,1\n'])
+            # 参照されているテーブルも削除してから登録する
+            self.load_foreign_key_tables(jobs, targets)
+            with mock.patch.object(csv_to_db, '_load_table', wraps=csv_to_db._load_table) as load_table:
+                report = self.load_foreign_key_tables(jobs, targets)
+
+        # 参照されるテーブルから登録する
+        self.assertListEqual([c[1]['table'] for c in load_table.call_args_list], ['fk_parent', 'fk_child'])
+        # 処理結果はテーブル名の順
+        self.assertListEqual(list(report.tables), ['fk_child', 'fk_parent'])
+        self.assertEqual(report['fk_parent'].rows_inserted, 2)
+        self.assertEqual(report['fk_child'].rows_inserted, 2)
+
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT id, parent_id FROM fk_child ORDER BY id")
+            self.assertListEqual(cur.fetchall(), [{'id': 10, 'parent_id': 2}, {'id': 11, 'parent_id': 1}])
+            # 外部キー制約は有効のまま
+            cur.execute("SELECT @@FOREIGN_KEY_CHECKS AS foreign_key_checks")
+            self.assertEqual(cur.fetchone()['foreign_key_checks'], 1)
+
+    def load_foreign_key_tables(self, jobs, targets):
+        report = csv_to_db.load(
+            self.conn,
+            batch_size=100,
+            jobs=jobs,
+            foreign_key_order=True,
+            fk_child=targets['fk_child'],
+            fk_parent=targets['fk_parent'])
+        self.conn.commit()
+        return report
+
+    # 参照先の行がない行はエラーになる
+    @parameterized.expand([
+        param(jobs=1),
+        param(jobs=2),
+    ])
+    def test_load_error_foreign_key_order(self, jobs):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            targets = self.create_foreign_key_tables(temp_dir, ['10,2\n', '11,99\n'])
+            with self.assertRaisesRegex(csv_to_db.SQLException, r'fk_child\.csv:3\)'):
+                csv_to_db.load(
+                    self.conn,
+                    batch_size=100,
+                    jobs=jobs,
+                    foreign_key_order=True,
+                    fk_child=targets['fk_child'],
+                    fk_parent=targets['fk_parent'])
+
     @csv_to_db.setup_load(example1=TEST_FILE_EXAMPLE1)
     def test_setup_load_success(self):
         expected = TEST_DATA_EXAMPLE1
@@ -330,6 +1016,22 @@ class Test_csv_to_db(unittest.TestCase):
             with self.subTest(i=i):
                 self.assertDictEqual(records[i], expected_row)
 
+    @csv_to_db.setup_load(pool=POOL, example1=TEST_FILE_EXAMPLE1)
+    def test_setup_load_success_pool(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        # csvファイルをロードした後の状態を確認
+        sql = "SELECT * FROM example1 ORDER BY id"
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        # 件数の確認
+        self.assertEqual(len(records), len(expected))
+        # データの確認
+        for i, expected_row in enumerate(expected):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
     @csv_to_db.setup_load(
         example1=TEST_FILE_EXAMPLE1,
         example2=TEST_FILE_EXAMPLE2)
@@ -360,6 +1062,336 @@ class Test_csv_to_db(unittest.TestCase):
             with self.subTest(i=i):
                 self.assertDictEqual(records[i], expected)
 
+    # SAVEPOINTまでロールバックして元に戻す場合
+    def test_savepoint_fixture_reset(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        with csv_to_db.SavepointFixture(self.conn, example1=TEST_FILE_EXAMPLE1) as fixture:
+            with mock.patch.object(csv_to_db, 'load', wraps=csv_to_db.load) as load:
+                with self.conn.cursor() as cur:
+                    cur.execute("DELETE FROM example1 WHERE id = 11")
+                fixture.reset()
+                # 登録はやり直さない
+                load.assert_not_called()
+
+            # 元に戻っていることを確認
+            sql = "SELECT * FROM example1 ORDER BY id"
+            with self.conn.cursor() as cur:
+                cur.execute(sql)
+                records = cur.fetchall()
+            # 件数の確認
+            self.assertEqual(len(records), len(expected))
+            # データの確認
+            for i, expected_row in enumerate(expected):
+                with self.subTest(i=i):
+                    self.assertDictEqual(records[i], expected_row)
+
+    # テストでコミットしてSAVEPOINTがなくなった場合
+    def test_savepoint_fixture_reset_after_commit(self):
+        expected = TEST_DATA_EXAMPLE1
+
+        with csv_to_db.SavepointFixture(self.conn, example1=TEST_FILE_EXAMPLE1) as fixture:
+            with self.conn.cursor() as cur:
+                cur.execute("DELETE FROM example1 WHERE id = 11")
+            self.conn.commit()
+            # 登録からやり直す
+            fixture.reset()
+
+            sql = "SELECT * FROM example1 ORDER BY id"
+            with self.conn.cursor() as cur:
+                cur.execute(sql)
+                records = cur.fetchall()
+            # 件数の確認
+            self.assertEqual(len(records), len(expected))
+
+
+class Test_sync(unittest.TestCase):
+    '''
+    差分の反映（DBに接続しない処理）のテストです
+    '''
+
+    # テーブル名が長い場合も、一時テーブルの名前は識別子の最大長を超えない
+    def test_create_sync_table_name(self):
+        self.assertEqual(csv_to_db._create_sync_table_name('example1'), 'csv_to_db_sync_example1')
+        name = csv_to_db._create_sync_table_name('t' * 64)
+        self.assertEqual(len(name), csv_to_db.MAX_IDENTIFIER_LENGTH)
+        self.assertNotEqual(name, csv_to_db._create_sync_table_name('t' * 63 + 'u'))
+
+
+class Test_split(unittest.TestCase):
+    '''
+    ファイルの分割（DBに接続しない処理）のテストです
+    '''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_file(self, filename, content):
+        filepath = os.path.join(self.temp_dir.name, filename)
+        with open(filepath, mode='w', encoding='utf_8', newline='') as f:
+            f.write(content)
+        return filepath
+
+    # 引用符の中の改行では分割しない
+    def test_split_file_quoted_newline(self):
+        rows = ['{},"a\nb ""c""\nd",あ\n'.format(i) for i in range(20)]
+        filepath = self.create_file('example1.csv', 'id,"text\ncol",name\n' + ''.join(rows))
+
+        header, ranges = csv_to_db._split_file(filepath, ',', 4, min_bytes=1)
+
+        self.assertListEqual(header, ['id', 'text\ncol', 'name'])
+        self.assertEqual(len(ranges), 4)
+        # 範囲ごとに読み込んだ行をつなげると、ファイル全体の行と同じになる
+        records = []
+        with open(filepath, mode='rb') as f:
+            for start, end in ranges:
+                records.extend(csv.reader(csv_to_db._read_lines(f, start, end)))
+        self.assertListEqual(records, [[str(i), 'a\nb "c"\nd', 'あ'] for i in range(20)])
+
+    # 値の途中の引用符は引用符で囲んだ値の始まりとして扱わない
+    def test_split_file_unquoted_quote(self):
+        for delimiter in (',', '\t'):
+            with self.subTest(delimiter=delimiter):
+                rows = ['{0}{1}5" pipe{1}"a\nb"\n'.format(i, delimiter) for i in range(20)]
+                header_line = delimiter.join(['id', 'size', 'text']) + '\n'
+                filepath = self.create_file('example1.csv', header_line + ''.join(rows))
+
+                header, ranges = csv_to_db._split_file(filepath, delimiter, 4, min_bytes=1)
+
+                self.assertListEqual(header, ['id', 'size', 'text'])
+                self.assertEqual(len(ranges), 4)
+                records = []
+                with open(filepath, mode='rb') as f:
+                    for start, end in ranges:
+                        records.extend(csv.reader(csv_to_db._read_lines(f, start, end), delimiter=delimiter))
+                self.assertListEqual(records, [[str(i), '5" pipe', 'a\nb'] for i in range(20)])
+
+    # 1つの範囲がmin_bytesより小さくならないように分割する
+    def test_split_file_min_bytes(self):
+        filepath = self.create_file('example1.csv', 'id\n' + ''.join('{}\n'.format(i) for i in range(10)))
+
+        header, ranges = csv_to_db._split_file(filepath, ',', 4, min_bytes=1024)
+
+        self.assertListEqual(header, ['id'])
+        self.assertListEqual(ranges, [(3, os.path.getsize(filepath))])
+
+    # 分割したファイルはテーブルごとに連番の順のリストにする
+    def test_find_targets_parts(self):
+        self.create_file('example1.part-0010.csv', 'id\n')
+        self.create_file('example1.part-0002.csv', 'id\n')
+        self.create_file('example2.tsv', 'id\n')
+
+        targets = csv_to_db._find_targets(self.temp_dir.name)
+
+        self.assertListEqual(sorted(targets.keys()), ['example1', 'example2'])
+        self.assertListEqual([os.path.basename(path) for path in targets['example1']],
+                             ['example1.part-0002.csv', 'example1.part-0010.csv'])
+        self.assertEqual(os.path.basename(targets['example2']), 'example2.tsv')
+
+
+class Test_validate(unittest.TestCase):
+    '''
+    登録前の確認（DBに接続しない処理）のテストです
+    '''
+
+    COLUMNS = {
+        'id': Column('id', 'int', nullable=False),
+        'varchar_col': Column('varchar_col', 'varchar', max_length=3),
+        'int_col': Column('int_col', 'int'),
+        'datetime_col': Column('datetime_col', 'datetime'),
+    }
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def validate(self, content):
+        filepath = os.path.join(self.temp_dir.name, 'example1.csv')
+        with open(filepath, mode='w', encoding='utf_8', newline='') as f:
+            f.write(content)
+        violations = csv_to_db._validate_file('example1', filepath, ',', self.COLUMNS)
+        return [(violation.line, violation.column) for violation in violations]
+
+    # 不正な値がない場合
+    def test_validate_file_success(self):
+        content = (
+            'id,varchar_col,int_col,datetime_col\n'
+            '1,ihi,2147483647,2018-08-02 11:22:33\n'
+            '2,"a\nb",,2018-08-03\n'
+            '3,-,-1,\n')
+        self.assertListEqual(self.validate(content), [])
+
+    # 不正な値はすべて、行番号の順に返す
+    def test_validate_file_error(self):
+        content = (
+            'id,varchar_col,int_col,datetime_col\n'
+            '1,ihih,2147483648,2018/08/02\n'
+            '2,"a\nb",1\n'
+            ',ufu,ufu,2018-08-03\n')
+        self.assertListEqual(self.validate(content), [
+            (2, 'varchar_col'),
+            (2, 'int_col'),
+            (2, 'datetime_col'),
+            # 値に改行を含む行は、行の始まりの行番号
+            (3, None),
+            (5, 'id'),
+            (5, 'int_col'),
+        ])
+
+    # テーブルにない項目
+    def test_validate_file_unknown_column(self):
+        content = 'id,ufu\n1,ihi\n'
+        self.assertListEqual(self.validate(content), [(1, 'ufu')])
+
+
+class _FakeConnection:
+    encoding = 'utf8'
+
+    def escape(self, value):
+        return pymysql.converters.escape_item(value, 'utf8')
+
+
+class _FakeCursor:
+    '''marker を含むINSERT文をerrorにするカーソル（省略した場合は一意制約違反）'''
+
+    def __init__(self, marker, error=None):
+        self.connection = _FakeConnection()
+        self.marker = marker
+        self.error = error or pymysql.err.IntegrityError(1062, "Duplicate entry")
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def execute(self, statement):
+        self.statements.append(bytes(statement))
+        if self.marker in statement:
+            raise self.error
+        return statement.count(b'),(') + 1
+
+
+class Test_reject(unittest.TestCase):
+    '''
+    登録できない行の特定（DBに接続しない処理）のテストです
+    '''
+
+    SQL = "INSERT INTO example1 (id, varchar_col) VALUES (%s, %s)"
+
+    def insert_many(self, values, max_stmt_length, stop_on_failure=False, error=None):
+        cur = _FakeCursor(b"'ng'", error)
+        conn = mock.Mock()
+        conn.cursor.return_value = cur
+        rows = csv_to_db.ColumnBatch([list(range(len(values))), values], len(values))
+        failures = []
+        result = csv_to_db._insert_many(conn, 'example1', self.SQL, rows, max_stmt_length,
+                                        failures=failures, stop_on_failure=stop_on_failure)
+        return result, failures, cur.statements
+
+    # 失敗した文を半分ずつに分けて、登録できない行だけを特定する
+    def test_insert_many_bisect(self):
+        values = ['ok'] * 64
+        values[5] = values[40] = 'ng'
+        (rowcount, statement_count), failures, statements = self.insert_many(values, 100000)
+        self.assertEqual(rowcount, 62)
+        self.assertListEqual([index for index, _ in failures], [5, 40])
+        self.assertEqual(statement_count, len(statements))
+        # 1行ずつ実行し直すよりも少ない
+        self.assertLess(statement_count, 1 + len(values))
+
+    # 値のエラーは、pymysqlの例外クラスではなくエラーコードで判定する
+    def test_insert_many_bisect_error_code(self):
+        values = ['ok', 'ng', 'ok', 'ok']
+        # 1292（Incorrect datetime value）はOperationalErrorになる
+        error = pymysql.err.OperationalError(1292, "Incorrect datetime value")
+        (rowcount, _), failures, _ = self.insert_many(values, 100000, error=error)
+        self.assertEqual(rowcount, 3)
+        self.assertListEqual(failures, [(1, "Incorrect datetime value")])
+
+    # 値のエラー以外は、行を特定せずにエラーにする
+    def test_insert_many_error_not_row_error(self):
+        error = pymysql.err.ProgrammingError(1146, "Table 'example1' doesn't exist")
+        with self.assertRaisesRegex(csv_to_db.SQLException, "doesn't exist"):
+            self.insert_many(['ng', 'ok'], 100000, error=error)
+
+    # stop_on_failure=Trueの場合は、登録できない行が見つかった文で終了する
+    def test_insert_many_stop_on_failure(self):
+        values = ['ng', 'ok', 'ng', 'ok']
+        (rowcount, _), failures, _ = self.insert_many(values, None, stop_on_failure=True)
+        self.assertEqual(rowcount, 0)
+        self.assertListEqual(failures, [(0, "Duplicate entry")])
+
+    # 変換できない行は除いて、ColumnBatch.invalidに入れる
+    def test_convert_rows_reject(self):
+        rows = [['1', 'a'], ['x', 'b'], ['3'], ['4', 'd']]
+        converters = [lambda values: [int(value) for value in values], list]
+        batch = csv_to_db._convert_rows(rows, table='example1', converters=converters, reject=True)
+        self.assertListEqual(list(batch.rows()), [(1, 'a'), (4, 'd')])
+        self.assertListEqual([batch.index(i) for i in range(len(batch))], [0, 3])
+        self.assertListEqual([index for index, _, _ in batch.invalid], [1, 2])
+        self.assertEqual(batch.read_count, 4)
+
+    # 読み込んだ行の位置を、ファイル（バイト範囲）の行番号に変換する
+    def test_find_lines(self):
+        content = 'id,varchar_col\n1,"a\nb"\n2,c\n3,d\n'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, 'example1.csv')
+            with open(filepath, mode='w', encoding='utf_8', newline='') as f:
+                f.write(content)
+            self.assertDictEqual(csv_to_db._find_lines(filepath, ',', [0, 2]), {0: 2, 2: 5})
+            # 3行目（2,c）から始まるバイト範囲
+            start = len(content.encode('utf_8')) - len('2,c\n3,d\n')
+            self.assertDictEqual(
+                csv_to_db._find_lines(filepath, ',', [1], byte_range=(start, len(content))), {1: 5})
+
+
+class Test_foreign_key_order(unittest.TestCase):
+    '''
+    外部キーの順での登録（DBに接続しない処理）のテストです
+    '''
+
+    # 参照されるテーブルが先の段階になり、同じ段階のテーブルはテーブル名の順になる
+    def test_create_waves(self):
+        foreign_keys = {
+            'order_item': {'order', 'item'},
+            'order': {'user'},
+            'item': {'category'},
+            # 登録しないテーブルへの参照、自分自身への参照は無視する
+            'user': {'company', 'user'},
+        }
+        waves = csv_to_db._create_waves(['category', 'item', 'order', 'order_item', 'user'], foreign_keys)
+        self.assertListEqual(waves, [['category', 'user'], ['item', 'order'], ['order_item']])
+
+    # 外部キーがない場合は、すべてのテーブルが1つの段階になる
+    def test_create_waves_no_foreign_keys(self):
+        self.assertListEqual(csv_to_db._create_waves(['example1', 'example2'], {}), [['example1', 'example2']])
+
+    # 外部キーが循環している場合
+    def test_create_waves_error_cycle(self):
+        foreign_keys = {'a': {'b'}, 'b': {'c'}, 'c': {'a'}, 'd': {'a'}}
+        with self.assertRaisesRegex(ValueError, "cycle: a, b, c, d"):
+            csv_to_db._create_waves(['a', 'b', 'c', 'd', 'e'], foreign_keys)
+
+    def test_get_foreign_keys(self):
+        conn = mock.MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = [
+            {'table_name': 'order', 'referenced_table_name': 'user'},
+            {'table_name': 'order_item', 'referenced_table_name': 'order'},
+            {'table_name': 'order_item', 'referenced_table_name': 'item'},
+        ]
+        self.assertDictEqual(csv_to_db._get_foreign_keys(conn), {
+            'order': {'user'},
+            'order_item': {'order', 'item'},
+        })
+
 
 def main():
     unittest.main()
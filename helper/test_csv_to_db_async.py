@@ -0,0 +1,134 @@
+from app import database_connection
+from helper import csv_to_db, csv_to_db_async
+from helper.test_csv_to_db import (
+    TEST_DATA_EXAMPLE1, TEST_DATA_EXAMPLE2, TEST_FILE_EXAMPLE1, TEST_FILE_EXAMPLE2)
+from helper.load_report import TableReport
+import asyncio
+import threading
+import unittest
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@unittest.skipIf(csv_to_db_async.aiomysql is None, "aiomysql is not installed")
+class Test_csv_to_db_async(unittest.TestCase):
+    '''
+    helper.csv_to_db_async のテストです
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = database_connection.get_connection()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def setUp(self):
+        self.conn.rollback()
+
+    def select_all(self, table):
+        sql = "SELECT * FROM {} ORDER BY id".format(table)
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            records = cur.fetchall()
+        self.conn.commit()
+        return records
+
+    def test_load_async_success(self):
+        async def load():
+            conn = await csv_to_db_async.get_connection()
+            try:
+                report = await csv_to_db_async.load_async(
+                    conn,
+                    batch_size=3,
+                    example1=TEST_FILE_EXAMPLE1)
+                await conn.commit()
+                return report
+            finally:
+                conn.close()
+
+        report = run(load())
+        self.assertEqual(report['example1'].rows_inserted, len(TEST_DATA_EXAMPLE1))
+        # 3行ずつ登録するので、4行のファイルは2回に分かれる
+        self.assertEqual(report['example1'].statement_count, 2)
+
+        records = self.select_all('example1')
+        # 件数の確認
+        self.assertEqual(len(records), len(TEST_DATA_EXAMPLE1))
+        # データの確認
+        for i, expected_row in enumerate(TEST_DATA_EXAMPLE1):
+            with self.subTest(i=i):
+                self.assertDictEqual(records[i], expected_row)
+
+    # 複数テーブルを並行して登録する場合
+    def test_load_async_success_parallel(self):
+        async def load():
+            conn = await csv_to_db_async.get_connection()
+            try:
+                return await csv_to_db_async.load_async(
+                    conn,
+                    batch_size=100,
+                    jobs=2,
+                    example1=TEST_FILE_EXAMPLE1,
+                    example2=TEST_FILE_EXAMPLE2)
+            finally:
+                conn.close()
+
+        run(load())
+
+        # 並行して登録した場合はコミットされている
+        self.assertEqual(len(self.select_all('example1')), len(TEST_DATA_EXAMPLE1))
+        self.assertEqual(len(self.select_all('example2')), len(TEST_DATA_EXAMPLE2))
+
+    def test_load_async_error_type(self):
+        async def load():
+            conn = await csv_to_db_async.get_connection()
+            try:
+                await csv_to_db_async.load_async(
+                    conn,
+                    batch_size=100,
+                    # int型の項目に文字列を指定
+                    example1='tests/data/csv_to_db/example1_test_load_csv_error.csv')
+            finally:
+                await conn.rollback()
+                conn.close()
+
+        # 例外の確認
+        with self.assertRaises(csv_to_db.SQLException):
+            run(load())
+
+
+class Test_read_batches(unittest.TestCase):
+    '''
+    ファイルの読み込み（DBに接続しない処理）のテストです
+    '''
+
+    # パースと変換は、イベントループのスレッドではなくexecutorのスレッドで行う
+    def test_read_batches_executor(self):
+        threads = set()
+
+        def convert(rows):
+            threads.add(threading.get_ident())
+            return csv_to_db._convert_rows(rows)
+
+        async def read():
+            batches = asyncio.Queue()
+            csv_reader = iter([['1', 'a'], ['2', '-'], ['3', '']])
+            await csv_to_db_async._read_batches(csv_reader, 2, None, convert, batches, TableReport('example1'))
+            results = []
+            while not batches.empty():
+                results.append(batches.get_nowait())
+            return results
+
+        results = run(read())
+        self.assertListEqual([list(rows.rows()) for rows in results[:-1]],
+                             [[('1', 'a'), ('2', '')], [('3', None)]])
+        self.assertIsNone(results[-1])
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from app import database_connection
+from helper import csv_to_db, db_to_csv
+from helper.test_csv_to_db import (
+    TEST_DATA_EXAMPLE1, TEST_DATA_EXAMPLE2, TEST_FILE_EXAMPLE1, TEST_FILE_EXAMPLE2)
+from parameterized import parameterized, param
+import os
+import tempfile
+import unittest
+
+
+class Test_db_to_csv(unittest.TestCase):
+    '''
+    helper.db_to_csv のテストです
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = database_connection.get_connection()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def setUp(self):
+        csv_to_db.load(
+            self.conn,
+            example1=TEST_FILE_EXAMPLE1,
+            example2=TEST_FILE_EXAMPLE2)
+        self.conn.commit()
+
+    # 出力したファイルをload()で登録すると、元のデータと同じになる
+    @parameterized.expand([
+        param(format='csv', jobs=1),
+        param(format='tsv', jobs=1),
+        param(format='csv.gz', jobs=2),
+    ])
+    def test_dump_dir_success(self, format, jobs):
+        with tempfile.TemporaryDirectory() as output_dir:
+            counts = db_to_csv.dump_dir(self.conn, output_dir, ['example1', 'example2'],
+                                        format=format, jobs=jobs)
+            self.assertDictEqual(counts, {'example1': len(TEST_DATA_EXAMPLE1),
+                                          'example2': len(TEST_DATA_EXAMPLE2)})
+
+            # 出力したファイルで初期化
+            csv_to_db.init_db(self.conn, output_dir)
+            self.conn.commit()
+
+        for table, expected in (('example1', TEST_DATA_EXAMPLE1), ('example2', TEST_DATA_EXAMPLE2)):
+            sql = "SELECT * FROM {} ORDER BY id".format(table)
+            with self.conn.cursor() as cur:
+                cur.execute(sql)
+                records = cur.fetchall()
+            # 件数の確認
+            self.assertEqual(len(records), len(expected))
+            # データの確認
+            for i, expected_row in enumerate(expected):
+                with self.subTest(table=table, i=i):
+                    self.assertDictEqual(records[i], expected_row)
+
+    def test_dump_success_format(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            filepath = os.path.join(output_dir, 'example1.csv')
+            db_to_csv.dump(self.conn, example1=filepath)
+            with open(filepath, mode='r', encoding='utf_8') as f:
+                lines = f.read().splitlines()
+
+        # NULLは値なし、空文字列は「-」、区切り文字を含む値は「"」で囲む
+        expected = [
+            'id,varchar_col,int_col,double_col,datetime_col',
+            '11,ihi,987654321,654.321,2018-08-02 11:22:33',
+            '12,"う,ふ",-1234567890,-123.456,2018-08-03 00:00:00',
+            '13,,,,',
+            '14,-,0,0.0,',
+        ]
+        self.assertListEqual(lines, expected)
+
+    # 「-」の文字列は出力できないため、ファイルを作成する前にエラーになる
+    def test_dump_error_hyphen(self):
+        with self.conn.cursor() as cur:
+            cur.execute("UPDATE example1 SET varchar_col = '-' WHERE id = 13")
+        self.conn.commit()
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            filepath = os.path.join(output_dir, 'example1.csv')
+            with self.assertRaisesRegex(ValueError, "Value '-' can not be dumped: example1"):
+                db_to_csv.dump(self.conn, example1=filepath)
+            self.assertFalse(os.path.exists(filepath))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+from helper import load_report
+import os
+import tempfile
+import unittest
+
+
+def create_report():
+    report = load_report.LoadReport()
+
+    table_report = load_report.TableReport('example1')
+    table_report.rows_read = 4
+    table_report.rows_inserted = 4
+    table_report.bytes_parsed = 154
+    table_report.parse_time = 0.25
+    table_report.statement_count = 1
+    report.add(table_report)
+
+    table_report = load_report.TableReport('example2')
+    table_report.skipped = True
+    report.add(table_report)
+
+    report.elapsed_time = 1.5
+    report.finished_at = 1500000000
+    return report
+
+
+class Test_load_report(unittest.TestCase):
+    '''
+    helper.load_report のテストです
+    '''
+
+    def test_load_report_total(self):
+        report = create_report()
+
+        self.assertEqual(report.rows_read, 4)
+        self.assertEqual(report.rows_inserted, 4)
+        self.assertEqual(report['example1'].bytes_parsed, 154)
+        self.assertListEqual([table_report.table for table_report in report], ['example1', 'example2'])
+
+    def test_table_report_merge(self):
+        table_report = load_report.TableReport('example1')
+        table_report.rows_read = 2
+        table_report.parse_time = 0.5
+        other = create_report()['example1']
+
+        table_report.merge(other)
+
+        self.assertEqual(table_report.rows_read, 6)
+        self.assertEqual(table_report.rows_inserted, 4)
+        self.assertEqual(table_report.statement_count, 1)
+        self.assertAlmostEqual(table_report.parse_time, 0.75)
+        self.assertFalse(table_report.skipped)
+
+    def test_to_dict(self):
+        report = create_report()
+
+        actual = report.to_dict()
+        self.assertEqual(actual['elapsed_time'], 1.5)
+        self.assertEqual(actual['tables']['example1']['rows_inserted'], 4)
+        self.assertEqual(actual['tables']['example2']['skipped'], True)
+
+    def test_to_openmetrics(self):
+        report = create_report()
+
+        lines = load_report.to_openmetrics(report).splitlines()
+        # メトリクスの確認
+        self.assertIn('# TYPE csv_to_db_rows_inserted gauge', lines)
+        self.assertIn('csv_to_db_rows_inserted{table="example1"} 4', lines)
+        self.assertIn('csv_to_db_parse_seconds{table="example1"} 0.25', lines)
+        self.assertIn('csv_to_db_skipped{table="example1"} 0', lines)
+        self.assertIn('csv_to_db_skipped{table="example2"} 1', lines)
+        self.assertIn('csv_to_db_load_seconds 1.5', lines)
+        self.assertIn('csv_to_db_last_load_timestamp_seconds 1500000000', lines)
+        # 最後の行の確認
+        self.assertEqual(lines[-1], '# EOF')
+
+    def test_to_openmetrics_escape(self):
+        report = load_report.LoadReport()
+        report.add(load_report.TableReport('a"b\\c'))
+
+        lines = load_report.to_openmetrics(report, prefix='test').splitlines()
+        self.assertIn('test_rows_read{table="a\\"b\\\\c"} 0', lines)
+
+    def test_write_textfile(self):
+        report = create_report()
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, 'csv_to_db.prom')
+            load_report.write_textfile(report, filepath)
+
+            with open(filepath, mode='r', encoding='utf_8') as f:
+                self.assertEqual(f.read(), load_report.to_openmetrics(report))
+            # 一時ファイルが残っていないことを確認
+            self.assertListEqual(os.listdir(tempdir), ['csv_to_db.prom'])
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+from datetime import datetime
+from decimal import Decimal
+from helper import table_schema
+from helper.table_schema import Column
+from parameterized import parameterized, param
+import unittest
+
+
+class Test_table_schema(unittest.TestCase):
+    '''
+    helper.table_schema のテストです
+    '''
+
+    @parameterized.expand([
+        # 空文字列はNULL、「-」は空文字列
+        param(column=Column('c', 'varchar', max_length=10), value='', expected=None),
+        param(column=Column('c', 'varchar', max_length=10), value='-', expected=''),
+        param(column=Column('c', 'varchar', max_length=10), value='う,ふ', expected='う,ふ'),
+        param(column=Column('c', 'int'), value='', expected=None),
+        param(column=Column('c', 'int'), value='-1234567890', expected=-1234567890),
+        # 小数はMySQLと同じように四捨五入する
+        param(column=Column('c', 'int'), value='1.5', expected=2),
+        param(column=Column('c', 'int', unsigned=True), value='4294967295', expected=4294967295),
+        param(column=Column('c', 'decimal', precision=5, scale=2), value='-123.45',
+              expected=Decimal('-123.45')),
+        param(column=Column('c', 'double', precision=6, scale=3), value='654.321', expected=654.321),
+        param(column=Column('c', 'double'), value='1e100', expected=1e100),
+        # 時間部分は省略可能
+        param(column=Column('c', 'datetime'), value='2018-08-03', expected=datetime(2018, 8, 3)),
+        param(column=Column('c', 'datetime'), value='2018-08-02 11:22:33',
+              expected=datetime(2018, 8, 2, 11, 22, 33)),
+        param(column=Column('c', 'date'), value='2018-08-03', expected=datetime(2018, 8, 3).date()),
+        # テーブル定義がない場合や、対象外の型はそのまま
+        param(column=None, value='ufu', expected='ufu'),
+        param(column=Column('c', 'text'), value='-', expected=''),
+    ])
+    def test_create_converter_success(self, column, value, expected):
+        convert = table_schema.create_converter(column)
+        self.assertEqual(convert(value), expected)
+
+    @parameterized.expand([
+        param(column=Column('c', 'int'), value='ufu'),
+        param(column=Column('c', 'int'), value='-'),
+        param(column=Column('c', 'int'), value='2147483648'),
+        param(column=Column('c', 'tinyint', unsigned=True), value='-1'),
+        param(column=Column('c', 'decimal', precision=5, scale=2), value='1000'),
+        param(column=Column('c', 'decimal', precision=5, scale=2), value='abc'),
+        param(column=Column('c', 'double', precision=6, scale=3), value='1000'),
+        param(column=Column('c', 'double'), value='nan'),
+        # MySQLで登録できない形式（「_」、前後の空白、全角数字）
+        param(column=Column('c', 'int'), value='1_000'),
+        param(column=Column('c', 'int'), value=' 1'),
+        param(column=Column('c', 'int'), value='１２'),
+        param(column=Column('c', 'int'), value='1.5\n'),
+        param(column=Column('c', 'decimal', precision=5, scale=2), value='1_0'),
+        param(column=Column('c', 'decimal', precision=5, scale=2), value='Infinity'),
+        param(column=Column('c', 'double'), value='1.5 '),
+        param(column=Column('c', 'double'), value='１.５'),
+        param(column=Column('c', 'datetime'), value='2018/08/03'),
+        param(column=Column('c', 'datetime'), value='2018-02-30'),
+        param(column=Column('c', 'date'), value='2018-08-03 11:22:33'),
+        param(column=Column('c', 'varchar', max_length=3), value='ihih'),
+    ])
+    def test_create_converter_error(self, column, value):
+        convert = table_schema.create_converter(column)
+        with self.assertRaisesRegex(ValueError, "'c'"):
+            convert(value)
+
+    # 1項目分の値をまとめて変換した結果は、1つずつ変換した結果と同じ
+    @parameterized.expand([
+        param(column=Column('c', 'int'), values=('1', '', '-1234567890', '+7')),
+        param(column=Column('c', 'int'), values=('1', '1.5', '')),
+        param(column=Column('c', 'bigint', unsigned=True), values=('18446744073709551615', '')),
+        param(column=Column('c', 'double', precision=6, scale=3), values=('654.321', '', '-1e2')),
+        param(column=Column('c', 'double'), values=('1e308', '1e308', '')),
+        param(column=Column('c', 'varchar', max_length=10), values=('ufu', '', '-')),
+        param(column=None, values=('ufu', '', '-')),
+    ])
+    def test_create_column_converter_success(self, column, values):
+        expected = [table_schema.create_converter(column)(value) for value in values]
+        convert = table_schema.create_column_converter(column)
+        self.assertListEqual(convert(values), expected)
+
+    @parameterized.expand([
+        param(column=Column('c', 'int'), values=('1', 'ufu'), message="'ufu'"),
+        param(column=Column('c', 'int'), values=('1', '2147483648'), message="Out of range value: '2147483648'"),
+        param(column=Column('c', 'double'), values=('1', 'nan'), message="'nan'"),
+        param(column=Column('c', 'int'), values=('1', '1_000'), message="'1_000'"),
+        param(column=Column('c', 'int'), values=('１２', ''), message="'１２'"),
+        param(column=Column('c', 'double'), values=(' 1', '2'), message="' 1'"),
+        # 「,」を含む値は、1つの値として確認する
+        param(column=Column('c', 'int'), values=('1,2', '3'), message="Incorrect integer value: '1,2'"),
+        param(column=Column('c', 'double'), values=('1', '2,5'), message="Incorrect double value: '2,5'"),
+        param(column=Column('c', 'double', precision=6, scale=3), values=('1000', ''), message="'1000'"),
+        param(column=Column('c', 'varchar', max_length=3), values=('-', 'ihih'), message="'ihih'"),
+    ])
+    def test_create_column_converter_error(self, column, values, message):
+        convert = table_schema.create_column_converter(column)
+        with self.assertRaisesRegex(ValueError, message):
+            convert(values)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+from app import database_connection
+from helper import worker_schema
+import os
+import shutil
+import tempfile
+import unittest
+
+
+# テンプレートに登録するcsvファイル（4件）
+TEST_FILE_EXAMPLE1 = "tests/data/csv_to_db/example1_test_load_csv.csv"
+# テストで使うテンプレートのデータベース
+TEMPLATE = 'sandbox_test_template'
+
+
+class Test_worker_schema(unittest.TestCase):
+    '''
+    helper.worker_schema のテストです
+    '''
+
+    def tearDown(self):
+        worker_schema.drop_worker_databases(2, template=TEMPLATE)
+
+    def test_setup_worker_databases(self):
+        with tempfile.TemporaryDirectory() as csv_dir:
+            shutil.copy(TEST_FILE_EXAMPLE1, os.path.join(csv_dir, 'example1.csv'))
+            targets = worker_schema.setup_worker_databases(csv_dir, 2, template=TEMPLATE)
+
+        self.assertListEqual(targets, ['sandbox_w0', 'sandbox_w1'])
+        # ワーカーごとのデータベースに、csvファイルの内容がコピーされていることを確認
+        for target in targets:
+            with self.subTest(target=target):
+                conn = database_connection.get_connection(db=target)
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT id FROM example1 ORDER BY id")
+                        records = cur.fetchall()
+                finally:
+                    conn.close()
+                self.assertListEqual([record['id'] for record in records], [11, 12, 13, 14])
+
+    # 生成列のあるテーブルも、生成列以外の項目をコピーする
+    def test_clone_database_generated_column(self):
+        source, target = 'sandbox_test_source', 'sandbox_test_target'
+        conn = database_connection.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DROP DATABASE IF EXISTS {}".format(source))
+                cur.execute("CREATE DATABASE {}".format(source))
+                self.addCleanup(self.drop_databases, source, target)
+                cur.execute(
+                    "CREATE TABLE {}.example3 (id INT PRIMARY KEY, "
+                    "doubled INT AS (id * 2) VIRTUAL, name VARCHAR(10))".format(source))
+                cur.execute("INSERT INTO {}.example3 (id, name) VALUES (1, 'aha'), (2, 'ihi')".format(source))
+            conn.commit()
+        finally:
+            conn.close()
+
+        worker_schema.clone_database(source, target)
+
+        conn = database_connection.get_connection(db=target)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, doubled, name FROM example3 ORDER BY id")
+                records = cur.fetchall()
+        finally:
+            conn.close()
+        self.assertListEqual(records, [{'id': 1, 'doubled': 2, 'name': 'aha'}, {'id': 2, 'doubled': 4, 'name': 'ihi'}])
+
+    def drop_databases(self, *databases):
+        conn = database_connection.get_connection()
+        try:
+            with conn.cursor() as cur:
+                for database in databases:
+                    cur.execute("DROP DATABASE IF EXISTS {}".format(database))
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+テストを複数プロセスで並列に実行するための、ワーカーごとのデータベース（スキーマ）を作成します.
+
+csvファイルはテンプレートのデータベースに1回だけ登録し（init_db）、
+ワーカーごとのデータベース（sandbox_w0, sandbox_w1, ...）にはサーバ内でコピーします
+そのため、ワーカーの数に関係なくcsvファイルの読み込みは1回だけになります
+
+各ワーカーのプロセスで環境変数 MYSQL_WORKER_ID を指定すると、
+database_connection.get_connection() はワーカーのデータベースに接続します
+
+使用例）
+    python -m helper.worker_schema path/to/csv_dir --workers 4
+    MYSQL_WORKER_ID=0 python -m unittest ...
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from app import database_connection
+from helper import csv_to_db
+
+logger = getLogger(__name__)
+
+
+def setup_worker_databases(csv_dir, workers: int, template: str=None, jobs: int=None, **init_db_options):
+    """
+    テンプレートのデータベースにcsvファイルを登録し、ワーカーごとのデータベースにコピーします.
+
+    Args:
+        csv_dir:
+            登録するcsvファイルのディレクトリ
+        workers (int):
+            ワーカーの数
+        template (str, optional):
+            Defaults to None.
+            テンプレートのデータベース名。Noneの場合は「{データベース名}_template」
+        jobs (int, optional):
+            Defaults to None.
+            同時にコピーするデータベースの数。Noneの場合はworkersと同じ
+        init_db_options:
+            csv_to_db.init_db() に渡す引数
+
+    Returns:
+        list: ワーカーごとのデータベース名のリスト
+    """
+    database = database_connection.get_base_database()
+    template = template or '{}_template'.format(database)
+    targets = [database_connection.get_worker_database(database, i) for i in range(workers)]
+
+    # テンプレートは元のデータベースのテーブル定義で作成し、csvファイルを登録する
+    clone_database(database, template, with_data=False)
+    conn = database_connection.get_connection(db=template)
+    try:
+        conn.begin()
+        csv_to_db.init_db(conn, csv_dir, **init_db_options)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
+
+    # ワーカーごとのデータベースへのコピーは、サーバ内で並列に行う
+    with ThreadPoolExecutor(max_workers=jobs or workers) as executor:
+        for future in [executor.submit(clone_database, template, target) for target in targets]:
+            future.result()
+    return targets
+
+
+def clone_database(source: str, target: str, with_data: bool=True):
+    """
+    データベースを作成し直して、別のデータベースのテーブル（とデータ）をコピーします.
+
+    テーブル定義は SHOW CREATE TABLE をコピー先で実行して作成するため、外部キーもコピーします
+    データは INSERT ... SELECT でコピーするため、サーバの外には出ません
+    （生成列は値を指定できないため、生成列以外の項目を指定してコピーします）
+
+    Args:
+        source (str): コピー元のデータベース名
+        target (str): コピー先のデータベース名（存在する場合は削除します）
+        with_data (bool, optional):
+            Defaults to True.
+            データもコピーするかどうか
+    """
+    conn = database_connection.get_connection(db=source)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT DEFAULT_CHARACTER_SET_NAME AS charset, DEFAULT_COLLATION_NAME AS collation "
+                "FROM INFORMATION_SCHEMA.SCHEMATA WHERE SCHEMA_NAME = %s", (source, ))
+            schema = cur.fetchone()
+            cur.execute(
+                "SELECT TABLE_NAME AS table_name FROM INFORMATION_SCHEMA.TABLES "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME", (source, ))
+            tables = [row['table_name'] for row in cur.fetchall()]
+            columns = _get_insertable_columns(cur, source)
+
+            cur.execute("DROP DATABASE IF EXISTS {}".format(target))
+            cur.execute("CREATE DATABASE {} CHARACTER SET {} COLLATE {}".format(
+                target, schema['charset'], schema['collation']))
+
+            cur.execute("USE {}".format(target))
+
+            # 外部キーの参照先より先にテーブルを作成・登録できるとは限らないため、外部キーの確認はしない
+            cur.execute("SET foreign_key_checks = 0")
+            try:
+                for table in tables:
+                    cur.execute("SHOW CREATE TABLE {}.{}".format(source, table))
+                    cur.execute(cur.fetchone()['Create Table'])
+                    if with_data:
+                        names = ', '.join('`{}`'.format(column) for column in columns[table])
+                        cur.execute("INSERT INTO {table} ({columns}) SELECT {columns} FROM {source}.{table}".format(
+                            source=source, table=table, columns=names))
+            finally:
+                cur.execute("SET foreign_key_checks = 1")
+        conn.commit()
+        logger.info("CLONE DATABASE: {} -> {} ({} tables)".format(source, target, len(tables)))
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
+
+
+def _get_insertable_columns(cur, database):
+    """データベースのテーブルごとの、生成列（VIRTUAL, STORED）以外の項目名のリスト（定義の順）を返す"""
+    cur.execute(
+        "SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name FROM INFORMATION_SCHEMA.COLUMNS "
+        "WHERE TABLE_SCHEMA = %s AND EXTRA NOT LIKE '%%GENERATED%%' "
+        "ORDER BY TABLE_NAME, ORDINAL_POSITION", (database, ))
+    columns = {}
+    for row in cur.fetchall():
+        columns.setdefault(row['table_name'], []).append(row['column_name'])
+    return columns
+
+
+def drop_worker_databases(workers: int, template: str=None):
+    """setup_worker_databases() で作成したデータベースを削除します"""
+    database = database_connection.get_base_database()
+    template = template or '{}_template'.format(database)
+    conn = database_connection.get_connection(db=database)
+    try:
+        with conn.cursor() as cur:
+            for target in [database_connection.get_worker_database(database, i) for i in range(workers)]:
+                cur.execute("DROP DATABASE IF EXISTS {}".format(target))
+            cur.execute("DROP DATABASE IF EXISTS {}".format(template))
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv_dir', help="登録するcsvファイルのディレクトリ")
+    parser.add_argument('--workers', type=int, required=True)
+    parser.add_argument('--template', help="テンプレートのデータベース名")
+    parser.add_argument('--jobs', type=int, help="同時にコピーするデータベースの数")
+    parser.add_argument('--batch-size', type=int, default=1)
+    args = parser.parse_args()
+
+    targets = setup_worker_databases(args.csv_dir, args.workers, template=args.template, jobs=args.jobs,
+                                     batch_size=args.batch_size)
+    for target in targets:
+        print(target)
+
+
+if __name__ == '__main__':
+    main()
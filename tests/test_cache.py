@@ -0,0 +1,59 @@
+import time
+import unittest
+from app.cache import LRUCache
+
+
+class Test_LRUCache(unittest.TestCase):
+    '''
+    app.cache.LRUCache のテスト
+    '''
+
+    def test_get_success(self):
+        cache = LRUCache(maxsize=2)
+        cache.set(1, 'a')
+        self.assertEqual(cache.get(1), 'a')
+        # ない場合はdefault
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(2, 'b'), 'b')
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_set_maxsize(self):
+        cache = LRUCache(maxsize=2)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        # 1を使ったので、最も使われていないのは2になる
+        cache.get(1)
+        cache.set(3, 'c')
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(1), 'a')
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), 'c')
+
+    def test_get_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=0.01)
+        cache.set(1, 'a')
+        time.sleep(0.02)
+
+        # 有効期限が過ぎた値は削除される
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = LRUCache(maxsize=3)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        cache.set(3, 'c')
+        # ない値を指定してもエラーにならない
+        cache.invalidate(1, 2, 100)
+
+        self.assertIsNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), 'c')
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,6 +26,7 @@ class Test_select_example1_by_id(unittest.TestCase):
         # データ初期化
         csv_to_db.load(
             cls.conn,
+            skip_unchanged=True,
             example1='tests/data/test_example1/example1_test_select_example1_by_id.csv')
         cls.conn.commit()
 
@@ -66,6 +67,124 @@ class Test_select_example1_by_id(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class Test_select_example1_by_ids(unittest.TestCase):
+    '''
+    app.example1.select_example1_by_ids とキャッシュのテスト
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = database_connection.get_connection()
+        # データ初期化（テストごとにSAVEPOINTまでロールバックして元に戻す）
+        cls.fixture = csv_to_db.SavepointFixture(
+            cls.conn,
+            skip_unchanged=True,
+            example1='tests/data/test_example1/example1_test_select_example1_by_id.csv')
+        cls.fixture.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fixture.teardown()
+        cls.conn.close()
+
+    def tearDown(self):
+        example1.disable_cache()
+        self.fixture.reset()
+
+    @parameterized.expand([
+        param(chunk_size=1),
+        param(chunk_size=1000),
+    ])
+    def test_select_example1_by_ids_success(self, chunk_size):
+        # 存在しないid、重複したidは無視される
+        records = example1.select_example1_by_ids(self.conn, [2, 1, 100, 1], chunk_size=chunk_size)
+
+        self.assertListEqual(sorted(records.keys()), [1, 2])
+        self.assertDictEqual(records[1], example1.select_example1_by_id(self.conn, 1))
+        self.assertIsNone(records[2]['varchar_col'])
+
+    def test_select_example1_by_ids_no_data(self):
+        self.assertDictEqual(example1.select_example1_by_ids(self.conn, []), {})
+
+    def test_select_example1_by_id_cache(self):
+        cache = example1.enable_cache(maxsize=10, ttl=60)
+        expected = example1.select_example1_by_id(self.conn, 1)
+
+        # 2回目以降はキャッシュから取得する
+        with self.conn.cursor() as cur:
+            cur.execute("update example1 set varchar_col = 'changed' where id = 1")
+        self.assertDictEqual(example1.select_example1_by_id(self.conn, 1), expected)
+        self.assertDictEqual(example1.select_example1_by_ids(self.conn, [1])[1], expected)
+        self.assertEqual(cache.hits, 2)
+
+        # 削除するとキャッシュも削除される
+        example1.delete_example1_by_id(self.conn, 1)
+        self.assertIsNone(example1.select_example1_by_id(self.conn, 1))
+
+    def test_select_example1_by_id_cache_insert(self):
+        example1.enable_cache(maxsize=10, ttl=60)
+        # キャッシュした行を削除して、同じidで登録し直す
+        example1.select_example1_by_ids(self.conn, [1, 2])
+        example1.delete_example1_by_ids(self.conn, [1])
+        example1.insert_example1_many(self.conn, [(1, 'new', None, None, None)])
+
+        # 登録し直した値を取得する
+        self.assertEqual(example1.select_example1_by_id(self.conn, 1)['varchar_col'], 'new')
+
+    # 文字列のidも、同じ行としてキャッシュする
+    def test_select_example1_by_id_cache_key(self):
+        cache = example1.enable_cache(maxsize=10, ttl=60)
+        example1.select_example1_by_id(self.conn, '1')
+        example1.select_example1_by_id(self.conn, 1)
+        example1.select_example1_by_ids(self.conn, ['1'])
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.hits, 2)
+
+    # コミットしていない登録は、ロールバックされる可能性があるのでキャッシュしない
+    def test_select_example1_by_id_cache_rollback(self):
+        example1.enable_cache(maxsize=10, ttl=60)
+        conn = database_connection.get_connection()
+        try:
+            example1.insert_example1(conn, 100, 'phantom', None, None, None)
+            self.assertEqual(example1.select_example1_by_id(conn, 100)['varchar_col'], 'phantom')
+            conn.rollback()
+        finally:
+            conn.close()
+
+        # 他の接続からは、ロールバックされた行は見えない
+        self.assertIsNone(example1.select_example1_by_id(self.conn, 100))
+
+    # 削除してコミットしていない間に他の接続がキャッシュした行は、削除した接続では使わず、コミット後に削除する
+    def test_select_example1_by_id_cache_other_connection(self):
+        example1.enable_cache(maxsize=10, ttl=60)
+        pool = database_connection.ConnectionPool(maxsize=2)
+        self.addCleanup(pool.close)
+        conn_a = pool.get_connection()
+        conn_b = database_connection.get_connection()
+        self.addCleanup(conn_b.close)
+
+        example1.delete_example1_by_id(conn_a, 2)
+        # 削除をコミットしていないので、他の接続は削除前の行をキャッシュする
+        self.assertIsNotNone(example1.select_example1_by_id(conn_b, 2))
+        conn_b.commit()
+        # 削除した接続は、キャッシュした行ではなく自分の削除を見る
+        self.assertIsNone(example1.select_example1_by_id(conn_a, 2))
+        self.assertIsNone(example1.select_example1_by_ids(conn_a, [2]).get(2))
+
+        conn_a.commit()
+        # 返却しても、次にプールから借りた接続で取得するときに、キャッシュした削除前の行を削除する
+        conn_a.close()
+        conn_a = pool.get_connection()
+        try:
+            self.assertIsNone(example1.select_example1_by_id(conn_a, 2))
+            self.assertIsNone(example1.select_example1_by_id(conn_b, 2))
+        finally:
+            # 削除した行を元に戻す
+            example1.insert_example1(conn_a, 2, None, None, None, None)
+            conn_a.commit()
+            conn_a.close()
+
+
 class Test_select_example1(unittest.TestCase):
     '''
     app.example1.select_example1 のテスト
@@ -83,6 +202,7 @@ class Test_select_example1(unittest.TestCase):
         # データ初期化
         csv_to_db.load(
             self.conn,
+            skip_unchanged=True,
             example1='tests/data/test_example1/example1_test_select_example1.csv')
         self.conn.commit()
 
@@ -235,6 +355,13 @@ class Test_select_example1(unittest.TestCase):
         # データの確認
         self.assertEqual(records[0]['id'], 12)
 
+    # 同じ条件の組み合わせでは、作成済みのSQLを使う
+    def test_select_example1_sql_cache(self):
+        example1.select_example1(self.conn, start=datetime(2018, 1, 1, 0, 0, 0))
+        hits = example1._create_select_example1_sql.cache_info().hits
+        example1.select_example1(self.conn, start=datetime(2018, 1, 2, 0, 0, 0))
+        self.assertEqual(example1._create_select_example1_sql.cache_info().hits, hits + 1)
+
     def test_select_example1_no_data(self):
         records = example1.select_example1(
             self.conn,
@@ -360,28 +487,79 @@ class Test_select_example1(unittest.TestCase):
         self.assertEqual(records[3]['id'], 11)
 
 
-class Test_insert_example1(unittest.TestCase):
+class Test_iter_example1(unittest.TestCase):
     '''
-    app.example1.insert_example1 のテスト
+    app.example1.iter_example1 のテスト
     '''
 
     @classmethod
     def setUpClass(cls):
         cls.conn = database_connection.get_connection()
+        # データ初期化
+        csv_to_db.load(
+            cls.conn,
+            skip_unchanged=True,
+            example1='tests/data/test_example1/example1_test_iter_example1.csv')
+        cls.conn.commit()
 
     @classmethod
     def tearDownClass(cls):
         cls.conn.close()
 
-    def setUp(self):
-        # データ初期化
-        csv_to_db.load(
+    # 同じ日時やNULLの行がページの境目にあっても、重複や漏れなく返すことを確認する
+    @parameterized.expand([
+        param(sort=example1.Sort.id, order=example1.Order.asc, page_size=2,
+              expected=[11, 12, 13, 14, 15, 16]),
+        param(sort=example1.Sort.id, order=example1.Order.desc, page_size=2,
+              expected=[16, 15, 14, 13, 12, 11]),
+        # datetime_colがNULLの行は、昇順の場合は先頭、降順の場合は最後
+        param(sort=example1.Sort.datetime_col, order=example1.Order.asc, page_size=1,
+              expected=[12, 15, 13, 16, 11, 14]),
+        param(sort=example1.Sort.datetime_col, order=example1.Order.asc, page_size=4,
+              expected=[12, 15, 13, 16, 11, 14]),
+        param(sort=example1.Sort.datetime_col, order=example1.Order.desc, page_size=1,
+              expected=[14, 11, 16, 13, 15, 12]),
+        param(sort=example1.Sort.datetime_col, order=example1.Order.desc, page_size=100,
+              expected=[14, 11, 16, 13, 15, 12]),
+    ])
+    def test_iter_example1_sort(self, sort, order, page_size, expected):
+        records = example1.iter_example1(self.conn, sort=sort, order=order, page_size=page_size)
+        actual = [record['id'] for record in records]
+        self.assertListEqual(actual, expected)
+
+    def test_iter_example1_start_end(self):
+        records = example1.iter_example1(
             self.conn,
+            start=datetime(2018, 1, 1, 0, 0, 1),
+            end=datetime(2018, 1, 2, 0, 0, 0),
+            sort=example1.Sort.datetime_col,
+            page_size=1)
+        actual = [record['id'] for record in records]
+        self.assertListEqual(actual, [16, 11, 14])
+
+
+class Test_insert_example1(unittest.TestCase):
+    '''
+    app.example1.insert_example1 のテスト
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = database_connection.get_connection()
+        # データ初期化（テストごとにSAVEPOINTまでロールバックして元に戻す）
+        cls.fixture = csv_to_db.SavepointFixture(
+            cls.conn,
+            skip_unchanged=True,
             example1='tests/data/test_example1/example1_test_insert_example1.csv')
-        self.conn.commit()
+        cls.fixture.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fixture.teardown()
+        cls.conn.close()
 
     def tearDown(self):
-        pass
+        self.fixture.reset()
 
     def test_insert_example1_success(self):
         result = example1.insert_example1(
@@ -405,28 +583,92 @@ class Test_insert_example1(unittest.TestCase):
         self.assertEqual(record['datetime_col'], datetime(2001, 1, 2, 3, 4, 5))
 
 
-class Test_delete_example1_by_id(unittest.TestCase):
+class Test_insert_example1_many(unittest.TestCase):
     '''
-    app.example1.delete_example1_by_id のテスト
+    app.example1.insert_example1_many のテスト
     '''
 
     @classmethod
     def setUpClass(cls):
         cls.conn = database_connection.get_connection()
+        # データ初期化（テストごとにSAVEPOINTまでロールバックして元に戻す）
+        cls.fixture = csv_to_db.SavepointFixture(
+            cls.conn,
+            skip_unchanged=True,
+            example1='tests/data/test_example1/example1_test_insert_example1.csv')
+        cls.fixture.setup()
 
     @classmethod
     def tearDownClass(cls):
+        cls.fixture.teardown()
         cls.conn.close()
 
-    def setUp(self):
-        # データ初期化
-        csv_to_db.load(
-            self.conn,
+    def tearDown(self):
+        self.fixture.reset()
+
+    @parameterized.expand([
+        param(chunk_size=1),
+        param(chunk_size=2),
+        param(chunk_size=1000),
+    ])
+    def test_insert_example1_many_success(self, chunk_size):
+        rows = [
+            # dictの場合
+            {
+                'id': 100,
+                'varchar_col': 'あいうえおかきくけこ',
+                'int_col': 987654321,
+                'double_col': 654.321,
+                'datetime_col': datetime(2001, 1, 2, 3, 4, 5),
+            },
+            # tupleの場合
+            (101, None, None, None, None),
+            (102, 'abc', 1, 1.5, datetime(2001, 1, 2)),
+        ]
+        # ジェネレータも指定できる
+        result = example1.insert_example1_many(self.conn, (row for row in rows), chunk_size=chunk_size)
+
+        # 戻り値の確認
+        self.assertEqual(result, 3)
+        # 登録後の件数の確認（2 + 3 -> 5）
+        self.assertEqual(count_example1(self.conn), 5)
+        # 登録データの確認
+        record = example1.select_example1_by_id(self.conn, 100)
+        self.assertEqual(record['varchar_col'], 'あいうえおかきくけこ')
+        self.assertEqual(record['datetime_col'], datetime(2001, 1, 2, 3, 4, 5))
+        record = example1.select_example1_by_id(self.conn, 101)
+        self.assertIsNone(record['varchar_col'])
+
+    def test_insert_example1_many_no_data(self):
+        result = example1.insert_example1_many(self.conn, [])
+
+        # 戻り値の確認
+        self.assertEqual(result, 0)
+        self.assertEqual(count_example1(self.conn), 2)
+
+
+class Test_delete_example1_by_id(unittest.TestCase):
+    '''
+    app.example1.delete_example1_by_id のテスト
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = database_connection.get_connection()
+        # データ初期化（テストごとにSAVEPOINTまでロールバックして元に戻す）
+        cls.fixture = csv_to_db.SavepointFixture(
+            cls.conn,
+            skip_unchanged=True,
             example1='tests/data/test_example1/example1_test_delete_example1_by_id.csv')
-        self.conn.commit()
+        cls.fixture.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fixture.teardown()
+        cls.conn.close()
 
     def tearDown(self):
-        pass
+        self.fixture.reset()
 
     def test_delete_example1_by_id_success(self):
         result = example1.delete_example1_by_id(
@@ -452,6 +694,52 @@ class Test_delete_example1_by_id(unittest.TestCase):
         self.assertEqual(count_example1(self.conn), 3)
 
 
+class Test_delete_example1_by_ids(unittest.TestCase):
+    '''
+    app.example1.delete_example1_by_ids のテスト
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = database_connection.get_connection()
+        # データ初期化（テストごとにSAVEPOINTまでロールバックして元に戻す）
+        cls.fixture = csv_to_db.SavepointFixture(
+            cls.conn,
+            skip_unchanged=True,
+            example1='tests/data/test_example1/example1_test_delete_example1_by_id.csv')
+        cls.fixture.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fixture.teardown()
+        cls.conn.close()
+
+    def tearDown(self):
+        self.fixture.reset()
+
+    @parameterized.expand([
+        param(chunk_size=1),
+        param(chunk_size=1000),
+    ])
+    def test_delete_example1_by_ids_success(self, chunk_size):
+        # 存在しないidは無視される
+        result = example1.delete_example1_by_ids(self.conn, [1, 2, 100], chunk_size=chunk_size)
+
+        # 戻り値の確認
+        self.assertEqual(result, 2)
+        # 削除後の件数の確認（3 - 2 -> 1）
+        self.assertEqual(count_example1(self.conn), 1)
+        self.assertIsNone(example1.select_example1_by_id(self.conn, 1))
+        self.assertIsNone(example1.select_example1_by_id(self.conn, 2))
+
+    def test_delete_example1_by_ids_no_data(self):
+        result = example1.delete_example1_by_ids(self.conn, [])
+
+        # 戻り値の確認
+        self.assertEqual(result, 0)
+        self.assertEqual(count_example1(self.conn), 3)
+
+
 def main():
     unittest.main()
 
@@ -0,0 +1,68 @@
+import unittest
+import warnings
+from datetime import datetime
+from app import database_connection
+from app import example1
+from app import query_plan
+from helper import csv_to_db
+
+
+class Test_query_plan(unittest.TestCase):
+    '''
+    app.query_plan のテスト
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = database_connection.get_connection()
+        # データ初期化
+        csv_to_db.load(
+            cls.conn,
+            skip_unchanged=True,
+            example1='tests/data/test_example1/example1_test_select_example1.csv')
+        cls.conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def setUp(self):
+        self.recorder = query_plan.enable()
+
+    def tearDown(self):
+        query_plan.disable()
+
+    def test_explain_primary_key(self):
+        with warnings.catch_warnings():
+            # 警告が出た場合はエラーにする
+            warnings.simplefilter('error', query_plan.FullTableScanWarning)
+            example1.select_example1_by_id(self.conn, 11)
+            example1.select_example1_by_ids(self.conn, [11, 12])
+
+        # 主キーで参照するので全件参照にならない
+        self.assertEqual(self.recorder.full_table_scans(), [])
+        self.assertEqual(len(self.recorder.plans), 2)
+
+    def test_explain_full_table_scan(self):
+        # datetime_colにはインデックスがないので、全件参照になる
+        with self.assertWarns(query_plan.FullTableScanWarning):
+            example1.select_example1(self.conn, start=datetime(2018, 1, 1), sort=example1.Sort.datetime_col)
+
+        plans = self.recorder.full_table_scans()
+        self.assertEqual(len(plans), 1)
+        self.assertEqual(plans[0].table, 'example1')
+        self.assertTrue(plans[0].filesort)
+
+    def test_explain_once_per_template(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', query_plan.FullTableScanWarning)
+            example1.select_example1(self.conn, start=datetime(2018, 1, 1))
+            example1.select_example1(self.conn, start=datetime(2018, 1, 2))
+            # 条件が違うとテンプレートも違う
+            example1.select_example1(self.conn, end=datetime(2018, 1, 2))
+
+        self.assertEqual(len(self.recorder.plans), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()